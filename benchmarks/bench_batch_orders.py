@@ -0,0 +1,119 @@
+"""Пакетное исполнение заявок против поштучных buy/sell.
+
+Ребалансировка из ORDERS заявок выполняется двумя способами: вызовами
+buy_currency / sell_currency по одной и одним execute_orders. Считает
+число записей портфеля и время, проверяет, что итоговые балансы
+совпадают, а пакет с невыполнимой заявкой не меняет портфель.
+
+Запуск: python -m benchmarks.bench_batch_orders [--backend json|sqlite]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+ORDERS = 50
+CURRENCIES = ("BTC", "ETH", "EUR", "RUB")
+
+
+def _orders():
+    orders = []
+    for i in range(ORDERS):
+        # Каждая третья заявка продаёт половину предыдущей покупки
+        if i % 3 == 2:
+            currency = orders[-1]["currency"]
+            orders.append({"action": "sell", "currency": currency, "amount": 0.25})
+        else:
+            currency = CURRENCIES[i % len(CURRENCIES)]
+            orders.append({"action": "buy", "currency": currency, "amount": 0.5})
+    return orders
+
+
+def _count_saves(usecases) -> list:
+    saves = []
+    # Сделки записываются в журнал портфеля: одна запись на вызов
+    append_trades = usecases.db.append_trades
+
+    def counting(*args, **kwargs):
+        saves.append(1)
+        return append_trades(*args, **kwargs)
+
+    usecases.db.append_trades = counting
+    return saves
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="json", choices=("json", "sqlite"))
+    args = parser.parse_args()
+
+    project_root = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="valutatrade-batch-")
+    try:
+        os.chdir(workdir)
+        os.environ["VALUTATRADE_STORAGE_BACKEND"] = args.backend
+        from valutatrade_hub.core import usecases
+        from valutatrade_hub.core.exceptions import InsufficientFundsError
+        from valutatrade_hub.core.rates_snapshot import RateQuote
+
+        now = datetime.now().isoformat()
+        usecases.rates_snapshots.publish(
+            {
+                "BTC_USD": RateQuote(59337.21, now, "bench"),
+                "ETH_USD": RateQuote(3720.0, now, "bench"),
+                "EUR_USD": RateQuote(1.0786, now, "bench"),
+                "RUB_USD": RateQuote(0.0101, now, "bench"),
+            }
+        )
+        single = usecases.register_user("single", "pass1").user_id
+        batch = usecases.register_user("batch", "pass1").user_id
+        saves = _count_saves(usecases)
+        orders = _orders()
+
+        started = time.perf_counter()
+        for order in orders:
+            trade = (
+                usecases.buy_currency
+                if order["action"] == "buy"
+                else usecases.sell_currency
+            )
+            trade(single, order["currency"], order["amount"])
+        single_time = time.perf_counter() - started
+        single_saves = len(saves)
+
+        started = time.perf_counter()
+        results = usecases.execute_orders(batch, orders)
+        batch_time = time.perf_counter() - started
+        batch_saves = len(saves) - single_saves
+
+        print(f"== {ORDERS} orders, backend={args.backend} ==")
+        print(f"one by one: {single_time * 1000:.1f} ms, {single_saves} saves")
+        print(
+            f"batch:      {batch_time * 1000:.1f} ms, {batch_saves} save "
+            f"({single_time / batch_time:.1f}x faster)"
+        )
+
+        expected = usecases.get_user_portfolio(single).to_dict()["wallets"]
+        actual = usecases.get_user_portfolio(batch).to_dict()["wallets"]
+        assert expected == actual and len(results) == ORDERS
+
+        before = usecases.get_user_portfolio(batch).to_dict()
+        bad = orders[:10] + [{"action": "sell", "currency": "BTC", "amount": 1e9}]
+        try:
+            usecases.execute_orders(batch, bad)
+        except InsufficientFundsError:
+            pass
+        else:
+            raise AssertionError("batch with an impossible order was executed")
+        assert usecases.get_user_portfolio(batch).to_dict() == before
+        print("-> same balances; a batch with an impossible order changes nothing")
+    finally:
+        os.chdir(project_root)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
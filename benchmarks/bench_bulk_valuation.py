@@ -0,0 +1,82 @@
+"""Оценка портфелей всех пользователей: матрица балансов против цикла.
+
+Строит USERS синтетических портфелей (до 5 валют из 8, часть валют без
+живого курса оценивается по справочным), сводит их в BalanceMatrix и
+оценивает в USD и EUR. Сравнивает с Portfolio.get_total_value по
+каждому пользователю и проверяет, что суммы совпадают.
+
+Запуск: python -m benchmarks.bench_bulk_valuation [--users N]
+"""
+
+import argparse
+import random
+import time
+
+from valutatrade_hub.core.models import Portfolio
+from valutatrade_hub.core.rate_matrix import RateMatrix
+from valutatrade_hub.core.valuation import BalanceMatrix, np
+
+USERS = 1_000_000
+# Цикл по объектам Portfolio замеряется на части пользователей
+LOOP_USERS = 50_000
+CURRENCIES = ("USD", "EUR", "BTC", "ETH", "RUB", "GBP", "JPY", "SOL")
+RATES = RateMatrix.from_rates(
+    {
+        "EUR_USD": 1.0786,
+        "BTC_USD": 59337.21,
+        "ETH_USD": 3720.0,
+        "GBP_USD": 1.27,
+        "JPY_USD": 0.0067,
+        "SOL_USD": 145.0,
+    }
+)
+
+
+def _portfolios(count: int):
+    rng = random.Random(1)
+    for user_id in range(1, count + 1):
+        codes = rng.sample(CURRENCIES, rng.randint(1, 5))
+        yield {
+            "user_id": user_id,
+            "wallets": {
+                code: {"currency_code": code, "balance": round(rng.random() * 100, 4)}
+                for code in codes
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=USERS)
+    args = parser.parse_args()
+    print(f"== {args.users} users, numpy={'yes' if np is not None else 'no'} ==")
+
+    started = time.perf_counter()
+    balances = BalanceMatrix.from_portfolios(_portfolios(args.users))
+    print(f"generate + load: {time.perf_counter() - started:.2f}s")
+
+    for base in ("USD", "EUR"):
+        started = time.perf_counter()
+        values = balances.value(base, RATES)
+        print(f"value {base}:  {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    loop_users = min(LOOP_USERS, args.users)
+    portfolios = [Portfolio.from_dict(data) for data in _portfolios(loop_users)]
+    started = time.perf_counter()
+    expected = [p.get_total_value("EUR", RATES) for p in portfolios]
+    elapsed = (time.perf_counter() - started) * args.users / loop_users
+    print(f"loop EUR:   ≈{elapsed * 1000:.0f} ms (Portfolio.get_total_value)")
+
+    for i, total in enumerate(expected):
+        assert abs(values[i] - total) <= 1e-9 * max(1.0, total), i
+    started = time.perf_counter()
+    leaders = balances.top(10, "USD", RATES)
+    print(
+        f"top 10 USD: {(time.perf_counter() - started) * 1000:.1f} ms, "
+        f"leader user {leaders[0][0]} with {leaders[0][1]:,.2f} USD"
+    )
+    print(f"-> totals match Portfolio.get_total_value for {loop_users} users")
+
+
+if __name__ == "__main__":
+    main()
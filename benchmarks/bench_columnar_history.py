@@ -0,0 +1,66 @@
+"""Загрузка года тиков одной пары: разбор JSON против колоночных файлов.
+
+Запуск: python -m benchmarks.bench_columnar_history
+"""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from valutatrade_hub.parser_service.columnar import ColumnarHistory, convert_history
+from valutatrade_hub.parser_service.history_log import build_record
+
+# Год тиков с шагом 5 минут
+TICKS = 365 * 24 * 12
+PAIR = "BTC_USD"
+
+
+def _records():
+    start = datetime(2025, 1, 1)
+    for i in range(TICKS):
+        timestamp = (start + timedelta(minutes=5 * i)).isoformat()
+        yield build_record(PAIR, 90000.0 + i % 1000, "CoinGecko", timestamp)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "exchange_rates.json")
+        records = list(_records())
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(records, f)
+        store = ColumnarHistory(os.path.join(tmp, "history_columns"))
+        convert_history(records, store)
+        del records
+
+        start = time.perf_counter()
+        with open(json_path, encoding="utf-8") as f:
+            data = json.load(f)
+        rates = [r["rate"] for r in data if r["meta"]["raw_id"] == PAIR]
+        json_time = time.perf_counter() - start
+        json_total = sum(rates)
+
+        start = time.perf_counter()
+        with store.load(PAIR) as series:
+            load_time = time.perf_counter() - start
+            columnar_total = sum(series.rates)
+        scan_time = time.perf_counter() - start
+
+        json_size = os.path.getsize(json_path)
+        columnar_size = sum(
+            os.path.getsize(os.path.join(store.directory, name))
+            for name in os.listdir(store.directory)
+        )
+
+    assert json_total == columnar_total
+    print(f"{TICKS} ticks of {PAIR}")
+    print(f"json:     load {json_time * 1000:8.1f} ms, {json_size / 2**20:6.1f} MiB")
+    print(
+        f"columnar: load {load_time * 1000:8.3f} ms, {columnar_size / 2**20:6.1f} MiB, "
+        f"load+scan {scan_time * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
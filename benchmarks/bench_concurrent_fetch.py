@@ -0,0 +1,137 @@
+"""Параллельный опрос источников курсов против локальных HTTP-заглушек.
+
+Каждый источник - отдельный HTTP-сервер на 127.0.0.1 с искусственной
+задержкой ответа. Проверяется, что цикл обновления длится примерно
+как самый медленный источник (а не сумма задержек), что источник,
+не успевший к общему сроку, отбрасывается без ожидания, и что время
+цикла не растёт с числом источников.
+
+Запуск: python -m benchmarks.bench_concurrent_fetch
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from valutatrade_hub.parser_service.api_clients import BaseApiClient, FetchResult
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+COINGECKO_BODY = {
+    "bitcoin": {"usd": 101918.0},
+    "ethereum": {"usd": 3290.5},
+    "solana": {"usd": 158.2},
+}
+EXCHANGERATE_BODY = {
+    "result": "success",
+    "conversion_rates": {"USD": 1.0, "EUR": 0.87, "GBP": 0.76, "RUB": 80.9},
+}
+
+
+def _start_server(body: dict, delay: float) -> ThreadingHTTPServer:
+    """Поднимает сервер, отвечающий body через delay секунд на любой путь"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                # Клиент бросил запрос по сроку цикла
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class StubClient(BaseApiClient):
+    """Источник с одной парой, отдаваемой HTTP-заглушкой"""
+
+    def __init__(self, name: str, url: str):
+        super().__init__()
+        self.name = name
+        self.url = url
+
+    def fetch(self, deadline=None) -> FetchResult:
+        return FetchResult(self._fetch(self.url, self._parse, deadline=deadline)[0])
+
+    def _parse(self, data: dict) -> dict:
+        return {f"{self.name}_USD": data["rate"]}
+
+
+def _run(updater: RatesUpdater, deadline: float):
+    config.UPDATE_DEADLINE = deadline
+    started = time.perf_counter()
+    success = updater.run_update()
+    elapsed = time.perf_counter() - started
+    rates = updater.storage.load_current_rates()
+    return success, elapsed, sum(isinstance(v, dict) for v in rates.values())
+
+
+def _configure_builtin(crypto_delay: float, fiat_delay: float) -> List:
+    crypto = _start_server(COINGECKO_BODY, crypto_delay)
+    fiat = _start_server(EXCHANGERATE_BODY, fiat_delay)
+    config.COINGECKO_URL = f"{_url(crypto)}/simple/price"
+    config.EXCHANGERATE_API_URL = f"{_url(fiat)}/v6"
+    config.EXCHANGERATE_API_KEY = "bench"
+    return [crypto, fiat]
+
+
+def main():
+    # Квоты настоящих API здесь только мешают замеру
+    config.RATE_LIMITS = {}
+    project_root = os.getcwd()
+    servers = []
+    with tempfile.TemporaryDirectory(prefix="valutatrade-fetch-") as workdir:
+        os.chdir(workdir)
+        try:
+            print("== two built-in sources, 1.0s and 1.5s ==")
+            servers += _configure_builtin(1.0, 1.5)
+            success, elapsed, count = _run(RatesUpdater(), deadline=10)
+            print(f"-> success={success} time={elapsed:.2f}s rates={count}")
+            print("   (sequential fetching would take ≈ 2.50s)")
+            assert success and elapsed < 2.4
+
+            print("== fiat source slower than the 1.5s deadline ==")
+            servers += _configure_builtin(0.2, 5.0)
+            os.remove(os.path.join("data", "rates.json"))
+            success, elapsed, count = _run(RatesUpdater(), deadline=1.5)
+            print(f"-> success={success} time={elapsed:.2f}s rates saved={count}")
+            assert not success and elapsed < 2.0 and count == 6
+
+            for sources in (2, 8, 32):
+                print(f"== {sources} stub sources, 0.5s each ==")
+                updater = RatesUpdater(clients=[])
+                for i in range(sources):
+                    server = _start_server({"rate": 1.0 + i}, 0.5)
+                    servers.append(server)
+                    updater.register_client(StubClient(f"SRC{i}", _url(server)))
+                success, elapsed, count = _run(updater, deadline=10)
+                print(f"-> success={success} time={elapsed:.2f}s")
+                assert success and elapsed < 1.5
+        finally:
+            os.chdir(project_root)
+            for server in servers:
+                server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Пропускная способность надёжной записи: по одной фиксации против group_commit.
+
+Запуск: python -m benchmarks.bench_durable_writes
+"""
+
+import os
+import tempfile
+import time
+
+from valutatrade_hub.infra.durable import append_bytes, atomic_write_json, group_commit
+
+WRITES = 500
+USERS = 20
+GROUP_SIZES = (1, 10, 50)
+
+
+def _portfolio(user_id: int, i: int) -> dict:
+    return {
+        "user_id": user_id,
+        "wallets": {"BTC": {"currency_code": "BTC", "balance": i * 0.001}},
+    }
+
+
+def _replace_writes(directory: str, group_size: int) -> float:
+    """Замены файлов портфелей по кругу, возвращает записей в секунду"""
+    start = time.perf_counter()
+    for batch_start in range(0, WRITES, group_size):
+        with group_commit():
+            for i in range(batch_start, min(batch_start + group_size, WRITES)):
+                user_id = i % USERS + 1
+                atomic_write_json(
+                    os.path.join(directory, f"{user_id}.json"), _portfolio(user_id, i)
+                )
+    return WRITES / (time.perf_counter() - start)
+
+
+def _append_writes(path: str, group_size: int) -> float:
+    """Дозаписи в журнал, возвращает записей в секунду"""
+    line = b'{"pair":"BTC_USD","rate":101918.0,"timestamp":"2025-11-05T09:47:05"}\n'
+    start = time.perf_counter()
+    for batch_start in range(0, WRITES, group_size):
+        with group_commit():
+            for _ in range(batch_start, min(batch_start + group_size, WRITES)):
+                append_bytes(path, line)
+    return WRITES / (time.perf_counter() - start)
+
+
+def main():
+    print(f"{WRITES} logical writes, {USERS} distinct portfolio files")
+    print(f"{'mode':>14} | {'replace w/s':>12} | {'append w/s':>11}")
+    for group_size in GROUP_SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            replace_rate = _replace_writes(tmp, group_size)
+            append_rate = _append_writes(os.path.join(tmp, "log.jsonl"), group_size)
+        mode = "immediate" if group_size == 1 else f"group of {group_size}"
+        print(f"{mode:>14} | {replace_rate:>12.0f} | {append_rate:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Рост истории: полная запись против записи по изменениям.
+
+Имитирует CYCLES циклов обновления раз в 5 минут: фиатный курс меняется
+в 10% циклов, криптовалютный - в 60%, оба приходят в двух направлениях.
+Сравнивает объём журнала и колоночных файлов и проверяет, что запросы к
+истории по изменениям возвращают те же тики, что и к полной.
+
+Запуск: python -m benchmarks.bench_history_delta
+"""
+
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from valutatrade_hub.infra.durable import group_commit
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.history_query import HistoryQuery
+from valutatrade_hub.parser_service.storage import RatesStorage
+
+CYCLES = 2000
+PAIRS = ("USD_EUR", "EUR_USD", "BTC_USD", "USD_BTC")
+
+
+def _cycles():
+    rng = random.Random(1)
+    eur, btc = 0.92, 60000.0
+    started = datetime(2026, 1, 1)
+    for i in range(CYCLES):
+        if rng.random() < 0.1:
+            eur = round(eur * (1 + rng.gauss(0, 0.001)), 6)
+        if rng.random() < 0.6:
+            btc = round(btc * (1 + rng.gauss(0, 0.01)), 2)
+        yield (
+            (started + timedelta(minutes=5 * i)).isoformat(),
+            {
+                "USD_EUR": (eur, "ExchangeRate-API"),
+                "EUR_USD": (1 / eur, "ExchangeRate-API"),
+                "BTC_USD": (btc, "CoinGecko"),
+                "USD_BTC": (1 / btc, "CoinGecko"),
+            },
+        )
+
+
+def _run(delta: bool):
+    project_root = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            config.HISTORY_DELTA_ENABLED = delta
+            storage = RatesStorage()
+            started = time.perf_counter()
+            for timestamp, rates in _cycles():
+                with group_commit():
+                    if delta:
+                        storage.save_cycle_history(rates, timestamp)
+                    else:
+                        records = [
+                            (pair, rate, source)
+                            for pair, (rate, source) in rates.items()
+                        ]
+                        storage.save_historical_records(records, timestamp)
+            storage.flush_history_runs()
+            elapsed = time.perf_counter() - started
+            rows = sum(1 for _ in storage.iter_history())
+            size = sum(
+                os.path.getsize(os.path.join(directory, name))
+                for directory, _, names in os.walk("data")
+                for name in names
+            )
+            query = HistoryQuery(storage)
+            ticks = {pair: list(query.range(pair)) for pair in PAIRS}
+        finally:
+            os.chdir(project_root)
+    return rows, size, elapsed, ticks
+
+
+def main():
+    print(f"== {CYCLES} update cycles, {len(PAIRS)} pairs ==")
+    full_rows, full_size, full_time, full_ticks = _run(delta=False)
+    print(
+        f"full history:  {full_rows} rows, {full_size / 1024:.0f} KiB, {full_time:.2f}s"
+    )
+    rows, size, elapsed, ticks = _run(delta=True)
+    print(
+        f"delta history: {rows} rows, {size / 1024:.0f} KiB, {elapsed:.2f}s "
+        f"({size / full_size:.0%} of full)"
+    )
+    for pair in PAIRS:
+        expected, actual = full_ticks[pair], ticks[pair]
+        assert [ts for ts, _ in expected] == [ts for ts, _ in actual], pair
+        assert all(
+            abs(a - b) <= 1e-12 * abs(a) for (_, a), (_, b) in zip(expected, actual)
+        ), pair
+    print(f"-> queries return the same {len(ticks[PAIRS[0]])} ticks per pair")
+
+
+if __name__ == "__main__":
+    main()
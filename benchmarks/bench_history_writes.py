@@ -0,0 +1,83 @@
+"""Сравнение записи истории курсов: старый read-modify-write против журнала.
+
+Запуск: python -m benchmarks.bench_history_writes
+"""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from valutatrade_hub.parser_service.history_log import HistoryLog, build_record
+
+CODES = ("BTC", "ETH", "SOL", "EUR", "GBP", "RUB")
+PAIRS = [f"{code}_USD" for code in CODES] + [f"USD_{code}" for code in CODES]
+HISTORY_SIZES = (0, 1_000, 10_000, 50_000)
+CYCLES = 5
+
+
+def _legacy_cycle(history_path: str) -> int:
+    """Один цикл обновления в старом стиле: по перезаписи файла на пару"""
+    written = 0
+    for pair in PAIRS:
+        record = build_record(pair, 1.0, "bench", datetime.now().isoformat())
+        if os.path.exists(history_path):
+            with open(history_path, "r") as f:
+                history = json.load(f)
+        else:
+            history = []
+        history.append(record)
+        with open(history_path, "w") as f:
+            json.dump(history, f, indent=2)
+        written += os.path.getsize(history_path)
+    return written
+
+
+def _batch_cycle(log: HistoryLog) -> int:
+    """Один цикл обновления через групповую запись в журнал"""
+    timestamp = datetime.now().isoformat()
+    batch = [build_record(pair, 1.0, "bench", timestamp) for pair in PAIRS]
+    return log.append_many(batch, durable=True)
+
+
+def _prefill(size: int, history_path: str, log: HistoryLog):
+    """Заполняет оба хранилища историей заданного размера"""
+    timestamp = datetime.now().isoformat()
+    records = [
+        build_record(PAIRS[i % len(PAIRS)], 1.0, "bench", timestamp)
+        for i in range(size)
+    ]
+    with open(history_path, "w") as f:
+        json.dump(records, f, indent=2)
+    log.append_many(records)
+
+
+def main():
+    print(f"{len(PAIRS)} pairs per cycle, {CYCLES} cycles per measurement")
+    print(
+        f"{'history':>8} | {'legacy ms':>10} {'legacy KB':>10} | "
+        f"{'batch ms':>9} {'batch KB':>9}"
+    )
+    for size in HISTORY_SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            history_path = os.path.join(tmp, "exchange_rates.json")
+            log = HistoryLog(os.path.join(tmp, "history"), 4 * 1024 * 1024)
+            _prefill(size, history_path, log)
+
+            start = time.perf_counter()
+            legacy_bytes = sum(_legacy_cycle(history_path) for _ in range(CYCLES))
+            legacy_ms = (time.perf_counter() - start) * 1000 / CYCLES
+
+            start = time.perf_counter()
+            batch_bytes = sum(_batch_cycle(log) for _ in range(CYCLES))
+            batch_ms = (time.perf_counter() - start) * 1000 / CYCLES
+
+        print(
+            f"{size:>8} | {legacy_ms:>10.2f} {legacy_bytes / CYCLES / 1024:>10.1f} | "
+            f"{batch_ms:>9.2f} {batch_bytes / CYCLES / 1024:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
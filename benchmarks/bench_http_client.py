@@ -0,0 +1,144 @@
+"""HTTP-клиент источников: keep-alive, повторы и условные запросы.
+
+Поднимает локальную заглушку CoinGecko (HTTP/1.1, ETag) и проверяет:
+- пул соединений: серия запросов идёт по одному TCP-соединению, а не
+  по новому на каждый запрос, как у requests.get;
+- повторы: ответы 503 повторяются с backoff до успешного;
+- 304: повторный запрос с If-None-Match не разбирает и не сохраняет
+  данные, а цикл обновления не дописывает историю.
+
+Запуск: python -m benchmarks.bench_http_client
+"""
+
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from valutatrade_hub.parser_service.api_clients import CoinGeckoClient
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+REQUESTS = 200
+BODY = json.dumps(
+    {
+        "bitcoin": {"usd": 101918.0},
+        "ethereum": {"usd": 3290.5},
+        "solana": {"usd": 158.2},
+    }
+).encode("utf-8")
+ETAG = '"rates-v1"'
+
+
+class StubState:
+    connections = 0
+    failures_left = 0
+    full_responses = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Заголовки и тело уходят разными write: без NODELAY keep-alive
+        # упирается в задержку ACK, а не в клиента
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        StubState.connections += 1
+
+    def do_GET(self):
+        if StubState.failures_left > 0:
+            StubState.failures_left -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        StubState.full_responses += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def _timed(fn) -> float:
+    StubState.connections = 0
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        fn()
+    return (time.perf_counter() - start) / REQUESTS * 1000
+
+
+def main():
+    # Квоты настоящих API здесь только мешают замеру
+    config.RATE_LIMITS = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/simple/price"
+    config.COINGECKO_URL = url
+    config.HTTP_BACKOFF_BASE = 0.01
+
+    try:
+        print(f"== {REQUESTS} sequential requests ==")
+        per_request = _timed(lambda: requests.get(url, timeout=5).json())
+        print(
+            f"requests.get:   {per_request:.2f} ms/req, {StubState.connections} conns"
+        )
+        client = CoinGeckoClient()
+        per_request = _timed(lambda: client._request(url).json())
+        print(
+            f"pooled session: {per_request:.2f} ms/req, {StubState.connections} conns"
+        )
+        assert StubState.connections == 1
+
+        print("== retries: 2 x 503 then 200 ==")
+        StubState.failures_left = 2
+        client = CoinGeckoClient()
+        rates = client.fetch_rates()
+        print(f"-> {len(rates)} rates after {client.timings[-1]['attempts']} attempts")
+        assert rates and StubState.failures_left == 0
+
+        print("== conditional revalidation ==")
+        project_root = os.getcwd()
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                updater = RatesUpdater(clients=[CoinGeckoClient()])
+                StubState.full_responses = 0
+                assert updater.run_update()
+                history_path = os.path.join("data", "history", "segment-000001.jsonl")
+                history_size = os.path.getsize(history_path)
+                assert updater.run_update()
+                timing = updater.clients[0].timings[-1]
+                print(
+                    f"-> second cycle: status={timing['status']} "
+                    f"time={timing['elapsed_ms']:.2f} ms, "
+                    f"full responses={StubState.full_responses}, "
+                    f"history grew={os.path.getsize(history_path) - history_size} B"
+                )
+                assert timing["status"] == 304 and StubState.full_responses == 1
+                assert os.path.getsize(history_path) == history_size
+            finally:
+                os.chdir(project_root)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Балансы в целых минимальных единицах против float.
+
+Проверяет точность: 0.1 BTC, купленные десять раз, - ровно 1 BTC, и их
+можно продать; баланс ETH до wei переживает сериализацию в JSON;
+пересчёт по курсу совпадает с точным рациональным расчётом. Затем
+сравнивает скорость пополнений и списаний с прежним кошельком на float
+и с Decimal.
+
+Запуск: python -m benchmarks.bench_ledger
+"""
+
+import json
+import random
+import time
+from decimal import Decimal
+from fractions import Fraction
+
+from valutatrade_hub.core.models import Wallet
+from valutatrade_hub.core.money import convert_units, to_units
+
+OPERATIONS = 200_000
+AMOUNTS = {
+    "USD": [12.34, 100.0, 0.5, 250.75],
+    "BTC": [0.1, 0.015, 0.5, 0.00012345],
+    "ETH": [0.05, 1.25, 0.3, 2.0],
+}
+
+
+class _FloatWallet:
+    """Прежний кошелёк: баланс float за свойством с проверкой"""
+
+    __slots__ = ("currency_code", "_balance")
+
+    def __init__(self, currency_code: str, balance: float = 0.0):
+        self.currency_code = currency_code
+        self._balance = float(balance)
+
+    @property
+    def balance(self) -> float:
+        return self._balance
+
+    @balance.setter
+    def balance(self, value: float):
+        if not isinstance(value, (int, float)):
+            raise ValueError("Баланс должен быть числом")
+        if value < 0:
+            raise ValueError("Баланс не может быть отрицательным")
+        self._balance = float(value)
+
+    def deposit(self, amount: float):
+        amount = float(amount)
+        if amount <= 0:
+            raise ValueError("Сумма пополнения должна быть положительной")
+        self.balance += amount
+
+    def withdraw(self, amount: float):
+        amount = float(amount)
+        if amount <= 0:
+            raise ValueError("Сумма снятия должна быть положительной")
+        if amount > self.balance:
+            raise ValueError("Недостаточно средств")
+        self.balance -= amount
+
+
+class _DecimalWallet(_FloatWallet):
+    """Кошелёк на Decimal: точный, но медленный"""
+
+    __slots__ = ()
+
+    def __init__(self, currency_code: str, balance: float = 0.0):
+        self.currency_code = currency_code
+        self._balance = Decimal(repr(balance))
+
+    @property
+    def balance(self) -> Decimal:
+        return self._balance
+
+    @balance.setter
+    def balance(self, value: Decimal):
+        if value < 0:
+            raise ValueError("Баланс не может быть отрицательным")
+        self._balance = value
+
+    def deposit(self, amount: float):
+        amount = Decimal(repr(amount))
+        if amount <= 0:
+            raise ValueError("Сумма пополнения должна быть положительной")
+        self.balance += amount
+
+    def withdraw(self, amount: float):
+        amount = Decimal(repr(amount))
+        if amount <= 0:
+            raise ValueError("Сумма снятия должна быть положительной")
+        if amount > self.balance:
+            raise ValueError("Недостаточно средств")
+        self.balance -= amount
+
+
+def _check_exactness():
+    print("== exactness ==")
+    old, new = _FloatWallet("BTC"), Wallet("BTC")
+    for _ in range(10):
+        old.deposit(0.1)
+        new.deposit(0.1)
+    print(f"float wallet:  10 × 0.1 BTC = {old.balance!r}, sell 1.0 ", end="")
+    try:
+        old.withdraw(1.0)
+        print("ok")
+    except ValueError:
+        print("rejected")
+    new.withdraw(1.0)
+    assert new.units == 0
+    print("units wallet:  10 × 0.1 BTC = 1.0, sell 1.0 ok")
+
+    eth = Wallet("ETH", units=123456789012345678901234567)
+    restored = Wallet.from_dict(json.loads(json.dumps(eth.to_dict())))
+    assert restored.units == eth.units
+    print(f"ETH {eth.units} wei survives a JSON round trip")
+
+    rng = random.Random(1)
+    for _ in range(10_000):
+        units = rng.randrange(1, 10**12)
+        rate = round(rng.uniform(0.0001, 100_000), rng.randint(0, 8))
+        exact = Fraction(units, 10**8) * Fraction(repr(rate)) * 100
+        expected = round(exact)  # Fraction округляет половину к чётному
+        assert convert_units(units, "BTC", "USD", rate) == expected
+    print("-> 10000 BTC→USD conversions match exact rational arithmetic")
+
+
+def _throughput(wallet_cls, currency_code: str) -> float:
+    amounts = AMOUNTS[currency_code]
+    wallet = wallet_cls(currency_code, 10_000.0)
+    started = time.perf_counter()
+    for i in range(OPERATIONS // 2):
+        amount = amounts[i & 3]
+        wallet.deposit(amount)
+        wallet.withdraw(amount)
+    return OPERATIONS / (time.perf_counter() - started)
+
+
+def main():
+    _check_exactness()
+    print(f"== {OPERATIONS} deposits/withdrawals, ops/s ==")
+    for currency_code in AMOUNTS:
+        results = {
+            title: _throughput(wallet_cls, currency_code)
+            for title, wallet_cls in (
+                ("float", _FloatWallet),
+                ("units", Wallet),
+                ("Decimal", _DecimalWallet),
+            )
+        }
+        print(
+            f"{currency_code}: "
+            + ", ".join(f"{title} {ops / 1e6:.2f}M" for title, ops in results.items())
+            + f" (units/float {results['units'] / results['float']:.2f})"
+        )
+    # Единицы - целые: прямые операции над ними без разбора суммы
+    units = to_units(0.1, "BTC")
+    balance = to_units(10_000.0, "BTC")
+    started = time.perf_counter()
+    for _ in range(OPERATIONS // 2):
+        balance += units
+        balance -= units
+    elapsed = time.perf_counter() - started
+    print(f"raw integer units: {OPERATIONS / elapsed / 1e6:.2f}M ops/s")
+
+
+if __name__ == "__main__":
+    main()
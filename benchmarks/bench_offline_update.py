@@ -0,0 +1,163 @@
+"""Пропускная способность и задержка run_update без сети.
+
+Все источники - локальный стенд StandInRatesServer, данные пишутся во
+временный каталог. Сценарии:
+- базовый: 3 фиатные и 3 криптовалюты, без задержки;
+- задержка и ошибки: 20 мс на ответ, 10% ответов 503 (повторы с backoff);
+- большой набор: 150 фиатных и 500 криптовалют, курсы меняются на каждом
+  запросе (каждый цикл дописывает историю);
+- запись/воспроизведение: цикл пишет фикстуры со стенда, затем стенд
+  останавливается, и те же курсы приходят из фикстур;
+- бюджет запросов: 600 монет идут к CoinGecko тремя вызовами, цикл сверх
+  квоты откладывается, а ручное обновление сливается с недавним.
+
+Запуск: python -m benchmarks.bench_offline_update
+"""
+
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from valutatrade_hub.parser_service.api_clients import (
+    CoinGeckoClient,
+    ExchangeRateApiClient,
+)
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.standin_server import (
+    StandInRatesServer,
+    synthetic_universe,
+)
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+CYCLES = 50
+
+
+@contextmanager
+def _workdir():
+    project_root = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(project_root)
+
+
+def _updater() -> RatesUpdater:
+    return RatesUpdater(clients=[CoinGeckoClient(), ExchangeRateApiClient()])
+
+
+def _run(title: str, server: StandInRatesServer, cycles: int = CYCLES):
+    server.configure()
+    with server, _workdir():
+        updater = _updater()
+        latencies = []
+        failed = 0
+        rates = 0
+        started = time.perf_counter()
+        for _ in range(cycles):
+            cycle_started = time.perf_counter()
+            if not updater.run_update():
+                failed += 1
+            latencies.append((time.perf_counter() - cycle_started) * 1000)
+            rates += sum(len(client.last_rates) for client in updater.clients)
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{title}: {cycles / elapsed:.1f} cycles/s, {rates / elapsed:.0f} rates/s, "
+        f"p50 {statistics.median(latencies):.1f} ms, p95 {p95:.1f} ms, "
+        f"failed cycles {failed}, server requests {server.requests} "
+        f"(503: {server.errors})"
+    )
+
+
+def _record_replay():
+    print("== record / replay ==")
+    with _workdir():
+        config.HTTP_FIXTURES_PATH = os.path.abspath("fixtures.json")
+        server = StandInRatesServer(volatility=0.001, seed=7)
+        server.configure()
+        with server:
+            config.HTTP_FIXTURES_MODE = "record"
+            recorded = _updater()
+            assert recorded.run_update()
+            assert recorded.run_update()
+        with open(config.HTTP_FIXTURES_PATH) as f:
+            assert server.api_key not in f.read()
+
+        config.HTTP_FIXTURES_MODE = "replay"
+        try:
+            replayed = _updater()
+            started = time.perf_counter()
+            assert replayed.run_update()
+            assert replayed.run_update()
+            elapsed = (time.perf_counter() - started) / 2 * 1000
+        finally:
+            config.HTTP_FIXTURES_MODE = ""
+
+        for recorded_client, replayed_client in zip(recorded.clients, replayed.clients):
+            assert recorded_client.last_rates == replayed_client.last_rates
+        print(
+            f"-> replayed {sum(len(c.last_rates) for c in replayed.clients)} rates "
+            f"identical to the recording, {elapsed:.1f} ms/cycle, server stopped"
+        )
+
+
+def _budget():
+    print("== request budget ==")
+    _, crypto = synthetic_universe(0, 600)
+    server = StandInRatesServer(crypto=crypto, seed=4)
+    server.configure()
+    config.RATE_LIMITS = {"CoinGecko": [(5, 60.0)]}
+    try:
+        with server, _workdir():
+            updater = RatesUpdater(clients=[CoinGeckoClient()])
+            client = updater.clients[0]
+            assert updater.run_update()
+            calls = server.requests
+            assert len(client.last_rates) == 2 * 600
+            assert not updater.run_update()
+            assert server.requests == calls and client.retry_after
+            print(
+                f"-> 600 coins in {calls} calls; next cycle deferred "
+                f"for {client.retry_after:.0f}s without a request"
+            )
+            assert updater.run_update(merge_recent=True)
+            assert server.requests == calls
+            print("-> manual update merged with the recent refresh")
+
+            # 3 вызова на обновление при ведре на 2 не уйдут никогда
+            config.RATE_LIMITS = {"CoinGecko": [(2, 60.0)]}
+            assert not updater.run_update()
+            assert server.requests == calls and not client.retry_after
+            print("-> update larger than the bucket fails instead of waiting")
+    finally:
+        config.RATE_LIMITS = {}
+
+
+def main():
+    # Квоты настоящих API здесь только мешают замеру
+    config.RATE_LIMITS = {}
+    config.HTTP_BACKOFF_BASE = 0.01
+    print(f"== {CYCLES} update cycles per scenario ==")
+    _run("baseline       ", StandInRatesServer(seed=1))
+    _run(
+        "latency+errors ",
+        StandInRatesServer(latency=0.02, error_rate=0.1, seed=2),
+    )
+    fiat, crypto = synthetic_universe(150, 500)
+    _run(
+        "650 currencies ",
+        StandInRatesServer(fiat=fiat, crypto=crypto, volatility=0.001, seed=3),
+        cycles=20,
+    )
+    _record_replay()
+    _budget()
+
+
+if __name__ == "__main__":
+    main()
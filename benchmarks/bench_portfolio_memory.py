@@ -0,0 +1,114 @@
+"""Память на резидентные портфели: словари, объекты и PortfolioTable.
+
+Для 100 тыс. и 1 млн синтетических портфелей (до 5 валют из 8)
+измеряет через tracemalloc, сколько памяти занимают:
+- словари в формате portfolios.json (как после json.load);
+- объекты Portfolio/Wallet с __dict__ (прежнее устройство моделей);
+- объекты Portfolio/Wallet на __slots__;
+- PortfolioTable - столбцы array('d') по валютам.
+Проверяет, что таблица отдаёт те же балансы и портфели, что и объекты.
+
+Запуск: python -m benchmarks.bench_portfolio_memory [--users N ...]
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from valutatrade_hub.core.models import Portfolio, Wallet
+from valutatrade_hub.core.portfolio_table import PortfolioTable
+
+SIZES = (100_000, 1_000_000)
+CURRENCIES = ("USD", "EUR", "BTC", "ETH", "RUB", "GBP", "JPY", "SOL")
+
+
+class _DictWallet(Wallet):
+    """Кошелёк с __dict__, как до перехода на __slots__"""
+
+
+class _DictPortfolio(Portfolio):
+    """Портфель с __dict__, как до перехода на __slots__"""
+
+
+def _portfolios(count: int):
+    rng = random.Random(1)
+    for user_id in range(1, count + 1):
+        codes = rng.sample(CURRENCIES, rng.randint(1, 5))
+        yield {
+            "user_id": user_id,
+            "wallets": {
+                code: {"currency_code": code, "balance": round(rng.random() * 100, 4)}
+                for code in codes
+            },
+        }
+
+
+def _objects(count: int, portfolio_cls, wallet_cls):
+    return [
+        portfolio_cls(
+            data["user_id"],
+            {
+                code: wallet_cls(code, wallet["balance"])
+                for code, wallet in data["wallets"].items()
+            },
+        )
+        for data in _portfolios(count)
+    ]
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def _report(title: str, count: int, size: int, elapsed: float):
+    print(
+        f"{title}: {size / 2**20:7.1f} MiB, {size / count:5.0f} B/portfolio, "
+        f"built in {elapsed:.2f}s"
+    )
+
+
+def _check(table: PortfolioTable, portfolios):
+    for portfolio in portfolios[:: max(1, len(portfolios) // 1000)]:
+        view = table.get(portfolio.user_id)
+        expected = {code: w.balance for code, w in portfolio.wallets.items()}
+        assert dict(view) == expected
+        restored = table.portfolio(portfolio.user_id)
+        assert restored.to_dict() == portfolio.to_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=SIZES)
+    args = parser.parse_args()
+
+    for count in args.users:
+        print(f"== {count} portfolios (build time under tracemalloc) ==")
+        size, elapsed = _measure(lambda: list(_portfolios(count)))[1:]
+        _report("json dicts    ", count, size, elapsed)
+        size, elapsed = _measure(lambda: _objects(count, _DictPortfolio, _DictWallet))[
+            1:
+        ]
+        _report("objects+dict  ", count, size, elapsed)
+        objects, size, elapsed = _measure(lambda: _objects(count, Portfolio, Wallet))
+        _report("objects+slots ", count, size, elapsed)
+        table, size, elapsed = _measure(
+            lambda: PortfolioTable.from_portfolios(_portfolios(count))
+        )
+        _report("PortfolioTable", count, size, elapsed)
+        _check(table, objects)
+        print("-> table views and restored portfolios match the objects")
+        del objects, table
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Журнал сделок против полной перезаписи портфеля.
+
+Для портфелей из 5, 50 и 500 кошельков сравнивает стоимость сделки:
+прежняя запись - перечитать и атомарно заменить файл портфеля целиком,
+журнал - дописать одну строку в journal/<id>.jsonl. Затем меряет
+загрузку портфеля при разной длине хвоста журнала после снимка и
+проверяет, что снимок не меняет состояние, а восстановление на момент
+каждой сделки даёт баланс, записанный в её событии.
+
+Запуск: python -m benchmarks.bench_trade_journal [--trades N]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from valutatrade_hub.core.journal import build_trade, replay
+from valutatrade_hub.infra.durable import atomic_write_json, read_json
+from valutatrade_hub.infra.locks import file_lock
+from valutatrade_hub.infra.portfolio_store import PortfolioStore
+
+WALLETS = (5, 50, 500)
+TAILS = (0, 100, 1000)
+RATE = 59337.21
+
+
+def _portfolio(user_id: int, wallets: int) -> dict:
+    codes = ["BTC"] + [f"C{i:02d}" for i in range(wallets - 1)]
+    return {
+        "user_id": user_id,
+        "wallets": {
+            code: {"currency_code": code, "balance": 1.0, "units": 100_000_000}
+            for code in codes
+        },
+    }
+
+
+def _rewrite(store: PortfolioStore, portfolio_data: dict):
+    """Прежнее сохранение: перечитать и заменить файл портфеля целиком"""
+    path = store._shard_path(portfolio_data["user_id"])
+    with file_lock(path + ".lock"):
+        current = read_json(path)
+        version = current.get("version", 0) if current else 0
+        atomic_write_json(path, {**portfolio_data, "version": version + 1})
+
+
+def _trade(units: int) -> dict:
+    return build_trade("buy", "BTC", 0.01, RATE, units)
+
+
+def _per_trade(store: PortfolioStore, wallets: int, trades: int):
+    rewrite_user, journal_user = 2 * wallets, 2 * wallets + 1
+    data = _portfolio(rewrite_user, wallets)
+    started = time.perf_counter()
+    for i in range(trades):
+        data["wallets"]["BTC"]["units"] += 1_000_000
+        _rewrite(store, data)
+    rewrite_time = (time.perf_counter() - started) / trades
+    rewrite_bytes = os.path.getsize(store._shard_path(rewrite_user))
+
+    store.save(_portfolio(journal_user, wallets))
+    size_before = store.journal.size(journal_user)
+    units = 100_000_000
+    started = time.perf_counter()
+    for i in range(trades):
+        units += 1_000_000
+        store.append_trades(journal_user, [_trade(units)])
+    journal_time = (time.perf_counter() - started) / trades
+    journal_bytes = (store.journal.size(journal_user) - size_before) / trades
+    print(
+        f"{wallets:3d} wallets: rewrite {rewrite_time * 1000:6.2f} ms "
+        f"({rewrite_bytes} B), journal {journal_time * 1000:5.2f} ms "
+        f"({journal_bytes:.0f} B) - {rewrite_time / journal_time:.1f}x"
+    )
+    assert store.load(journal_user)["wallets"]["BTC"]["units"] == units
+
+
+def _load_with_tail(store: PortfolioStore):
+    for tail in TAILS:
+        user_id = 10_000 + tail
+        store.save(_portfolio(user_id, 5))
+        units = 100_000_000
+        for _ in range(tail):
+            units += 1_000_000
+            store.append_trades(user_id, [_trade(units)])
+        # Загрузка в новом процессе: без кеша версий PortfolioStore
+        fresh = PortfolioStore(store.data_path)
+        started = time.perf_counter()
+        for _ in range(20):
+            portfolio = fresh.load(user_id)
+        elapsed = (time.perf_counter() - started) / 20
+        assert portfolio["wallets"]["BTC"]["units"] == units
+        print(f"load with {tail:4d} events after snapshot: {elapsed * 1000:.2f} ms")
+
+    before = store.load(10_000 + TAILS[-1])
+    assert store.snapshot(10_000 + TAILS[-1])
+    assert store.load(10_000 + TAILS[-1]) == before
+    started = time.perf_counter()
+    store.load(10_000 + TAILS[-1])
+    elapsed = time.perf_counter() - started
+    print(f"-> after snapshot: same state, load {elapsed * 1000:.2f} ms")
+
+
+def _check_point_in_time(store: PortfolioStore, trades: int):
+    user_id = 99_999
+    store.save({"user_id": user_id, "wallets": {}})
+    units = 0
+    for _ in range(trades):
+        units += 1_000_000
+        store.append_trades(user_id, [_trade(units)])
+    events = list(store.iter_events(user_id))
+    for event in events[1:]:
+        moment = datetime.fromisoformat(event["timestamp"])
+        state = replay({"user_id": user_id, "version": -1}, events, until=moment)
+        assert state["wallets"]["BTC"]["units"] == event["units"]
+    print(f"-> state at each of {trades} trades matches its journal event")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="valutatrade-journal-")
+    try:
+        store = PortfolioStore(workdir)
+        print(f"== {args.trades} trades per portfolio, time per trade (fsync) ==")
+        for wallets in WALLETS:
+            _per_trade(store, wallets, args.trades)
+        print("== portfolio load ==")
+        _load_with_tail(store)
+        _check_point_in_time(store, args.trades)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
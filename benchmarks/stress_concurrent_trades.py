@@ -0,0 +1,122 @@
+"""Нагрузочная проверка параллельной торговли из нескольких процессов.
+
+Несколько процессов одновременно покупают валюту для общего пользователя
+и для собственных пользователей. По завершении баланс каждого кошелька
+должен в точности равняться сумме всех покупок: ни одна сделка не должна
+потеряться.
+
+Запуск: python -m benchmarks.stress_concurrent_trades [--backend json|sqlite]
+       [--workers N] [--trades N]
+Код выхода 1 - сделки потеряны (так её запускает tests/test_stress.py).
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+WORKERS = 8
+TRADES_PER_WORKER = 40
+# Точно представимо во float, поэтому сумма покупок сравнивается строго
+AMOUNT = 0.5
+SHARED_USER = "shared"
+
+
+def _worker(
+    workdir: str, backend: str, worker_id: int, trades: int, start_event
+) -> int:
+    """Выполняет сделки, возвращает число сделок, завершившихся ошибкой"""
+    os.chdir(workdir)
+    os.environ["VALUTATRADE_STORAGE_BACKEND"] = backend
+    from valutatrade_hub.core import usecases
+    from valutatrade_hub.core.exceptions import ConcurrentModificationError
+
+    shared = usecases.login_user(SHARED_USER, "pass1")
+    own = usecases.login_user(f"worker{worker_id}", "pass1")
+
+    start_event.wait()
+    failed = 0
+    for _ in range(trades):
+        for user_id, currency in ((shared.user_id, "BTC"), (own.user_id, "EUR")):
+            try:
+                usecases.buy_currency(user_id, currency, AMOUNT)
+            except ConcurrentModificationError:
+                failed += 1
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="json", choices=("json", "sqlite"))
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--trades", type=int, default=TRADES_PER_WORKER)
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, project_root)
+
+    workdir = tempfile.mkdtemp(prefix="valutatrade-stress-")
+    try:
+        os.chdir(workdir)
+        os.environ["VALUTATRADE_STORAGE_BACKEND"] = args.backend
+        from valutatrade_hub.core import usecases
+        from valutatrade_hub.core.rates_snapshot import RateQuote
+
+        # Сделки идут только по реальным свежим курсам
+        now = datetime.now().isoformat()
+        usecases.rates_snapshots.publish(
+            {
+                "BTC_USD": RateQuote(59337.21, now, "stress"),
+                "EUR_USD": RateQuote(1.0786, now, "stress"),
+            }
+        )
+        usecases.register_user(SHARED_USER, "pass1")
+        for worker_id in range(args.workers):
+            usecases.register_user(f"worker{worker_id}", "pass1")
+
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Manager() as manager, ctx.Pool(args.workers) as pool:
+            start_event = manager.Event()
+            results = [
+                pool.apply_async(
+                    _worker, (workdir, args.backend, i, args.trades, start_event)
+                )
+                for i in range(args.workers)
+            ]
+            time.sleep(1)
+            started = time.perf_counter()
+            start_event.set()
+            # Сделки, отклонённые после исчерпания повторов, не потеряны:
+            # вызывающий получил ошибку и баланс их не учитывает
+            failed = sum(result.get() for result in results)
+            elapsed = time.perf_counter() - started
+
+        trades = args.workers * args.trades * 2
+        lost = -failed
+        shared_id = usecases.db.get_user(SHARED_USER)["user_id"]
+        expected = args.workers * args.trades * AMOUNT
+        balance = usecases.get_user_portfolio(shared_id).get_wallet("BTC").balance
+        lost += round((expected - balance) / AMOUNT)
+        for worker_id in range(args.workers):
+            user_id = usecases.db.get_user(f"worker{worker_id}")["user_id"]
+            balance = usecases.get_user_portfolio(user_id).get_wallet("EUR").balance
+            lost += round((args.trades * AMOUNT - balance) / AMOUNT)
+
+        print(
+            f"backend={args.backend} workers={args.workers} trades={trades} "
+            f"time={elapsed:.2f}s ({trades / elapsed:.0f} trades/s) "
+            f"rejected={failed} lost={lost}"
+        )
+        if lost:
+            sys.exit(1)
+    finally:
+        os.chdir(project_root)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import dataclasses
+
+import pytest
+
+from valutatrade_hub.parser_service.config import config
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Рабочий каталог теста: data/ создаётся во временном каталоге"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def parser_config(monkeypatch):
+    """Конфигурация парсера, которая восстанавливается после теста"""
+    for field in dataclasses.fields(config):
+        monkeypatch.setattr(config, field.name, getattr(config, field.name))
+    return config
@@ -0,0 +1,69 @@
+"""Пакетное исполнение заявок"""
+
+from datetime import datetime
+
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.exceptions import InsufficientFundsError
+from valutatrade_hub.core.rates_snapshot import RateQuote
+
+USER_ID = 7
+
+
+@pytest.fixture
+def portfolio(workdir):
+    now = datetime.now().isoformat()
+    usecases.rates_snapshots.publish(
+        {
+            "BTC_USD": RateQuote(50_000.0, now, "test"),
+            "EUR_USD": RateQuote(1.1, now, "test"),
+            "ETH_USD": RateQuote(3_000.0, now, "test"),
+        }
+    )
+    usecases.db.save_portfolio(
+        {
+            "user_id": USER_ID,
+            "wallets": {"EUR": {"currency_code": "EUR", "balance": 10.0}},
+        }
+    )
+    return usecases.get_user_portfolio(USER_ID)
+
+
+def _balances() -> dict:
+    wallets = usecases.get_user_portfolio(USER_ID).wallets
+    return {code: wallet.units for code, wallet in wallets.items()}
+
+
+def test_batch_is_saved_once(portfolio):
+    results = usecases.execute_orders(
+        USER_ID,
+        [
+            {"action": "buy", "currency": "BTC", "amount": 0.01},
+            {"action": "sell", "currency": "EUR", "amount": 4},
+        ],
+    )
+
+    assert [r["action"] for r in results] == ["buy", "sell"]
+    assert _balances() == {"EUR": 600, "BTC": 1_000_000}
+    assert usecases.get_user_portfolio(USER_ID).version == portfolio.version + 2
+
+
+@pytest.mark.parametrize(
+    "bad_order, error",
+    [
+        ({"action": "sell", "currency": "EUR", "amount": 11}, InsufficientFundsError),
+        ({"action": "sell", "currency": "ETH", "amount": 1}, ValueError),
+        ({"action": "hold", "currency": "BTC", "amount": 1}, ValueError),
+        ({"action": "buy", "currency": "BTC", "amount": float("nan")}, ValueError),
+    ],
+)
+def test_failed_order_rolls_back_the_whole_batch(portfolio, bad_order, error):
+    before = _balances()
+    orders = [{"action": "buy", "currency": "BTC", "amount": 0.01}, bad_order]
+
+    with pytest.raises(error):
+        usecases.execute_orders(USER_ID, orders)
+
+    assert _balances() == before
+    assert usecases.get_user_portfolio(USER_ID).version == portfolio.version
@@ -0,0 +1,128 @@
+"""Параллельный опрос источников против локальных HTTP-заглушек"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from valutatrade_hub.parser_service.api_clients import BaseApiClient, FetchResult
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+COINGECKO_BODY = {"bitcoin": {"usd": 101918.0}, "ethereum": {"usd": 3290.5}}
+EXCHANGERATE_BODY = {
+    "result": "success",
+    "conversion_rates": {"USD": 1.0, "EUR": 0.87, "GBP": 0.76},
+}
+
+
+@pytest.fixture
+def stub_server():
+    """Запускает HTTP-заглушки: stub_server(body, delay) -> базовый URL"""
+    servers = []
+
+    def start(body: dict, delay: float) -> str:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(delay)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент бросил запрос по сроку цикла
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        ).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def updater_config(workdir, parser_config):
+    # Квоты настоящих API здесь только мешают
+    parser_config.RATE_LIMITS = {}
+    parser_config.EXCHANGERATE_API_KEY = "test"
+    return parser_config
+
+
+class StubClient(BaseApiClient):
+    """Источник с одной парой, отдаваемой HTTP-заглушкой"""
+
+    def __init__(self, name: str, url: str):
+        super().__init__()
+        self.name = name
+        self.url = url
+
+    def fetch(self, deadline=None) -> FetchResult:
+        return FetchResult(self._fetch(self.url, self._parse, deadline=deadline)[0])
+
+    def _parse(self, data: dict) -> dict:
+        return {f"{self.name}_USD": data["rate"]}
+
+
+def _builtin_sources(config, stub_server, crypto_delay, fiat_delay):
+    config.COINGECKO_URL = f"{stub_server(COINGECKO_BODY, crypto_delay)}/simple/price"
+    config.EXCHANGERATE_API_URL = f"{stub_server(EXCHANGERATE_BODY, fiat_delay)}/v6"
+
+
+def _saved_pairs(updater: RatesUpdater) -> set:
+    rates = updater.storage.load_current_rates()
+    return {pair for pair, quote in rates.items() if isinstance(quote, dict)}
+
+
+def _timed_update(updater: RatesUpdater):
+    started = time.perf_counter()
+    success = updater.run_update()
+    return success, time.perf_counter() - started
+
+
+def test_sources_are_fetched_in_parallel(updater_config, stub_server):
+    _builtin_sources(updater_config, stub_server, 0.5, 0.8)
+    updater_config.UPDATE_DEADLINE = 10
+
+    updater = RatesUpdater()
+    success, elapsed = _timed_update(updater)
+
+    # Последовательный опрос занял бы 1.3 с
+    assert success and elapsed < 1.2
+    assert len(_saved_pairs(updater)) == 8
+
+
+def test_source_slower_than_deadline_is_dropped(updater_config, stub_server):
+    _builtin_sources(updater_config, stub_server, 0.1, 5.0)
+    updater_config.UPDATE_DEADLINE = 1.0
+
+    updater = RatesUpdater()
+    success, elapsed = _timed_update(updater)
+
+    assert not success and elapsed < 1.5
+    assert _saved_pairs(updater) == {"BTC_USD", "USD_BTC", "ETH_USD", "USD_ETH"}
+
+
+@pytest.mark.parametrize("sources", [2, 8, 32])
+def test_cycle_time_does_not_grow_with_sources(updater_config, stub_server, sources):
+    updater_config.UPDATE_DEADLINE = 10
+    updater = RatesUpdater(clients=[])
+    for i in range(sources):
+        url = stub_server({"rate": 1.0 + i}, 0.3)
+        updater.register_client(StubClient(f"SRC{i}", url))
+
+    success, elapsed = _timed_update(updater)
+
+    assert success and elapsed < 1.0
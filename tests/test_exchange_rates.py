@@ -0,0 +1,40 @@
+"""Курсы из кеша: недоступные курсы и ошибки хранилища"""
+
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.exceptions import ApiRequestError, CorruptedDataError
+
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    triggered = []
+    monkeypatch.setattr(usecases.rates_refresh, "trigger", triggered.append)
+    return triggered
+
+
+def _failing(error):
+    def get_pairs(pairs):
+        raise error
+
+    return get_pairs
+
+
+def test_corrupted_rates_are_unavailable_and_refreshed(monkeypatch, refreshes):
+    monkeypatch.setattr(
+        usecases.rates_cache,
+        "get_pairs",
+        _failing(CorruptedDataError("rates.json", "bad JSON")),
+    )
+
+    with pytest.raises(ApiRequestError, match="недоступен"):
+        usecases.get_exchange_rate("BTC", "USD")
+    assert refreshes
+
+
+def test_unexpected_errors_propagate(monkeypatch, refreshes):
+    monkeypatch.setattr(usecases.rates_cache, "get_pairs", _failing(KeyError("x")))
+
+    with pytest.raises(KeyError):
+        usecases.get_exchange_rate("BTC", "USD")
+    assert not refreshes
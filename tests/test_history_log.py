@@ -0,0 +1,34 @@
+"""Сегментированный журнал истории курсов"""
+
+from valutatrade_hub.parser_service.history_log import HistoryLog, build_record
+
+
+def _record(i: int) -> dict:
+    return build_record("BTC_USD", 100.0 + i, "test", f"2025-01-01T00:00:{i:02d}")
+
+
+def test_torn_last_line_is_cut_before_append(workdir):
+    log = HistoryLog(str(workdir / "history"), 1 << 20)
+    log.append_many([_record(1), _record(2)])
+    path = log.list_segments()[-1]
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 10)
+
+    log.append(_record(3))
+
+    assert [r["rate"] for r in log.iter_records()] == [101.0, 103.0]
+
+
+def test_writer_follows_segment_rolled_by_another_process(workdir):
+    directory = str(workdir / "history")
+    first = HistoryLog(directory, 300)
+    second = HistoryLog(directory, 300)
+    first.append(_record(1))
+    second.append(_record(2))
+    second.append(_record(3))
+
+    first.append(_record(4))
+
+    # По записи на сегмент: четвёртая не должна попасть во второй сегмент
+    assert len(second.list_segments()) == 4
+    assert [r["rate"] for r in first.iter_records()] == [101.0, 102.0, 103.0, 104.0]
@@ -0,0 +1,102 @@
+"""Запросы к истории курсов, записанной по изменениям"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from valutatrade_hub.parser_service import columnar, history_query
+from valutatrade_hub.parser_service.history_query import HistoryQuery
+from valutatrade_hub.parser_service.storage import RatesStorage
+
+START = datetime(2025, 1, 1)
+
+
+def _cycles(storage: RatesStorage, rates, pair: str = "BTC_USD"):
+    """Циклы обновления раз в минуту с курсами rates"""
+    for minute, rate in enumerate(rates):
+        moment = (START + timedelta(minutes=minute)).isoformat()
+        assert storage.save_cycle_history({pair: (rate, "test")}, moment)
+
+
+def _minutes(rates, *minutes):
+    """Ожидаемые тики: курс rates[i] в минуту minutes[i]"""
+    return [(START + timedelta(minutes=m), r) for m, r in zip(minutes, rates)]
+
+
+@pytest.fixture
+def storage(workdir, parser_config):
+    parser_config.HISTORY_RUN_MAX = 288
+    return RatesStorage()
+
+
+@pytest.fixture(params=["numpy", "list"])
+def arrays(request, monkeypatch):
+    """Прогоняет тест и с numpy, и на чистом Python"""
+    if request.param == "numpy" and columnar.np is None:
+        pytest.skip("numpy не установлен")
+    if request.param == "list":
+        monkeypatch.setattr(columnar, "np", None)
+        monkeypatch.setattr(history_query, "np", None)
+    return request.param
+
+
+def test_open_run_is_visible_before_flush(storage):
+    _cycles(storage, [100.0] * 5)
+    # Запрос из другого процесса: серия есть только в history_runs.json
+    query = HistoryQuery(RatesStorage())
+
+    ticks = list(query.range("BTC_USD"))
+    assert ticks == [(START + timedelta(minutes=m), 100.0) for m in range(5)]
+    bars = query.resample("BTC_USD", timedelta(minutes=1))
+    assert [bar["count"] for bar in bars] == [1] * 5
+    assert query.rate_at("USD_BTC", START + timedelta(minutes=10)) == (
+        START + timedelta(minutes=4),
+        0.01,
+    )
+
+    assert storage.flush_history_runs()
+    assert list(query.range("BTC_USD")) == ticks
+
+
+def test_closed_run_spreads_repeats(storage, arrays):
+    _cycles(storage, [100.0, 100.0, 100.0, 101.0])
+    query = HistoryQuery(storage)
+
+    expected = _minutes([100.0, 100.0, 100.0, 101.0], 0, 1, 2, 3)
+    assert list(query.range("BTC_USD")) == expected
+    bars = query.resample("BTC_USD", timedelta(minutes=2))
+    assert [(bar["open"], bar["close"], bar["count"]) for bar in bars] == [
+        (100.0, 100.0, 2),
+        (100.0, 101.0, 2),
+    ]
+    assert query.rate_at("BTC_USD", START + timedelta(minutes=1, seconds=30)) == (
+        START + timedelta(minutes=1),
+        100.0,
+    )
+
+
+def test_inverse_pair_window_inside_run(storage, arrays):
+    _cycles(storage, [100.0, 100.0, 100.0, 100.0, 200.0])
+    query = HistoryQuery(storage)
+
+    ticks = query.range(
+        "USD_BTC", START + timedelta(minutes=1), START + timedelta(minutes=2)
+    )
+    assert list(ticks) == _minutes([0.01, 0.01], 1, 2)
+    assert list(query.range("USD_BTC", START + timedelta(minutes=3))) == _minutes(
+        [0.01, 0.005], 3, 4
+    )
+
+
+def test_long_run_is_cut_into_marks(workdir, parser_config, arrays):
+    parser_config.HISTORY_RUN_MAX = 3
+    storage = RatesStorage()
+    _cycles(storage, [100.0] * 8 + [101.0])
+    query = HistoryQuery(storage)
+
+    expected = _minutes([100.0] * 8 + [101.0], *range(9))
+    assert list(query.range("BTC_USD")) == expected
+    assert list(query.range("USD_BTC"))[-1] == (
+        START + timedelta(minutes=8),
+        1 / 101.0,
+    )
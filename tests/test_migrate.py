@@ -0,0 +1,56 @@
+"""Перенос данных из JSON в SQLite"""
+
+from valutatrade_hub.core.journal import build_trade
+from valutatrade_hub.infra.json_backend import JsonBackend
+from valutatrade_hub.infra.migrate import migrate
+from valutatrade_hub.infra.sqlite_backend import SqliteBackend
+from valutatrade_hub.parser_service.history_log import build_record
+
+USD = {"currency_code": "USD", "balance": 100.0, "units": 10_000}
+
+
+def _source(path: str) -> JsonBackend:
+    source = JsonBackend(path, 1 << 20)
+    source.add_user(
+        {
+            "user_id": 1,
+            "username": "alice",
+            "hashed_password": "x",
+            "salt": "s",
+            "registration_date": "2025-01-01T00:00:00",
+        }
+    )
+    source.save_portfolio({"user_id": 1, "wallets": {"USD": USD}})
+    trade = build_trade("buy", "BTC", 0.01, 50_000.0, 1_000_000)
+    source.append_trades(1, [trade])
+    source.save_rates(
+        {"BTC_USD": {"rate": 50_000.0, "updated_at": "2025-01-01", "source": "t"}}
+    )
+    source.append_history(
+        [build_record("BTC_USD", 50_000.0, "t", "2025-01-01T00:00:00")]
+    )
+    return source
+
+
+def test_migration_can_be_rerun(workdir):
+    source = _source(str(workdir / "json"))
+    target = SqliteBackend(str(workdir / "db.sqlite"))
+
+    first = migrate(source, target)
+    portfolio = target.load_portfolio(1)
+    trades = list(target.iter_trades(1))
+    second = migrate(source, target)
+
+    assert first == {
+        "users": 1,
+        "portfolios": 1,
+        "trades": 2,
+        "rates": 1,
+        "history": 1,
+    }
+    assert second == {**first, "users": 0, "portfolios": 0, "trades": 0, "history": 0}
+    assert portfolio["wallets"] == source.load_portfolio(1)["wallets"]
+    assert target.load_portfolio(1) == portfolio
+    assert list(target.iter_trades(1)) == trades
+    assert [t["action"] for t in trades if t["action"] != "state"] == ["buy"]
+    assert len(list(target.iter_history())) == 1
@@ -0,0 +1,42 @@
+"""Денежные суммы в минимальных единицах"""
+
+import pytest
+
+from valutatrade_hub.core.money import convert_units, format_units, to_units
+
+
+def test_repeated_amounts_add_up_exactly():
+    units = sum(to_units(0.1, "BTC") for _ in range(10))
+
+    assert units == to_units(1, "BTC") == 100_000_000
+    assert format_units(units, "BTC") == "1.00000000"
+
+
+@pytest.mark.parametrize(
+    "amount, code, units",
+    [
+        (0.1, "ETH", 10**17),
+        ("1.000000000000000001", "ETH", 10**18 + 1),
+        (123456.789, "ETH", 123456789 * 10**15),
+        (-12.34, "USD", -1234),
+        ("1e-2", "USD", 1),
+    ],
+)
+def test_amounts_convert_by_their_decimal_form(amount, code, units):
+    assert to_units(amount, code) == units
+
+
+@pytest.mark.parametrize(
+    "amount, units", [(0.125, 12), (0.135, 14), ("0.005", 0), ("0.015", 2)]
+)
+def test_extra_digits_round_half_to_even(amount, units):
+    assert to_units(amount, "USD") == units
+
+
+def test_conversion_rounds_once_at_the_end():
+    # 0.01 BTC по 59337.21 = 593.3721 USD -> 593.37
+    assert convert_units(1_000_000, "BTC", "USD", 59337.21) == 59337
+    # 1 цент по курсу 0.5 - ровно половина: к чётному
+    assert convert_units(1, "USD", "EUR", 0.5) == 0
+    assert convert_units(3, "USD", "EUR", 0.5) == 2
+    assert format_units(-5, "USD") == "-0.05"
@@ -0,0 +1,21 @@
+"""Снимки текущих курсов"""
+
+from valutatrade_hub.core.rates_snapshot import RateQuote, RatesSnapshotStore
+
+
+def test_reads_check_storage_at_most_once_per_interval(workdir, monkeypatch):
+    store = RatesSnapshotStore()
+    published = store.publish({"BTC_USD": RateQuote(100.0, "2025-01-01", "test")})
+    checks = []
+    rates_version = store.db.rates_version
+    monkeypatch.setattr(
+        store.db, "rates_version", lambda: checks.append(1) or rates_version()
+    )
+
+    monkeypatch.setattr(store, "check_interval", 3600)
+    assert all(store.current() is published for _ in range(100))
+    assert not checks
+
+    monkeypatch.setattr(store, "check_interval", 0)
+    assert store.current() is published
+    assert checks
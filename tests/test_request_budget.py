@@ -0,0 +1,25 @@
+"""Бюджет запросов источника"""
+
+from valutatrade_hub.parser_service.api_clients import CoinGeckoClient
+
+
+def test_update_larger_than_bucket_fails(workdir, parser_config, capsys):
+    parser_config.RATE_LIMITS = {"CoinGecko": [(2, 60.0)]}
+    client = CoinGeckoClient()
+    urls = [f"http://127.0.0.1:9/{i}" for i in range(3)]
+
+    result = client._fetch_batch(urls, dict)
+
+    assert result.rates == {} and result.retry_after is None
+    assert "ERROR: CoinGecko: update needs 3 requests" in capsys.readouterr().out
+    assert client.budget.remaining("CoinGecko") == 2
+
+
+def test_update_within_bucket_is_deferred(workdir, parser_config):
+    parser_config.RATE_LIMITS = {"CoinGecko": [(3, 60.0)]}
+    client = CoinGeckoClient()
+    client.budget.acquire("CoinGecko", 2)
+
+    result = client._fetch_batch(["http://127.0.0.1:9/"] * 3, dict)
+
+    assert result.rates == {} and result.retry_after > 0
@@ -0,0 +1,33 @@
+"""Параллельная торговля из нескольких процессов не теряет сделок"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_trades_are_not_lost(backend):
+    # Отдельный процесс: движок хранения выбирается один раз на процесс
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.stress_concurrent_trades",
+            "--backend",
+            backend,
+            "--workers",
+            "4",
+            "--trades",
+            "20",
+        ],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "lost=0" in result.stdout
@@ -0,0 +1,82 @@
+"""Журнал сделок и восстановление портфеля по нему"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.journal import build_trade, replay
+from valutatrade_hub.infra.portfolio_store import PortfolioStore
+
+USD = {"currency_code": "USD", "balance": 100.0, "units": 10_000}
+
+
+def _state_at(store: PortfolioStore, user_id: int, moment: str):
+    portfolio = replay(
+        {"user_id": user_id, "wallets": {}, "version": -1},
+        store.iter_events(user_id),
+        until=datetime.fromisoformat(moment),
+    )
+    return None if portfolio["version"] < 0 else portfolio["wallets"]
+
+
+def test_journal_of_old_portfolio_starts_at_snapshot_time(workdir):
+    with open(workdir / "portfolios.json", "w") as f:
+        json.dump([{"user_id": 1, "wallets": {"USD": USD}}], f)
+    store = PortfolioStore(str(workdir))
+    assert store.load(1)["wallets"] == {"USD": USD}
+    saved_at = datetime(2025, 1, 1).timestamp()
+    os.utime(store._shard_path(1), (saved_at, saved_at))
+
+    trade = build_trade("buy", "BTC", 0.01, 50_000.0, 1_000_000, "2025-01-02T00:00")
+    store.append_trades(1, [trade])
+
+    assert _state_at(store, 1, "2024-12-31T00:00") is None
+    assert _state_at(store, 1, "2025-01-01T12:00") == {"USD": USD}
+    assert _state_at(store, 1, "2025-01-02T00:00")["BTC"]["units"] == 1_000_000
+
+
+def test_journal_tail_is_shared_between_processes(workdir):
+    writer, other = PortfolioStore(str(workdir)), PortfolioStore(str(workdir))
+    writer.save({"user_id": 2, "wallets": {"USD": USD}})
+    for units in range(1, 4):
+        trade = build_trade("buy", "BTC", 0.01, 50_000.0, units * 1_000_000)
+        writer.append_trades(2, [trade])
+
+    assert other.journal_tail(2) == 3
+    assert other.snapshot(2)
+    assert writer.journal_tail(2) == 0
+    assert writer.load(2)["wallets"]["BTC"]["units"] == 3_000_000
+
+
+def test_replay_applies_only_events_newer_than_snapshot():
+    events = [
+        {"seq": 1, "timestamp": "2025-01-01T00:00", "action": "state", "wallets": {}},
+        {"seq": 2, **build_trade("buy", "BTC", 0.01, 1.0, 1_000_000, "2025-01-02")},
+        {"seq": 3, **build_trade("buy", "BTC", 0.01, 1.0, 2_000_000, "2025-01-03")},
+    ]
+    snapshot = {"user_id": 3, "wallets": {"USD": USD}, "version": 2}
+
+    portfolio = replay(snapshot, events)
+
+    assert portfolio["version"] == 3
+    assert portfolio["wallets"]["USD"] == USD
+    assert portfolio["wallets"]["BTC"]["units"] == 2_000_000
+    assert snapshot["version"] == 2 and "BTC" not in snapshot["wallets"]
+
+
+def test_portfolio_at_moment_follows_the_journal(workdir):
+    usecases.db.save_portfolio({"user_id": 5, "wallets": {"USD": USD}})
+    first = datetime.now() + timedelta(days=1)
+    for hours, units in ((0, 1_000_000), (1, 3_000_000)):
+        moment = (first + timedelta(hours=hours)).isoformat()
+        trade = build_trade("buy", "BTC", 0.01, 50_000.0, units, moment)
+        usecases.db.append_trades(5, [trade])
+
+    assert usecases.get_portfolio_at(5, datetime(2000, 1, 1)) is None
+    before = usecases.get_portfolio_at(5, first - timedelta(minutes=1))
+    assert set(before.wallets) == {"USD"}
+    assert usecases.get_portfolio_at(5, first).get_wallet("BTC").units == 1_000_000
+    latest = usecases.get_portfolio_at(5, first + timedelta(hours=2))
+    assert latest.get_wallet("BTC").units == 3_000_000
+    assert latest.get_wallet("USD").units == 10_000
@@ -0,0 +1,48 @@
+"""Оценка всех портфелей"""
+
+from datetime import datetime
+
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.rates_snapshot import RateQuote
+from valutatrade_hub.core.valuation import BalanceMatrix
+
+
+def _wallet(code: str, balance: float) -> dict:
+    return {"currency_code": code, "balance": balance}
+
+
+@pytest.fixture
+def portfolios(workdir):
+    now = datetime.now().isoformat()
+    usecases.rates_snapshots.publish(
+        {
+            "BTC_USD": RateQuote(50_000.0, now, "test"),
+            "EUR_USD": RateQuote(1.1, now, "test"),
+        }
+    )
+    data = [
+        {"user_id": 1, "wallets": {"USD": _wallet("USD", 100.0)}},
+        {"user_id": 2, "wallets": {"BTC": _wallet("BTC", 0.01)}},
+        {"user_id": 3, "wallets": {"EUR": _wallet("EUR", 100.0)}},
+    ]
+    for portfolio in data:
+        usecases.db.save_portfolio(portfolio)
+    return data
+
+
+def test_leaderboard_reads_portfolios_through_the_table(portfolios):
+    leaders = usecases.get_leaderboard("USD", limit=2)
+
+    assert [user_id for user_id, _ in leaders] == [2, 3]
+    assert [value for _, value in leaders] == pytest.approx([500.0, 110.0])
+    table = usecases.load_portfolio_table()
+    assert dict(table.get(2)) == {"BTC": 0.01}
+
+
+def test_table_matrix_values_like_direct_matrix(portfolios):
+    rates = usecases.rates_cache.matrix()
+    direct = BalanceMatrix.from_portfolios(portfolios).totals("USD", rates)
+
+    assert usecases.value_all_portfolios("USD") == pytest.approx(direct)
@@ -1,12 +1,56 @@
+import json
+from datetime import datetime
+from itertools import islice
+
 from valutatrade_hub.core import usecases
 from valutatrade_hub.core.exceptions import (
     ApiRequestError,
     CurrencyNotFoundError,
     InsufficientFundsError,
 )
+from valutatrade_hub.parser_service.history_query import history_query, parse_interval
+from valutatrade_hub.parser_service.rate_limit import format_period, request_budget
 from valutatrade_hub.parser_service.updater import rates_updater
 
 
+def _print_budget():
+    """Печатает остаток бюджета запросов к источникам курсов"""
+    for source, limits in request_budget.report().items():
+        parts = []
+        for limit in limits:
+            part = (
+                f"{limit['remaining']}/{limit['limit']} "
+                f"per {format_period(limit['period'])}"
+            )
+            if not limit["remaining"]:
+                part += f" (next in {limit['next_in']:.0f}s)"
+            parts.append(part)
+        print(f"Request budget {source}: {', '.join(parts)}")
+
+
+def _read_orders(path: str) -> list:
+    """Читает заявки: JSON-список или строки вида "buy BTC 0.5" (# - комментарий)"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    orders = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        action, currency, amount = line.split()
+        orders.append({"action": action, "currency": currency, "amount": amount})
+    return orders
+
+
+def _get_option(parts, name, default=None):
+    """Возвращает значение опции --name из разобранной команды"""
+    if name not in parts:
+        return default
+    return parts[parts.index(name) + 1]
+
+
 def main():
     print("=== ValutaTrade Hub ===")
     print("Доступные команды:")
@@ -18,12 +62,22 @@ def main():
     print("  Торговля:")
     print("  buy --currency ВАЛЮТА --amount СУММА")
     print("  sell --currency ВАЛЮТА --amount СУММА")
+    print("  batch --file ФАЙЛ")
     print("")
     print("  Портфель и курсы:")
     print("  show-portfolio")
+    print("  portfolio-at --at ВРЕМЯ")
+    print("  trades [--from ВРЕМЯ] [--to ВРЕМЯ] [--limit N]")
+    print("  leaderboard [--base ВАЛЮТА] [--top N]")
     print("  get-rate --from ВАЛЮТА --to ВАЛЮТА")
-    print("  update-rates")
+    print("  update-rates [--force]")
     print("  show-rates")
+    print("  rates-budget")
+    print("")
+    print("  История курсов (время в формате 2025-11-05T09:00:00):")
+    print("  history-rate --pair ПАРА --at ВРЕМЯ")
+    print("  history-range --pair ПАРА [--from ВРЕМЯ] [--to ВРЕМЯ] [--limit N]")
+    print("  history-ohlc --pair ПАРА --interval 1h [--from ВРЕМЯ] [--to ВРЕМЯ]")
     print("")
     print("  Выход:")
     print("  exit")
@@ -100,6 +154,87 @@ def main():
             except Exception as e:
                 print(f"Ошибка: {e}")
 
+        elif command.startswith("portfolio-at"):
+            user = usecases.get_current_user()
+            if not user:
+                print("Сначала выполните login")
+                continue
+
+            parts = command.split()
+            try:
+                moment = datetime.fromisoformat(parts[parts.index("--at") + 1])
+            except Exception:
+                print("Используйте: portfolio-at --at ISO_TIME")
+                continue
+
+            try:
+                portfolio = usecases.get_portfolio_at(user.user_id, moment)
+                if portfolio is None:
+                    print(f"Нет журнала сделок на {moment.isoformat()}")
+                    continue
+                print(
+                    f"Портфель пользователя '{user.username}' на "
+                    f"{moment.isoformat()} (версия {portfolio.version}):"
+                )
+                if not portfolio.wallets:
+                    print("  Кошельков не было")
+                for currency_code, wallet in portfolio.wallets.items():
+                    print(f"  - {currency_code}: {wallet.balance:.4f}")
+            except Exception as e:
+                print(f"Ошибка: {e}")
+
+        elif command.startswith("trades"):
+            user = usecases.get_current_user()
+            if not user:
+                print("Сначала выполните login")
+                continue
+
+            parts = command.split()
+            try:
+                start = _get_option(parts, "--from")
+                end = _get_option(parts, "--to")
+                start = datetime.fromisoformat(start) if start else None
+                end = datetime.fromisoformat(end) if end else None
+                limit = int(_get_option(parts, "--limit", 50))
+            except Exception:
+                print(
+                    "Используйте: trades [--from ISO_TIME] [--to ISO_TIME] [--limit N]"
+                )
+                continue
+
+            try:
+                shown = 0
+                for trade in islice(
+                    usecases.get_trade_history(user.user_id, start, end), limit
+                ):
+                    action = "покупка" if trade["action"] == "buy" else "продажа"
+                    print(
+                        f"- {trade['timestamp']}: {action} {trade['amount']:.4f} "
+                        f"{trade['currency_code']} по курсу {trade['rate']:.2f} "
+                        f"USD, баланс {trade['balance']:.4f}"
+                    )
+                    shown += 1
+                if not shown:
+                    print("Сделок в заданном интервале нет")
+            except Exception as e:
+                print(f"Ошибка: {e}")
+
+        elif command.startswith("leaderboard"):
+            parts = command.split()
+            try:
+                base = _get_option(parts, "--base")
+                base = base.upper() if base else None
+                top = int(_get_option(parts, "--top", 10))
+                leaders = usecases.get_leaderboard(base, top)
+                base = base or usecases.settings.get("default_base_currency", "USD")
+                print(f"Самые дорогие портфели (база: {base}):")
+                for place, (user_id, total) in enumerate(leaders, start=1):
+                    print(f"  {place}. user {user_id}: {total:,.2f} {base}")
+            except CurrencyNotFoundError as e:
+                print(f"Неизвестная базовая валюта '{e.code}'")
+            except Exception as e:
+                print(f"Ошибка: {e}")
+
         elif command.startswith("buy"):
             user = usecases.get_current_user()
             if not user:
@@ -139,6 +274,43 @@ def main():
             except Exception as e:
                 print(f"Ошибка: {e}")
 
+        elif command.startswith("batch"):
+            user = usecases.get_current_user()
+            if not user:
+                print("Сначала выполните login")
+                continue
+
+            parts = command.split()
+            path = _get_option(parts, "--file")
+            if path is None:
+                print("Используйте: batch --file ФАЙЛ")
+                continue
+            try:
+                orders = _read_orders(path)
+            except (OSError, ValueError) as e:
+                print(f"Не удалось прочитать заявки из '{path}': {e}")
+                continue
+
+            try:
+                results = usecases.execute_orders(user.user_id, orders)
+                print(f"Пакет выполнен, заявок: {len(results)}")
+                for result in results:
+                    currency = result["currency_code"]
+                    action = "покупка" if result["action"] == "buy" else "продажа"
+                    print(
+                        f"  - {action} {result['amount']:.4f} {currency} "
+                        f"по курсу {result['rate']:.2f} USD/{currency}: "
+                        f"было {result['old_balance']:.4f} → "
+                        f"стало {result['new_balance']:.4f}"
+                    )
+                cost = sum(r.get("cost", 0.0) for r in results)
+                revenue = sum(r.get("revenue", 0.0) for r in results)
+                print(f"Оценочно: покупки {cost:,.2f} USD, продажи {revenue:,.2f} USD")
+            except CurrencyNotFoundError as e:
+                print(f"Пакет отклонён: неизвестная валюта '{e.code}'")
+            except Exception as e:
+                print(f"Пакет отклонён, ни одна заявка не выполнена: {e}")
+
         elif command.startswith("sell"):
             user = usecases.get_current_user()
             if not user:
@@ -201,6 +373,8 @@ def main():
                     f"Обратный курс {result['to_currency']}→ "
                     f"{result['from_currency']}: {result['reverse_rate']:.2f}"
                 )
+                if result["stale"]:
+                    print("Курс устарел, обновление запущено в фоне.")
             except CurrencyNotFoundError as e:
                 print(f"Неизвестная валюта '{e.code}'")
             except ApiRequestError:
@@ -214,48 +388,39 @@ def main():
         elif command.startswith("update-rates"):
             print("INFO: Starting rates update...")
 
-            success = rates_updater.run_update()
+            # Без --force недавно обновлённые источники не опрашиваются
+            success = rates_updater.run_update(merge_recent="--force" not in command)
             if success:
-                # Получаем количество обновленных курсов
-                import json
-
-                with open("data/rates.json", "r") as f:
-                    rates_data = json.load(f)
-
-                rate_count = 0
-                for key in rates_data:
-                    if key not in ["source", "last_refresh"]:
-                        rate_count += 1
-
-                last_refresh = rates_data.get("last_refresh", "неизвестно")
+                snapshot = usecases.get_rates_snapshot()
                 print(
-                    f"Update successful. Total rates updated: {rate_count}. "
-                    f"Last refresh: {last_refresh}"
+                    f"Update successful. Total rates updated: {len(snapshot)}. "
+                    f"Last refresh: {snapshot.refreshed_at} "
+                    f"(snapshot v{snapshot.version})"
                 )
             else:
                 print(
                     "Update completed with errors. Check logs/parser.log for details."
                 )
+            _print_budget()
+
+        elif command.startswith("rates-budget"):
+            _print_budget()
 
         elif command.startswith("show-rates"):
             try:
-                # Загружаем курсы из файла
-                import json
-                import os
-
-                if not os.path.exists("data/rates.json"):
+                snapshot = usecases.get_rates_snapshot()
+                if not len(snapshot):
                     print(
                         "Локональный кеш курсов пуст. Выполните 'update-rates', "
                         "чтобы загрузить данные."
                     )
                     continue
 
-                with open("data/rates.json", "r") as f:
-                    rates_data = json.load(f)
-
                 # Базовая информация
-                last_refresh = rates_data.get("last_refresh", "неизвестно")
-                print(f"Rates from cache (updated at {last_refresh}):")
+                print(
+                    f"Rates from cache (updated at {snapshot.refreshed_at}, "
+                    f"snapshot v{snapshot.version}):"
+                )
 
                 # Фильтры
                 currency_filter = None
@@ -266,12 +431,9 @@ def main():
 
                 # Собираем курсы для отображения
                 display_rates = []
-                for key, value in rates_data.items():
-                    if key not in ["source", "last_refresh"] and isinstance(
-                        value, dict
-                    ):
-                        if currency_filter is None or currency_filter in key:
-                            display_rates.append((key, value["rate"]))
+                for key, quote in snapshot:
+                    if currency_filter is None or currency_filter in key:
+                        display_rates.append((key, quote.rate))
 
                 if not display_rates:
                     if currency_filter:
@@ -298,7 +460,89 @@ def main():
             except Exception as e:
                 print(f"Ошибка: {e}")
 
+        elif command.startswith("history-rate"):
+            parts = command.split()
+            try:
+                pair = parts[parts.index("--pair") + 1].upper()
+                moment = datetime.fromisoformat(parts[parts.index("--at") + 1])
+            except Exception:
+                print("Используйте: history-rate --pair FROM_TO --at ISO_TIME")
+                continue
+
+            try:
+                result = history_query.rate_at(pair, moment)
+                if result is None:
+                    print(f"Нет истории {pair} на {moment.isoformat()}")
+                    continue
+                tick_time, rate = result
+                print(f"{pair} на {moment.isoformat()}: {rate} (тик {tick_time})")
+            except Exception as e:
+                print(f"Ошибка: {e}")
+
+        elif command.startswith("history-range"):
+            parts = command.split()
+            try:
+                pair = parts[parts.index("--pair") + 1].upper()
+                start = _get_option(parts, "--from")
+                end = _get_option(parts, "--to")
+                start = datetime.fromisoformat(start) if start else None
+                end = datetime.fromisoformat(end) if end else None
+                limit = int(_get_option(parts, "--limit", 50))
+            except Exception:
+                print(
+                    "Используйте: history-range --pair FROM_TO "
+                    "[--from ISO_TIME] [--to ISO_TIME] [--limit N]"
+                )
+                continue
+
+            try:
+                shown = 0
+                for tick_time, rate in islice(
+                    history_query.range(pair, start, end), limit
+                ):
+                    print(f"- {tick_time.isoformat()}: {rate}")
+                    shown += 1
+                if not shown:
+                    print(f"Нет истории {pair} в заданном диапазоне")
+            except Exception as e:
+                print(f"Ошибка: {e}")
+
+        elif command.startswith("history-ohlc"):
+            parts = command.split()
+            try:
+                pair = parts[parts.index("--pair") + 1].upper()
+                interval = parse_interval(parts[parts.index("--interval") + 1])
+                start = _get_option(parts, "--from")
+                end = _get_option(parts, "--to")
+                start = datetime.fromisoformat(start) if start else None
+                end = datetime.fromisoformat(end) if end else None
+            except Exception:
+                print(
+                    "Используйте: history-ohlc --pair FROM_TO --interval 1h "
+                    "[--from ISO_TIME] [--to ISO_TIME]"
+                )
+                continue
+
+            try:
+                bars = history_query.resample(pair, interval, start, end)
+                if not bars:
+                    print(f"Нет истории {pair} в заданном диапазоне")
+                    continue
+                print(f"{pair}, интервал {interval}:")
+                for bar in bars:
+                    print(
+                        f"- {bar['start'].isoformat()}: O={bar['open']} "
+                        f"H={bar['high']} L={bar['low']} C={bar['close']} "
+                        f"avg={bar['mean']:.6g} n={bar['count']}"
+                    )
+            except Exception as e:
+                print(f"Ошибка: {e}")
+
         elif command == "exit":
+            # Серии неизменных курсов дописываются в историю перед выходом
+            rates_updater.storage.flush_history_runs()
+            # Начатые фоновые снимки портфелей дописываются до конца
+            usecases.portfolio_snapshots.wait()
             break
 
         else:
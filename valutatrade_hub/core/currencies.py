@@ -1,5 +1,10 @@
 from valutatrade_hub.core.exceptions import CurrencyNotFoundError
 
+# Число знаков после запятой в минимальной единице валюты
+CURRENCY_SCALES = {"USD": 2, "EUR": 2, "RUB": 2, "BTC": 8, "ETH": 18}
+# Валюты вне справочника хранятся с запасом точности
+DEFAULT_SCALE = 8
+
 
 def get_currency(code: str):
     """Простая заглушка для проверки валют"""
@@ -7,3 +12,8 @@ def get_currency(code: str):
     if code.upper() not in supported_currencies:
         raise CurrencyNotFoundError(code)
     return code  # Просто возвращаем код валюты
+
+
+def get_scale(code: str) -> int:
+    """Число знаков после запятой, с которым хранится баланс валюты"""
+    return CURRENCY_SCALES.get(code.upper(), DEFAULT_SCALE)
@@ -20,4 +20,44 @@ class ApiRequestError(Exception):
     """Исключение: ошибка при обращении к внешнему API."""
     
     def __init__(self, reason: str):
-        super().__init__(f"Ошибка при обращении к внешнему API: {reason}")
\ No newline at end of file
+        super().__init__(f"Ошибка при обращении к внешнему API: {reason}")
+
+
+class RateLimitExceededError(ApiRequestError):
+    """Исключение: исчерпан бюджет запросов к источнику."""
+    
+    def __init__(self, source: str, retry_after: float):
+        self.source = source
+        self.retry_after = retry_after
+        super().__init__(
+            f"бюджет запросов {source} исчерпан, следующий запрос "
+            f"через {retry_after:.0f} с"
+        )
+
+
+class CorruptedDataError(Exception):
+    """Исключение: файл данных пуст или повреждён."""
+    
+    def __init__(self, path: str, reason: str):
+        self.path = path
+        super().__init__(f"Файл данных '{path}' повреждён: {reason}")
+
+
+class ConcurrentModificationError(Exception):
+    """Исключение: данные изменены другим процессом (конфликт версий)."""
+    
+    def __init__(self, entity: str, expected_version, actual_version):
+        self.entity = entity
+        self.expected_version = expected_version
+        self.actual_version = actual_version
+        super().__init__(
+            f"Конфликт при сохранении {entity}: ожидалась версия "
+            f"{expected_version}, текущая {actual_version}"
+        )
+
+    def __reduce__(self):
+        # Исключение передаётся между процессами (multiprocessing)
+        return (
+            self.__class__,
+            (self.entity, self.expected_version, self.actual_version),
+        )
@@ -0,0 +1,106 @@
+"""Журнал сделок: события и восстановление портфеля по ним.
+
+Каждая покупка и продажа - событие с курсом, временем и балансом
+кошелька после сделки (в минимальных единицах валюты). Событие "state"
+фиксирует портфель целиком: с него начинается журнал портфеля, и им же
+отмечается каждое полное сохранение. Номер события seq равен версии
+портфеля после него, поэтому текущее состояние - это снимок плюс события
+с seq больше его версии, а состояние на момент времени - свёртка событий
+журнала до этого момента.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+from valutatrade_hub.core.money import from_units
+
+TRADE_ACTIONS = ("buy", "sell")
+STATE_ACTION = "state"
+
+
+def build_trade(
+    action: str,
+    currency_code: str,
+    amount: float,
+    rate: float,
+    units: int,
+    timestamp: Optional[str] = None,
+    batch: Optional[int] = None,
+) -> Dict:
+    """Формирует событие сделки; units - баланс кошелька после неё.
+
+    seq событию присваивает хранилище при записи в журнал.
+    """
+    record = {
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "action": action,
+        "currency_code": currency_code,
+        "amount": amount,
+        "rate": rate,
+        "balance": from_units(units, currency_code),
+        "units": units,
+    }
+    if batch:
+        record["batch"] = batch
+    return record
+
+
+def build_state(seq: int, wallets: Dict, timestamp: Optional[str] = None) -> Dict:
+    """Событие с портфелем целиком (кошельки в формате Portfolio.to_dict)"""
+    return {
+        "seq": seq,
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "action": STATE_ACTION,
+        "wallets": wallets,
+    }
+
+
+def apply_event(wallets: Dict[str, Dict], event: Dict):
+    """Применяет событие к кошелькам в формате Portfolio.to_dict()["wallets"]"""
+    if event["action"] == STATE_ACTION:
+        wallets.clear()
+        wallets.update((code, dict(w)) for code, w in event["wallets"].items())
+        return
+    currency_code = event["currency_code"]
+    wallets[currency_code] = {
+        "currency_code": currency_code,
+        "balance": event["balance"],
+        "units": event["units"],
+    }
+
+
+def replay(
+    portfolio_data: Dict, events: Iterable[Dict], until: Optional[datetime] = None
+) -> Dict:
+    """Накатывает на портфель события журнала новее его версии.
+
+    until - только события не позже этого момента. Возвращает новый
+    словарь портфеля, version - seq последнего применённого события.
+    """
+    wallets = {code: dict(w) for code, w in portfolio_data.get("wallets", {}).items()}
+    version = portfolio_data.get("version", 0)
+    for event in events:
+        if event["seq"] <= version:
+            continue
+        if until is not None and datetime.fromisoformat(event["timestamp"]) > until:
+            break
+        apply_event(wallets, event)
+        version = event["seq"]
+    return {**portfolio_data, "wallets": wallets, "version": version}
+
+
+def iter_trades(
+    events: Iterable[Dict],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[Dict]:
+    """Отбирает из событий журнала сделки в интервале [start, end]"""
+    for event in events:
+        if event["action"] not in TRADE_ACTIONS:
+            continue
+        moment = datetime.fromisoformat(event["timestamp"])
+        if start is not None and moment < start:
+            continue
+        if end is not None and moment > end:
+            break
+        yield event
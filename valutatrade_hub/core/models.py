@@ -1,9 +1,45 @@
 import hashlib
 from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from valutatrade_hub.core.money import from_units, to_units
+from valutatrade_hub.core.rate_matrix import RateMatrix
+
+# Справочные курсы для оценки портфеля без актуальных данных
+REFERENCE_RATES = RateMatrix.from_rates(
+    {
+        "USD_USD": 1.0,
+        "EUR_USD": 1.08,
+        "BTC_USD": 50000.0,
+        "ETH_USD": 3000.0,
+        "RUB_USD": 0.011,
+    }
+)
+
+
+def conversion_rate(
+    currency_code: str, base_currency: str, rates: Optional[RateMatrix] = None
+) -> Optional[float]:
+    """Курс для оценки: из матрицы rates, иначе справочный, иначе None"""
+    if currency_code == base_currency:
+        return 1.0
+    rate = rates.rate(currency_code, base_currency) if rates else None
+    if rate is None:
+        rate = REFERENCE_RATES.rate(currency_code, base_currency)
+    return rate
 
 
 class User:
     """Класс пользователя торговой системы."""
+
+    __slots__ = (
+        "_user_id",
+        "_username",
+        "_hashed_password",
+        "_salt",
+        "_registration_date",
+    )
     
     def __init__(
         self,
@@ -102,19 +138,31 @@ class User:
 
 
 class Wallet:
-    """Класс кошелька для хранения средств в определенной валюте."""
+    """Класс кошелька для хранения средств в определенной валюте.
+
+    Баланс хранится целым числом минимальных единиц валюты (см.
+    core/money.py): пополнения и списания точны.
+    """
+
+    __slots__ = ("currency_code", "_units")
     
-    def __init__(self, currency_code: str, balance: float = 0.0):
+    def __init__(
+        self, currency_code: str, balance: float = 0.0, units: Optional[int] = None
+    ):
         if not currency_code or len(currency_code) != 3:
             raise ValueError("Код валюты должен состоять из 3 символов")
             
         self.currency_code = currency_code.upper()
-        self._balance = float(balance)
+        if units is None:
+            units = to_units(balance, self.currency_code)
+        if units < 0:
+            raise ValueError("Баланс не может быть отрицательным")
+        self._units = int(units)
 
     @property
     def balance(self) -> float:
         """Возвращает текущий баланс кошелька."""
-        return self._balance
+        return from_units(self._units, self.currency_code)
 
     @balance.setter
     def balance(self, value: float):
@@ -123,50 +171,67 @@ class Wallet:
             raise ValueError("Баланс должен быть числом")
         if value < 0:
             raise ValueError("Баланс не может быть отрицательным")
-        self._balance = float(value)
+        self._units = to_units(value, self.currency_code)
+
+    @property
+    def units(self) -> int:
+        """Возвращает баланс в минимальных единицах валюты."""
+        return self._units
 
     def deposit(self, amount: float):
         """Пополняет баланс кошелька."""
-        amount = float(amount)
-        if amount <= 0:
+        units = to_units(amount, self.currency_code)
+        if units <= 0:
             raise ValueError("Сумма пополнения должна быть положительной")
-        self.balance += amount
+        self._units += units
 
     def withdraw(self, amount: float):
         """Снимает средства с кошелька."""
-        amount = float(amount)
-        if amount <= 0:
+        units = to_units(amount, self.currency_code)
+        if units <= 0:
             raise ValueError("Сумма снятия должна быть положительной")
-        if amount > self.balance:
+        if units > self._units:
             raise ValueError(
                 f"Недостаточно средств. Доступно: {self.balance:.4f} "
                 f"{self.currency_code}"
             )
-        self.balance -= amount
+        self._units -= units
 
     def get_balance_info(self) -> dict:
         """Возвращает информацию о балансе."""
         return {"currency_code": self.currency_code, "balance": self.balance}
 
     def to_dict(self) -> dict:
-        """Сериализует кошелек в словарь."""
-        return {"currency_code": self.currency_code, "balance": self.balance}
+        """Сериализует кошелек в словарь (units - точный баланс)."""
+        return {
+            "currency_code": self.currency_code,
+            "balance": self.balance,
+            "units": self._units,
+        }
 
     @classmethod
     def from_dict(cls, data: dict):
         """Создает кошелек из словаря."""
-        return cls(currency_code=data["currency_code"], balance=data["balance"])
+        return cls(
+            currency_code=data["currency_code"],
+            balance=data["balance"],
+            units=data.get("units"),
+        )
 
 
 class Portfolio:
     """Класс портфеля пользователя, содержащий коллекцию кошельков."""
+
+    __slots__ = ("_user_id", "_wallets", "version")
     
-    def __init__(self, user_id: int, wallets: dict = None):
+    def __init__(self, user_id: int, wallets: dict = None, version: int = 0):
         if user_id <= 0:
             raise ValueError("ID пользователя должен быть положительным")
             
         self._user_id = user_id
         self._wallets = wallets or {}
+        # Версия сохранённого состояния для оптимистичных блокировок
+        self.version = version
 
     @property
     def user_id(self) -> int:
@@ -174,9 +239,9 @@ class Portfolio:
         return self._user_id
 
     @property
-    def wallets(self) -> dict:
-        """Возвращает копию словаря кошельков."""
-        return self._wallets.copy()
+    def wallets(self) -> Mapping[str, Wallet]:
+        """Возвращает кошельки только для чтения (без копирования)."""
+        return MappingProxyType(self._wallets)
 
     def add_currency(self, currency_code: str):
         """Добавляет новую валюту в портфель."""
@@ -198,29 +263,24 @@ class Portfolio:
             raise ValueError(f"Кошелек для валюты {currency_code} не найден")
         return self._wallets[currency_code]
 
-    def get_total_value(self, base_currency: str = "USD") -> float:
-        """Рассчитывает общую стоимость портфеля в базовой валюте."""
+    def get_total_value(
+        self, base_currency: str = "USD", rates: Optional[RateMatrix] = None
+    ) -> float:
+        """Рассчитывает общую стоимость портфеля в базовой валюте.
+
+        rates - матрица курсов; валюты, которых в ней нет, оцениваются
+        по справочным курсам, а без них пропускаются.
+        """
         if not base_currency or len(base_currency) != 3:
             raise ValueError("Код базовой валюты должен состоять из 3 символов")
         base_currency = base_currency.upper()
 
-        exchange_rates = {
-            "USD_USD": 1.0,
-            "EUR_USD": 1.08,
-            "BTC_USD": 50000.0,
-            "ETH_USD": 3000.0,
-            "RUB_USD": 0.011,
-        }
-
         total_value = 0.0
 
         for currency_code, wallet in self._wallets.items():
-            if currency_code == base_currency:
-                total_value += wallet.balance
-            else:
-                rate_key = f"{currency_code}_{base_currency}"
-                if rate_key in exchange_rates:
-                    total_value += wallet.balance * exchange_rates[rate_key]
+            rate = conversion_rate(currency_code, base_currency, rates)
+            if rate is not None:
+                total_value += wallet.balance * rate
 
         return total_value
 
@@ -239,4 +299,6 @@ class Portfolio:
         for currency_code, wallet_data in data["wallets"].items():
             wallets[currency_code] = Wallet.from_dict(wallet_data)
 
-        return cls(user_id=data["user_id"], wallets=wallets)
\ No newline at end of file
+        return cls(
+            user_id=data["user_id"], wallets=wallets, version=data.get("version", 0)
+        )
\ No newline at end of file
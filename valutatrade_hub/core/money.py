@@ -0,0 +1,117 @@
+"""Денежные суммы в целых минимальных единицах валюты.
+
+Баланс хранится целым числом единиц 10**-scale валюты (центы для
+фиата, сатоши для BTC, wei для ETH - см. currencies.CURRENCY_SCALES),
+поэтому сложение и вычитание точны, а 0.1 BTC, купленные десять раз,
+дают ровно 1 BTC. Суммы на входе переводятся в единицы по их десятичной
+записи (repr для float), курс при пересчёте - тоже, так что пересчёт -
+целочисленная операция с одним округлением половины к чётному в конце.
+"""
+
+from decimal import Decimal
+from typing import Tuple, Union
+
+from valutatrade_hub.core.currencies import CURRENCY_SCALES, get_scale
+
+Amount = Union[int, float, str, Decimal]
+
+# Быстрый путь для float: пока число единиц меньше 2**50, погрешность
+# умножения меньше четверти единицы и round даёт точный результат
+_FAST_LIMIT = float(2**50)
+_POWERS = [10**i for i in range(40)]
+# Множители быстрого пути по валютам справочника (float точен до 10**22)
+_FLOAT_FACTORS = {
+    code: float(10**scale) for code, scale in CURRENCY_SCALES.items() if scale <= 15
+}
+# Для валют точнее 10**-15 (ETH) быстрый путь берёт суммы не точнее 10**-9:
+# если units / 1e9 == amount, то repr(amount) - ровно units * 10**-9,
+# так как десятичные записи до 15 значащих цифр дают разные float
+_WIDE_FACTORS = {
+    code: 10 ** (scale - 9) for code, scale in CURRENCY_SCALES.items() if scale > 15
+}
+_WIDE_LIMIT = 1e15
+
+
+def _decimal_parts(text: str) -> Tuple[int, int]:
+    """'-12.5e-3' -> (-125, -4): значение равно mantissa * 10**exponent"""
+    mantissa, _, exponent = text.strip().lower().partition("e")
+    whole, _, fraction = mantissa.partition(".")
+    digits = whole + fraction
+    if digits in ("", "-", "+"):
+        raise ValueError(f"Некорректная сумма: '{text}'")
+    return int(digits), int(exponent or 0) - len(fraction)
+
+
+def _shift(value: int, places: int) -> int:
+    """value * 10**places с округлением половины к чётному"""
+    if places >= 0:
+        return value * _POWERS[places]
+    divisor = _POWERS[-places] if -places < len(_POWERS) else 10**-places
+    quotient, remainder = divmod(value, divisor)
+    if 2 * remainder > divisor or (2 * remainder == divisor and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def to_units(amount: Amount, currency_code: str) -> int:
+    """Переводит сумму в целые минимальные единицы валюты.
+
+    Знаки сверх точности валюты округляются половиной к чётному.
+    """
+    if type(amount) is float:
+        factor = _FLOAT_FACTORS.get(currency_code)
+        if factor is not None:
+            scaled = amount * factor
+            if -_FAST_LIMIT < scaled < _FAST_LIMIT:
+                units = round(scaled)
+                # Сумма без знаков сверх точности валюты
+                if -1e-6 < scaled - units < 1e-6:
+                    return units
+        else:
+            factor = _WIDE_FACTORS.get(currency_code)
+            if factor is not None:
+                scaled = amount * 1e9
+                if -_WIDE_LIMIT < scaled < _WIDE_LIMIT:
+                    units = round(scaled)
+                    if units / 1e9 == amount:
+                        return units * factor
+    return _exact_units(amount, currency_code)
+
+
+def _exact_units(amount: Amount, currency_code: str) -> int:
+    """to_units через десятичную запись суммы"""
+    scale = get_scale(currency_code)
+    if isinstance(amount, int) and not isinstance(amount, bool):
+        return amount * _POWERS[scale]
+    text = repr(amount) if isinstance(amount, float) else str(amount)
+    mantissa, exponent = _decimal_parts(text)
+    return _shift(mantissa, exponent + scale)
+
+
+def from_units(units: int, currency_code: str) -> float:
+    """Ближайший к сумме в единицах float (для вывода и оценки)"""
+    return units / _POWERS[get_scale(currency_code)]
+
+
+def format_units(units: int, currency_code: str) -> str:
+    """Точная десятичная запись суммы: 150000000 BTC-единиц -> '1.50000000'"""
+    scale = get_scale(currency_code)
+    sign = "-" if units < 0 else ""
+    whole, fraction = divmod(abs(units), _POWERS[scale])
+    if not scale:
+        return f"{sign}{whole}"
+    return f"{sign}{whole}.{fraction:0{scale}d}"
+
+
+def convert_units(
+    units: int, from_code: str, to_code: str, rate: Union[float, str, Decimal]
+) -> int:
+    """Пересчитывает единицы from_code в единицы to_code по курсу rate.
+
+    Курс берётся по его десятичной записи, округляется только результат.
+    """
+    mantissa, exponent = _decimal_parts(
+        repr(rate) if isinstance(rate, float) else str(rate)
+    )
+    places = exponent + get_scale(to_code) - get_scale(from_code)
+    return _shift(units * mantissa, places)
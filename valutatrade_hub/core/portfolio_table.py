@@ -0,0 +1,217 @@
+"""Таблица портфелей для процессов, держащих все портфели в памяти.
+
+Балансы хранятся не объектами Wallet, а столбцами array('d') - по
+одному на валюту, строка - пользователь. Номер столбца валюта получает
+при первом появлении. Кошелька нет - в ячейке NaN, так что нулевой
+баланс и отсутствующий кошелёк различаются. Строка пользователя ищется
+двоичным поиском по отсортированному массиву user_id, без словаря на
+миллион ключей.
+
+Чтение - через PortfolioView, отображение {валюта: баланс} только для
+чтения поверх строки таблицы. Для изменения портфель выгружается в
+объект Portfolio (portfolio()) и возвращается в таблицу через store().
+Точный баланс в минимальных единицах, который float не передаёт
+(например, ETH до wei), хранится отдельно и при выгрузке не теряется.
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from valutatrade_hub.core.models import Portfolio, Wallet, conversion_rate
+from valutatrade_hub.core.money import from_units, to_units
+from valutatrade_hub.core.rate_matrix import RateMatrix
+from valutatrade_hub.core.valuation import BalanceMatrix
+
+_NAN = float("nan")
+
+
+class PortfolioView(Mapping):
+    """Портфель пользователя из таблицы только для чтения: {валюта: баланс}"""
+
+    __slots__ = ("_table", "_user_id")
+
+    def __init__(self, table: "PortfolioTable", user_id: int):
+        self._table = table
+        self._user_id = user_id
+
+    @property
+    def user_id(self) -> int:
+        return self._user_id
+
+    @property
+    def version(self) -> int:
+        return self._table.versions[self._table.row(self._user_id)]
+
+    def __getitem__(self, currency_code: str) -> float:
+        column = self._table.currency_ids.get(currency_code)
+        if column is None:
+            raise KeyError(currency_code)
+        balance = self._table.columns[column][self._table.row(self._user_id)]
+        if math.isnan(balance):
+            raise KeyError(currency_code)
+        return balance
+
+    def __iter__(self) -> Iterator[str]:
+        row = self._table.row(self._user_id)
+        for currency_code, column in zip(self._table.currencies, self._table.columns):
+            if not math.isnan(column[row]):
+                yield currency_code
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def get_total_value(
+        self, base_currency: str = "USD", rates: Optional[RateMatrix] = None
+    ) -> float:
+        """Стоимость портфеля в базовой валюте, как Portfolio.get_total_value"""
+        base_currency = base_currency.upper()
+        total_value = 0.0
+        for currency_code, balance in self.items():
+            rate = conversion_rate(currency_code, base_currency, rates)
+            if rate is not None:
+                total_value += balance * rate
+        return total_value
+
+
+class PortfolioTable:
+    """Балансы всех портфелей в столбцах array('d') по валютам"""
+
+    def __init__(self):
+        self.user_ids = array("q")
+        self.versions = array("q")
+        self.currencies: List[str] = []
+        self.currency_ids: Dict[str, int] = {}
+        self.columns: List[array] = []
+        # (user_id, валюта) -> единицы, если float-баланс их не передаёт
+        self.exact_units: Dict[Tuple[int, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self._find(user_id) is not None
+
+    def _find(self, user_id: int) -> Optional[int]:
+        position = bisect_left(self.user_ids, user_id)
+        if position < len(self.user_ids) and self.user_ids[position] == user_id:
+            return position
+        return None
+
+    def row(self, user_id: int) -> int:
+        """Номер строки пользователя; KeyError, если его нет в таблице"""
+        position = self._find(user_id)
+        if position is None:
+            raise KeyError(user_id)
+        return position
+
+    def _column(self, currency_code: str) -> int:
+        column = self.currency_ids.get(currency_code)
+        if column is None:
+            column = len(self.currencies)
+            self.currency_ids[currency_code] = column
+            self.currencies.append(currency_code)
+            self.columns.append(array("d", [_NAN]) * len(self.user_ids))
+        return column
+
+    def _insert_row(self, user_id: int) -> int:
+        position = bisect_left(self.user_ids, user_id)
+        if position == len(self.user_ids):
+            # Обычный случай: идентификаторы растут, строка дописывается в конец
+            self.user_ids.append(user_id)
+            self.versions.append(0)
+            for column in self.columns:
+                column.append(_NAN)
+        else:
+            self.user_ids.insert(position, user_id)
+            self.versions.insert(position, 0)
+            for column in self.columns:
+                column.insert(position, _NAN)
+        return position
+
+    def _set_row(self, user_id: int, balances: Iterable, version: int):
+        row = self._find(user_id)
+        if row is None:
+            row = self._insert_row(user_id)
+        else:
+            for currency_code, column in zip(self.currencies, self.columns):
+                column[row] = _NAN
+                self.exact_units.pop((user_id, currency_code), None)
+        for currency_code, balance, units in balances:
+            # Как Wallet: баланс без units округляется до точности валюты
+            if units is None:
+                units = to_units(balance, currency_code)
+            balance = from_units(units, currency_code)
+            if to_units(balance, currency_code) != units:
+                self.exact_units[(user_id, currency_code)] = units
+            self.columns[self._column(currency_code)][row] = balance
+        self.versions[row] = version
+
+    def load(self, data: Dict):
+        """Записывает портфель в формате Portfolio.to_dict() в таблицу"""
+        self._set_row(
+            data["user_id"],
+            (
+                (currency_code, float(wallet["balance"]), wallet.get("units"))
+                for currency_code, wallet in data.get("wallets", {}).items()
+            ),
+            data.get("version", 0),
+        )
+
+    def store(self, portfolio: Portfolio):
+        """Возвращает в таблицу изменённый объект Portfolio"""
+        self._set_row(
+            portfolio.user_id,
+            (
+                (currency_code, wallet.balance, wallet.units)
+                for currency_code, wallet in portfolio.wallets.items()
+            ),
+            portfolio.version,
+        )
+
+    @classmethod
+    def from_portfolios(cls, portfolios: Iterable[Dict]) -> "PortfolioTable":
+        """Строит таблицу из портфелей в формате Portfolio.to_dict()"""
+        table = cls()
+        for data in portfolios:
+            table.load(data)
+        return table
+
+    def get(self, user_id: int) -> Optional[PortfolioView]:
+        """Возвращает портфель только для чтения или None"""
+        if self._find(user_id) is None:
+            return None
+        return PortfolioView(self, user_id)
+
+    def portfolio(self, user_id: int) -> Optional[Portfolio]:
+        """Выгружает портфель в изменяемый объект Portfolio или None"""
+        view = self.get(user_id)
+        if view is None:
+            return None
+        wallets = {
+            code: Wallet(code, balance, self.exact_units.get((user_id, code)))
+            for code, balance in view.items()
+        }
+        return Portfolio(user_id, wallets, version=view.version)
+
+    def balance_matrix(self) -> BalanceMatrix:
+        """Матрица балансов для оценки всех портфелей (нет кошелька - 0.0)"""
+        if np is not None:
+            balances = np.zeros((len(self), len(self.columns)))
+            for i, column in enumerate(self.columns):
+                balances[:, i] = np.nan_to_num(np.asarray(column), nan=0.0)
+            # Копия: представление не дало бы дописывать строки в user_ids
+            user_ids = np.array(self.user_ids, dtype=np.int64)
+            return BalanceMatrix(user_ids, self.currencies, balances)
+        columns = [
+            array("d", (0.0 if math.isnan(b) else b for b in column))
+            for column in self.columns
+        ]
+        return BalanceMatrix(array("q", self.user_ids), self.currencies, columns)
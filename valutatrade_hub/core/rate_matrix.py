@@ -0,0 +1,163 @@
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Валюты-посредники в порядке предпочтения при поиске кросс-курса
+DEFAULT_PIVOTS = ("USD", "EUR", "BTC")
+
+# (курс, время обновления, срок годности) - время в секундах Unix time
+Quote = Tuple[float, float, float]
+
+_NAN = float("nan")
+_INF = float("inf")
+
+
+class RateMatrix:
+    """Матрица курсов N×N между всеми известными валютами.
+
+    Строится один раз из котировок вида "EUR_USD" (как в rates.json):
+    прямые котировки, обратные к ним и кросс-курсы через валюты-
+    посредники. После этого любая конвертация - поиск по индексу за O(1).
+
+    Рядом с курсами хранятся матрицы времени обновления и срока годности:
+    для кросс-курса это самое раннее значение среди его котировок.
+    При наличии NumPy матрицы - массивы float64, иначе списки списков.
+    """
+
+    def __init__(
+        self,
+        currencies: Sequence[str],
+        rates,
+        updated_at,
+        expires_at,
+        version=None,
+    ):
+        self.currencies: List[str] = list(currencies)
+        self.index: Dict[str, int] = {code: i for i, code in enumerate(currencies)}
+        self.rates = rates
+        self.updated_at = updated_at
+        self.expires_at = expires_at
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.currencies)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    @classmethod
+    def build(
+        cls,
+        quotes: Dict[str, Quote],
+        pivots: Iterable[str] = DEFAULT_PIVOTS,
+        version=None,
+    ) -> "RateMatrix":
+        """Строит матрицу из котировок {"FROM_TO": (курс, обновлён, годен до)}.
+
+        Прямая котировка важнее обратной, обратная - важнее кросс-курса.
+        Недостающие курсы достраиваются через посредников: сначала через
+        pivots по порядку, затем через остальные валюты, так что путь
+        может проходить через несколько посредников.
+        """
+        parsed = []
+        codes = set()
+        for key, (rate, updated, expires) in quotes.items():
+            from_code, _, to_code = key.partition("_")
+            if not to_code or not rate or not math.isfinite(rate) or rate <= 0:
+                continue
+            parsed.append((from_code, to_code, float(rate), updated, expires))
+            codes.update((from_code, to_code))
+
+        currencies = sorted(codes)
+        index = {code: i for i, code in enumerate(currencies)}
+        n = len(currencies)
+        order = [index[code] for code in pivots if code in index]
+        order += [i for i in range(n) if i not in order]
+
+        if np is not None:
+            rates = np.full((n, n), np.nan)
+            updated_at = np.full((n, n), np.nan)
+            expires_at = np.full((n, n), np.nan)
+        else:
+            rates = [[_NAN] * n for _ in range(n)]
+            updated_at = [[_NAN] * n for _ in range(n)]
+            expires_at = [[_NAN] * n for _ in range(n)]
+
+        for i in range(n):
+            rates[i][i] = 1.0
+            updated_at[i][i] = _INF
+            expires_at[i][i] = _INF
+        for from_code, to_code, rate, updated, expires in parsed:
+            i, j = index[from_code], index[to_code]
+            rates[i][j], updated_at[i][j], expires_at[i][j] = rate, updated, expires
+        for from_code, to_code, rate, updated, expires in parsed:
+            i, j = index[from_code], index[to_code]
+            if math.isnan(rates[j][i]):
+                rates[j][i], updated_at[j][i], expires_at[j][i] = (
+                    1.0 / rate,
+                    updated,
+                    expires,
+                )
+
+        if np is not None:
+            cls._close_numpy(rates, updated_at, expires_at, order)
+        else:
+            cls._close_python(rates, updated_at, expires_at, order)
+        return cls(currencies, rates, updated_at, expires_at, version)
+
+    @staticmethod
+    def _close_numpy(rates, updated_at, expires_at, order: List[int]):
+        """Достраивает кросс-курсы: шаг по посреднику k - одна операция O(N²)"""
+        for k in order:
+            candidate = np.outer(rates[:, k], rates[k, :])
+            missing = np.isnan(rates) & ~np.isnan(candidate)
+            if not missing.any():
+                continue
+            updated = np.minimum.outer(updated_at[:, k], updated_at[k, :])
+            expires = np.minimum.outer(expires_at[:, k], expires_at[k, :])
+            rates[missing] = candidate[missing]
+            updated_at[missing] = updated[missing]
+            expires_at[missing] = expires[missing]
+
+    @staticmethod
+    def _close_python(rates, updated_at, expires_at, order: List[int]):
+        n = len(rates)
+        for k in order:
+            row_k = rates[k]
+            for i in range(n):
+                rate_ik = rates[i][k]
+                if math.isnan(rate_ik):
+                    continue
+                row_i = rates[i]
+                for j in range(n):
+                    if math.isnan(row_i[j]) and not math.isnan(row_k[j]):
+                        row_i[j] = rate_ik * row_k[j]
+                        updated_at[i][j] = min(updated_at[i][k], updated_at[k][j])
+                        expires_at[i][j] = min(expires_at[i][k], expires_at[k][j])
+
+    @classmethod
+    def from_rates(cls, rates: Dict[str, float], **kwargs) -> "RateMatrix":
+        """Строит матрицу из курсов без отметок времени (бессрочных)"""
+        return cls.build(
+            {key: (rate, _INF, _INF) for key, rate in rates.items()}, **kwargs
+        )
+
+    def lookup(self, from_code: str, to_code: str) -> Optional[Quote]:
+        """Возвращает (курс, обновлён, годен до) или None, если пути нет"""
+        i = self.index.get(from_code)
+        j = self.index.get(to_code)
+        if i is None or j is None:
+            return None
+        rate = float(self.rates[i][j])
+        if math.isnan(rate):
+            return None
+        return rate, float(self.updated_at[i][j]), float(self.expires_at[i][j])
+
+    def rate(self, from_code: str, to_code: str) -> Optional[float]:
+        """Возвращает курс from_code→to_code без учёта срока годности"""
+        quote = self.lookup(from_code, to_code)
+        return quote[0] if quote is not None else None
@@ -0,0 +1,187 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from valutatrade_hub.core.rate_matrix import RateMatrix
+from valutatrade_hub.core.rates_snapshot import RatesSnapshot, RatesSnapshotStore
+
+
+class RatesCache:
+    """Кеш курсов на уровне процесса.
+
+    Курсы берутся из текущего снимка RatesSnapshotStore (файл читается,
+    только когда меняется версия хранилища) и сводятся в матрицу
+    RateMatrix со всеми прямыми, обратными и кросс-курсами. Матрица
+    строится один раз на версию снимка и хранится в самом снимке, так
+    что запрос курса - это поиск по индексу. Запись считается промахом,
+    если истёк срок годности её источника из source_ttl (по умолчанию
+    ttl_seconds); у кросс-курса - самой старой из котировок. Ещё
+    grace_seconds после истечения курс отдаётся с пометкой stale.
+    """
+
+    def __init__(
+        self,
+        snapshots: RatesSnapshotStore,
+        ttl_seconds: int,
+        source_ttl: Optional[Dict[str, int]] = None,
+        grace_seconds: int = 0,
+    ):
+        self.snapshots = snapshots
+        self.ttl = ttl_seconds
+        self.source_ttl = dict(source_ttl or {})
+        self.grace = grace_seconds
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._matrix = RateMatrix.build({})
+
+    def _build_matrix(self, snapshot: RatesSnapshot) -> RateMatrix:
+        quotes = {}
+        for key, quote in snapshot:
+            try:
+                updated_at = datetime.fromisoformat(quote.updated_at).timestamp()
+            except (TypeError, ValueError):
+                continue
+            ttl = self.source_ttl.get(quote.source, self.ttl)
+            quotes[key] = (quote.rate, updated_at, updated_at + ttl)
+        self.reloads += 1
+        return RateMatrix.build(quotes, version=snapshot.version)
+
+    def _reload_if_changed(self):
+        """Берёт матрицу текущего снимка (строится один раз на версию)"""
+        snapshot = self.snapshots.current()
+        self._matrix = snapshot.derive(f"rate_matrix:{id(self)}", self._build_matrix)
+
+    def matrix(self) -> RateMatrix:
+        """Возвращает актуальную матрицу курсов (без учёта срока годности)"""
+        with self._lock:
+            self._reload_if_changed()
+            return self._matrix
+
+    def _lookup(self, from_code: str, to_code: str, now: float) -> Optional[dict]:
+        quote = self._matrix.lookup(from_code, to_code)
+        if quote is None or now > quote[2] + self.grace:
+            self.misses += 1
+            return None
+        rate, updated_at, expires_at = quote
+        stale = now > expires_at
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        if updated_at == float("inf"):
+            updated_at = now
+        return {
+            "rate": rate,
+            "updated_at": datetime.fromtimestamp(updated_at).isoformat(),
+            "stale": stale,
+        }
+
+    def get_pair(self, from_code: str, to_code: str) -> Optional[dict]:
+        """Возвращает курс {"rate", "updated_at", "stale"} или None.
+
+        stale=True - срок годности истёк, но не больше grace_seconds назад.
+        """
+        return self.get_pairs([(from_code, to_code)])[(from_code, to_code)]
+
+    def get_pairs(
+        self, pairs: Iterable[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Optional[dict]]:
+        """Возвращает курсы нескольких пар из одного снимка, как get_pair"""
+        with self._lock:
+            self._reload_if_changed()
+            now = time.time()
+            return {
+                (from_code, to_code): self._lookup(from_code, to_code, now)
+                for from_code, to_code in pairs
+            }
+
+    def get(self, rate_key: str) -> Optional[dict]:
+        """Возвращает запись курса по ключу вида "EUR_USD" или None"""
+        from_code, _, to_code = rate_key.partition("_")
+        return self.get_pair(from_code, to_code)
+
+    def invalidate(self):
+        """Сбрасывает кеш: следующее обращение перечитает хранилище"""
+        self.snapshots.invalidate()
+
+    def stats(self) -> dict:
+        """Возвращает счётчики попаданий и промахов"""
+        with self._lock:
+            total = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._matrix) ** 2,
+            }
+
+
+class BackgroundRefresh:
+    """Фоновое обновление курсов с объединением одинаковых запросов.
+
+    trigger(key) запускает refresh(key) в фоновом потоке, если для key
+    обновление ещё не идёт; повторные запросы присоединяются к нему.
+    После запуска следующий для того же key возможен не раньше чем
+    через cooldown секунд, чтобы недоступный источник не опрашивался
+    на каждый промах. Вызывающий поток сети не ждёт. name - имя задачи
+    в названиях потоков и сообщениях (так же фоново снимаются портфели).
+    """
+
+    def __init__(
+        self,
+        refresh: Callable[[str], Any],
+        cooldown: float = 0.0,
+        name: str = "rates refresh",
+    ):
+        self.refresh = refresh
+        self.cooldown = cooldown
+        self.name = name
+        self.started = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, threading.Thread] = {}
+        self._last_started: Dict[str, float] = {}
+
+    def trigger(self, key: str) -> bool:
+        """Запускает обновление key; False - оно уже идёт или было недавно"""
+        with self._lock:
+            now = time.monotonic()
+            last_started = self._last_started.get(key)
+            if key in self._in_flight or (
+                last_started is not None and now - last_started < self.cooldown
+            ):
+                self.coalesced += 1
+                return False
+            thread = threading.Thread(
+                target=self._run,
+                args=(key,),
+                name=f"{self.name.replace(' ', '-')}:{key}",
+            )
+            thread.daemon = True
+            self._in_flight[key] = thread
+            self._last_started[key] = now
+            self.started += 1
+        thread.start()
+        return True
+
+    def _run(self, key: str):
+        try:
+            self.refresh(key)
+        except Exception as e:
+            print(f"WARNING: Background {self.name} '{key}' failed: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def wait(self, timeout: Optional[float] = None):
+        """Дожидается идущих обновлений (для выхода и замеров)"""
+        with self._lock:
+            threads = list(self._in_flight.values())
+        for thread in threads:
+            thread.join(timeout)
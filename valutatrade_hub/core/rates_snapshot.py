@@ -0,0 +1,205 @@
+"""Неизменяемые версионированные снимки текущих курсов.
+
+Обновитель курсов собирает новый RatesSnapshot целиком и публикует его
+через RatesSnapshotStore: снимок атомарно записывается в хранилище
+(rates.json заменяется переименованием) и подменяет текущий в памяти
+одной операцией присваивания. Читатели получают готовый объект без
+разбора файла и без обращения к нему: версия хранилища сверяется не
+чаще раза в rates_version_check_seconds, и другой процесс перечитывает
+хранилище, только когда она изменилась.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, Mapping, NamedTuple, Optional, Tuple
+
+from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.durable import group_commit
+from valutatrade_hub.infra.locks import file_lock
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+class RateQuote(NamedTuple):
+    """Курс валютной пары в снимке"""
+
+    rate: float
+    updated_at: str
+    source: Optional[str]
+
+
+class RatesSnapshot:
+    """Неизменяемый снимок текущих курсов.
+
+    version растёт с каждой публикацией, refreshed_at - время
+    публикации, rates - {валютная_пара: RateQuote} только для чтения.
+    Производные данные (матрицу курсов и т.п.) можно кешировать прямо
+    в снимке через derive(): они живут ровно столько, сколько версия.
+    """
+
+    __slots__ = ("version", "refreshed_at", "source", "rates", "_derived", "_lock")
+
+    def __init__(
+        self,
+        version: int,
+        refreshed_at: Optional[str],
+        rates: Mapping[str, RateQuote],
+        source: str = "ParserService",
+    ):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "refreshed_at", refreshed_at)
+        object.__setattr__(self, "source", source)
+        object.__setattr__(self, "rates", MappingProxyType(dict(rates)))
+        object.__setattr__(self, "_derived", {})
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RatesSnapshot неизменяем")
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    def __iter__(self) -> Iterator[Tuple[str, RateQuote]]:
+        return iter(self.rates.items())
+
+    def get(self, currency_pair: str) -> Optional[RateQuote]:
+        """Возвращает курс пары или None"""
+        return self.rates.get(currency_pair)
+
+    def derive(self, name: str, factory: Callable[["RatesSnapshot"], Any]) -> Any:
+        """Возвращает производное значение, вычисляя его один раз на версию"""
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = factory(self)
+            return self._derived[name]
+
+    def to_dict(self) -> Dict:
+        """Сериализует снимок в формат rates.json"""
+        data = {
+            "source": self.source,
+            "last_refresh": self.refreshed_at,
+            "version": self.version,
+        }
+        for currency_pair, quote in self.rates.items():
+            data[currency_pair] = quote._asdict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RatesSnapshot":
+        """Создаёт снимок из данных rates.json (версия 0, если её нет)"""
+        rates = {}
+        for key, value in data.items():
+            if isinstance(value, dict) and "rate" in value:
+                rates[key] = RateQuote(
+                    value["rate"], value.get("updated_at"), value.get("source")
+                )
+        try:
+            version = int(data.get("version") or 0)
+        except (TypeError, ValueError):
+            version = 0
+        return cls(
+            version,
+            data.get("last_refresh"),
+            rates,
+            data.get("source") or "ParserService",
+        )
+
+
+EMPTY_SNAPSHOT = RatesSnapshot(0, None, {})
+
+
+class RatesSnapshotStore:
+    """Текущий снимок курсов процесса (синглтон)"""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.db = DatabaseManager()
+        self._lock = threading.Lock()
+        self._snapshot = EMPTY_SNAPSHOT
+        self._storage_version = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self.check_interval = SettingsLoader().get("rates_version_check_seconds", 1)
+        self.reloads = 0
+        self._initialized = True
+
+    def _lock_path(self) -> str:
+        return os.path.join(SettingsLoader().get("data_path", "data/"), "rates.lock")
+
+    def _reload_if_changed(self):
+        """Перечитывает снимок, если хранилище изменил другой процесс"""
+        self._checked_at = time.monotonic()
+        storage_version = self.db.rates_version()
+        if self._loaded and storage_version == self._storage_version:
+            return
+        self._snapshot = RatesSnapshot.from_dict(self.db.load_rates())
+        self._storage_version = storage_version
+        self._loaded = True
+        self.reloads += 1
+
+    def current(self) -> RatesSnapshot:
+        """Возвращает текущий снимок курсов.
+
+        Хранилище проверяется не чаще раза в check_interval секунд,
+        остальные чтения обходятся без файлового ввода-вывода.
+        """
+        with self._lock:
+            if (
+                not self._loaded
+                or time.monotonic() - self._checked_at >= self.check_interval
+            ):
+                self._reload_if_changed()
+            return self._snapshot
+
+    def publish(
+        self,
+        rates: Mapping[str, RateQuote],
+        refreshed_at: Optional[str] = None,
+        source: str = "ParserService",
+        merge: bool = False,
+    ) -> RatesSnapshot:
+        """Публикует новый снимок со следующей версией.
+
+        С merge=True пары, которых нет в rates, переносятся из текущего
+        снимка (так источники обновляются порознь). Снимок сначала
+        атомарно сохраняется в хранилище и только потом становится
+        текущим, поэтому читатели никогда не видят версию, которой нет
+        на диске. Публикации разных процессов упорядочиваются файловой
+        блокировкой.
+        """
+        with self._lock, file_lock(self._lock_path()):
+            self._reload_if_changed()
+            if merge:
+                rates = {**self._snapshot.rates, **rates}
+            snapshot = RatesSnapshot(
+                self._snapshot.version + 1,
+                refreshed_at or datetime.now().isoformat(),
+                rates,
+                source,
+            )
+            # Запись фиксируется до снятия блокировки, даже внутри group_commit
+            with group_commit(join=False):
+                self.db.save_rates(snapshot.to_dict())
+            self._snapshot = snapshot
+            self._storage_version = self.db.rates_version()
+            return snapshot
+
+    def invalidate(self):
+        """Сбрасывает снимок: следующее обращение перечитает хранилище"""
+        with self._lock:
+            self._loaded = False
@@ -1,57 +1,56 @@
-import json
-import os
-from datetime import datetime, timedelta
+import math
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from valutatrade_hub.core.currencies import get_currency
 from valutatrade_hub.core.exceptions import (
     ApiRequestError,
+    ConcurrentModificationError,
+    CorruptedDataError,
     InsufficientFundsError,
 )
-from valutatrade_hub.core.models import Portfolio, User
-from valutatrade_hub.decorators import log_action
+from valutatrade_hub.core.journal import build_trade, iter_trades, replay
+from valutatrade_hub.core.models import Portfolio, User, conversion_rate
+from valutatrade_hub.core.money import convert_units, from_units, to_units
+from valutatrade_hub.core.portfolio_table import PortfolioTable
+from valutatrade_hub.core.rates_cache import BackgroundRefresh, RatesCache
+from valutatrade_hub.core.rates_snapshot import RatesSnapshot, RatesSnapshotStore
+from valutatrade_hub.core.valuation import BalanceMatrix
+from valutatrade_hub.decorators import log_action, retry_on_conflict
+from valutatrade_hub.infra.database import DatabaseManager
 from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.logging_config import logger
 
 settings = SettingsLoader()
+db = DatabaseManager()
+rates_snapshots = RatesSnapshotStore()
+rates_cache = RatesCache(
+    rates_snapshots,
+    settings.get("rates_ttl_seconds", 300),
+    settings.get("source_ttl_seconds", {}),
+    settings.get("rates_grace_seconds", 0),
+)
 _current_user = None
 
 
-def _load_json_file(file_path):
-    """Универсальная загрузка JSON файла"""
-    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-        return []
-    with open(file_path, "r") as f:
-        return json.load(f)
-
-
-def _save_json_file(file_path, data):
-    """Универсальное сохранение в JSON файл"""
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
+@retry_on_conflict()
+def _create_user(username: str, password: str) -> User:
+    """Создаёт пользователя; идентификатор перечитывается при конфликте"""
+    user = User.create_new(db.next_user_id(), username, password)
+    db.add_user(user.to_dict())
+    return user
 
 
 @log_action(action="REGISTER")
 def register_user(username: str, password: str) -> User:
-    data_path = settings.get("data_path", "data/")
-    users_file = os.path.join(data_path, "users.json")
-    os.makedirs(data_path, exist_ok=True)
-
     try:
-        users = _load_json_file(users_file)
-
-        if any(user["username"] == username for user in users):
+        if db.get_user(username) is not None:
             raise ValueError(f"Имя пользователя '{username}' уже занято")
 
-        user_id = max((user["user_id"] for user in users), default=0) + 1
-        user = User.create_new(user_id, username, password)
-
-        users.append(user.to_dict())
-        _save_json_file(users_file, users)
+        user = _create_user(username, password)
 
         # Создаем пустой портфель
-        portfolios_file = os.path.join(data_path, "portfolios.json")
-        portfolios = _load_json_file(portfolios_file)
-        portfolios.append({"user_id": user_id, "wallets": {}})
-        _save_json_file(portfolios_file, portfolios)
+        db.save_portfolio(Portfolio(user.user_id, {}).to_dict())
 
         return user
 
@@ -63,27 +62,19 @@ def register_user(username: str, password: str) -> User:
 def login_user(username: str, password: str) -> User:
     global _current_user
 
-    data_path = settings.get("data_path", "data/")
-    users_file = os.path.join(data_path, "users.json")
-
-    if not os.path.exists(users_file):
-        raise ValueError(f"Пользователь '{username}' не найден")
-
     try:
-        users = _load_json_file(users_file)
-
-        for user_data in users:
-            if user_data["username"] == username:
-                user = User.from_dict(user_data)
-                if user.verify_password(password):
-                    _current_user = user
-                    return user
-                raise ValueError("Неверный пароль")
+        user_data = db.get_user(username)
+        if user_data is None:
+            raise ValueError(f"Пользователь '{username}' не найден")
 
-        raise ValueError(f"Пользователь '{username}' не найден")
+        user = User.from_dict(user_data)
+        if user.verify_password(password):
+            _current_user = user
+            return user
+        raise ValueError("Неверный пароль")
 
     except Exception as e:
-            raise ValueError(str(e))
+        raise ValueError(str(e))
 
 
 def get_current_user():
@@ -96,17 +87,10 @@ def logout_user():
 
 
 def get_user_portfolio(user_id: int) -> Portfolio:
-    data_path = settings.get("data_path", "data/")
-    portfolios_file = os.path.join(data_path, "portfolios.json")
-
-    if not os.path.exists(portfolios_file):
-        return Portfolio(user_id, {})
-
     try:
-        portfolios = _load_json_file(portfolios_file)
-        for portfolio_data in portfolios:
-            if portfolio_data["user_id"] == user_id:
-                return Portfolio.from_dict(portfolio_data)
+        portfolio_data = db.load_portfolio(user_id)
+        if portfolio_data is not None:
+            return Portfolio.from_dict(portfolio_data)
         return Portfolio(user_id, {})
 
     except Exception as e:
@@ -118,22 +102,17 @@ def get_portfolio_display(user_id: int, base_currency: str = None) -> dict:
     get_currency(base_currency)  # Валидация
 
     portfolio = get_user_portfolio(user_id)
-    total_value = portfolio.get_total_value(base_currency)
+    rates = rates_cache.matrix()
+    total_value = portfolio.get_total_value(base_currency, rates)
 
     wallets_display = []
     for currency_code, wallet in portfolio.wallets.items():
-        value_in_base = (
-            wallet.balance
-            if currency_code == base_currency
-            else Portfolio(user_id, {currency_code: wallet}).get_total_value(
-                base_currency
-            )
-        )
+        rate = conversion_rate(currency_code, base_currency, rates)
         wallets_display.append(
             {
                 "currency_code": currency_code,
                 "balance": wallet.balance,
-                "value_in_base": value_in_base,
+                "value_in_base": wallet.balance * rate if rate is not None else 0.0,
             }
         )
 
@@ -144,7 +123,52 @@ def get_portfolio_display(user_id: int, base_currency: str = None) -> dict:
     }
 
 
+def load_portfolio_table() -> PortfolioTable:
+    """Загружает все портфели в компактную таблицу для работы в памяти"""
+    return PortfolioTable.from_portfolios(db.iter_portfolios())
+
+
+def load_balance_matrix() -> BalanceMatrix:
+    """Загружает балансы всех пользователей в матрицу пользователи × валюты.
+
+    Портфели читаются в PortfolioTable: столбцы array('d') вместо
+    словаря на каждый портфель, из них строится матрица.
+    """
+    return load_portfolio_table().balance_matrix()
+
+
+def value_all_portfolios(
+    base_currency: str = None, balances: Optional[BalanceMatrix] = None
+) -> Dict[int, float]:
+    """Оценивает портфели всех пользователей: {user_id: стоимость в базе}"""
+    base_currency = base_currency or settings.get("default_base_currency", "USD")
+    get_currency(base_currency)  # Валидация
+    balances = balances if balances is not None else load_balance_matrix()
+    return balances.totals(base_currency, rates_cache.matrix())
+
+
+def get_leaderboard(
+    base_currency: str = None,
+    limit: int = 10,
+    balances: Optional[BalanceMatrix] = None,
+) -> List[Tuple[int, float]]:
+    """Самые дорогие портфели: [(user_id, стоимость в базе)] по убыванию"""
+    base_currency = base_currency or settings.get("default_base_currency", "USD")
+    get_currency(base_currency)  # Валидация
+    balances = balances if balances is not None else load_balance_matrix()
+    return balances.top(limit, base_currency, rates_cache.matrix())
+
+
+def _usd_value(currency_code: str, amount: float, rate: float) -> float:
+    """Стоимость суммы в USD, пересчитанная точно и округлённая до цента"""
+    usd_units = convert_units(
+        to_units(amount, currency_code), currency_code, "USD", rate
+    )
+    return from_units(usd_units, "USD")
+
+
 @log_action(action="BUY", verbose=True)
+@retry_on_conflict()
 def buy_currency(user_id: int, currency_code: str, amount: float) -> dict:
     if amount <= 0:
         raise ValueError("'amount' должен быть положительным числом")
@@ -161,18 +185,22 @@ def buy_currency(user_id: int, currency_code: str, amount: float) -> dict:
     wallet = portfolio.get_wallet(currency_code)
     old_balance = wallet.balance
     wallet.deposit(amount)
-    save_portfolio(portfolio)
+    _record_trades(
+        portfolio,
+        [build_trade("buy", wallet.currency_code, amount, rate, wallet.units)],
+    )
 
     return {
         "amount": amount,
         "rate": rate,
         "old_balance": old_balance,
         "new_balance": wallet.balance,
-        "cost": amount * rate,
+        "cost": _usd_value(currency_code, amount, rate),
     }
 
 
 @log_action(action="SELL", verbose=True)
+@retry_on_conflict()
 def sell_currency(user_id: int, currency_code: str, amount: float) -> dict:
     if amount <= 0:
         raise ValueError("'amount' должен быть положительным числом")
@@ -192,101 +220,290 @@ def sell_currency(user_id: int, currency_code: str, amount: float) -> dict:
     wallet = portfolio.get_wallet(currency_code)
     old_balance = wallet.balance
 
-    if amount > wallet.balance:
+    if to_units(amount, currency_code) > wallet.units:
         raise InsufficientFundsError(wallet.balance, amount, currency_code)
 
     wallet.withdraw(amount)
-    save_portfolio(portfolio)
+    _record_trades(
+        portfolio,
+        [build_trade("sell", wallet.currency_code, amount, rate, wallet.units)],
+    )
 
     return {
         "amount": amount,
         "rate": rate,
         "old_balance": old_balance,
         "new_balance": wallet.balance,
-        "revenue": amount * rate,
+        "revenue": _usd_value(currency_code, amount, rate),
     }
 
 
-def get_exchange_rate(from_currency: str, to_currency: str) -> dict:
-    get_currency(from_currency)  # Валидация
-    get_currency(to_currency)  # Валидация
+ORDER_ACTIONS = ("buy", "sell")
 
-    ttl_seconds = settings.get("rates_ttl_seconds", 300)
-    data_path = settings.get("data_path", "data/")
-    rates_file = os.path.join(data_path, "rates.json")
 
-    if os.path.exists(rates_file):
+def _validate_orders(orders: List[dict]) -> List[Tuple[str, str, float]]:
+    """Проверяет все заявки до исполнения: [(действие, валюта, сумма)]"""
+    if not orders:
+        raise ValueError("Пакет заявок пуст")
+    validated = []
+    for number, order in enumerate(orders, start=1):
         try:
-            rates_data = _load_json_file(rates_file)
-            rate_key = f"{from_currency}_{to_currency}"
-            if rate_key in rates_data:
-                rate_info = rates_data[rate_key]
-                updated_at = datetime.fromisoformat(rate_info["updated_at"])
-                if datetime.now() - updated_at <= timedelta(seconds=ttl_seconds):
-                    reverse_rate = 1 / rate_info["rate"]
-                    return {
-                        "from_currency": from_currency,
-                        "to_currency": to_currency,
-                        "rate": rate_info["rate"],
-                        "updated_at": rate_info["updated_at"],
-                        "reverse_rate": reverse_rate,
-                    }
-        except Exception:
-            pass
-
-    stub_rates = {
-        "EUR_USD": 1.0786,
-        "BTC_USD": 59337.21,
-        "USD_BTC": 0.00001685,
-        "USD_EUR": 0.93,
-        "ETH_USD": 3720.00,
-    }
+            action = str(order["action"]).lower()
+            currency_code = str(order["currency"]).upper()
+            amount = float(order["amount"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(
+                f"Заявка {number}: ожидаются поля action, currency и amount"
+            )
+        if action not in ORDER_ACTIONS:
+            raise ValueError(f"Заявка {number}: неизвестное действие '{action}'")
+        if not math.isfinite(amount) or amount <= 0:
+            raise ValueError(
+                f"Заявка {number}: 'amount' должен быть положительным числом"
+            )
+        get_currency(currency_code)  # Валидация
+        validated.append((action, currency_code, amount))
+    return validated
+
+
+def execute_orders(user_id: int, orders: List[dict]) -> List[dict]:
+    """Исполняет пакет заявок [{"action", "currency", "amount"}] целиком.
+
+    Заявки проверяются заранее, курсы берутся из одного снимка, портфель
+    читается и сохраняется один раз. Если хоть одна заявка не проходит,
+    не исполняется ни одна. Результат - по заявке на элемент, в формате
+    buy_currency / sell_currency с полями action и currency_code.
+    """
+    try:
+        results = _execute_orders(user_id, _validate_orders(orders))
+    except Exception as e:
+        logger.error(
+            f"BATCH user='{user_id}' result=ERROR "
+            f"error_type={type(e).__name__} error_message='{str(e)}'"
+        )
+        raise
+
+    for result in results:
+        logger.info(
+            f"{result['action'].upper()} user='{user_id}' "
+            f"currency='{result['currency_code']}' amount={result['amount']} "
+            f"rate={result['rate']} base='USD' batch={len(results)}"
+        )
+    return results
+
+
+@retry_on_conflict()
+def _execute_orders(
+    user_id: int, validated: List[Tuple[str, str, float]]
+) -> List[dict]:
+    rates = get_exchange_rates({(code, "USD") for _, code, _ in validated})
 
-    rate_key = f"{from_currency}_{to_currency}"
-    if rate_key in stub_rates:
-        rate = stub_rates[rate_key]
-    else:
-        reverse_key = f"{to_currency}_{from_currency}"
-        if reverse_key in stub_rates:
-            rate = 1 / stub_rates[reverse_key]
+    portfolio = get_user_portfolio(user_id)
+    results = []
+    trades = []
+    for number, (action, currency_code, amount) in enumerate(validated, start=1):
+        rate = rates[(currency_code, "USD")]["rate"]
+        if currency_code not in portfolio.wallets:
+            if action == "sell":
+                raise ValueError(
+                    f"Заявка {number}: у вас нет кошелька '{currency_code}'"
+                )
+            portfolio.add_currency(currency_code)
+        wallet = portfolio.get_wallet(currency_code)
+        old_balance = wallet.balance
+
+        result = {"action": action, "currency_code": currency_code}
+        if action == "buy":
+            wallet.deposit(amount)
+            result.update(
+                amount=amount,
+                rate=rate,
+                old_balance=old_balance,
+                new_balance=wallet.balance,
+                cost=_usd_value(currency_code, amount, rate),
+            )
         else:
-            raise ApiRequestError(f"Курс {from_currency}→{to_currency} недоступен")
+            if to_units(amount, currency_code) > wallet.units:
+                raise InsufficientFundsError(wallet.balance, amount, currency_code)
+            wallet.withdraw(amount)
+            result.update(
+                amount=amount,
+                rate=rate,
+                old_balance=old_balance,
+                new_balance=wallet.balance,
+                revenue=_usd_value(currency_code, amount, rate),
+            )
+        results.append(result)
+        trades.append(
+            build_trade(
+                action,
+                currency_code,
+                amount,
+                rate,
+                wallet.units,
+                batch=len(validated),
+            )
+        )
+
+    # Одна запись на пакет: до неё изменения есть только в памяти
+    _record_trades(portfolio, trades)
+    return results
+
+
+def _refresh_source(source: str):
+    """Обновляет курсы источника source ("*" - всех источников)"""
+    # Импорт здесь: HTTP-клиенты нужны, только когда курс устарел
+    from valutatrade_hub.parser_service.updater import rates_updater
+
+    clients = [c for c in rates_updater.clients if source in ("*", c.name)]
+    rates_updater.run_update(clients)
+
+
+rates_refresh = BackgroundRefresh(
+    _refresh_source, settings.get("rates_refresh_cooldown_seconds", 10)
+)
+
+
+def _pair_sources(from_currency: str, to_currency: str) -> list:
+    """Источники, которые надо обновить ради пары (кросс-курс - все)"""
+    snapshot = rates_snapshots.current()
+    for key in (f"{from_currency}_{to_currency}", f"{to_currency}_{from_currency}"):
+        quote = snapshot.get(key)
+        if quote is not None and quote.source:
+            return [quote.source]
+    return ["*"]
+
+
+def get_exchange_rate(from_currency: str, to_currency: str) -> dict:
+    """Возвращает курс из кеша, не дожидаясь сети.
+
+    Устаревший, но не старше rates_grace_seconds курс отдаётся с
+    пометкой stale, а его источник обновляется в фоне (одно обновление
+    на источник, сколько бы запросов ни пришло). Если курса нет и в этом
+    окне, обновление тоже запускается, а вызов завершается
+    ApiRequestError: сделки по выдуманным курсам не проходят.
+    """
+    return get_exchange_rates([(from_currency, to_currency)])[
+        (from_currency, to_currency)
+    ]
+
+
+def get_exchange_rates(pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple, dict]:
+    """Курсы нескольких пар из одного снимка: {(from, to): как get_exchange_rate}"""
+    pairs = list(dict.fromkeys(pairs))
+    for from_currency, to_currency in pairs:
+        get_currency(from_currency)  # Валидация
+        get_currency(to_currency)  # Валидация
 
-    # Сохраняем в кеш
     try:
-        rates_data = _load_json_file(rates_file) if os.path.exists(rates_file) else {}
-        rates_data[rate_key] = {"rate": rate, "updated_at": datetime.now().isoformat()}
-        rates_data["last_refresh"] = datetime.now().isoformat()
-        _save_json_file(rates_file, rates_data)
-    except Exception:
-        pass
+        rate_infos = rates_cache.get_pairs(pairs)
+    except (CorruptedDataError, ApiRequestError) as e:
+        # Хранилище курсов недоступно: обновление перезапишет его
+        logger.warning(
+            f"RATES result=ERROR error_type={type(e).__name__} error_message='{str(e)}'"
+        )
+        rate_infos = {}
+
+    missing = []
+    result = {}
+    for from_currency, to_currency in pairs:
+        rate_info = rate_infos.get((from_currency, to_currency))
+        if rate_info is None or rate_info["stale"]:
+            for source in _pair_sources(from_currency, to_currency):
+                rates_refresh.trigger(source)
+        if rate_info is None:
+            missing.append(f"{from_currency}→{to_currency}")
+            continue
+        result[(from_currency, to_currency)] = {
+            "from_currency": from_currency,
+            "to_currency": to_currency,
+            "rate": rate_info["rate"],
+            "updated_at": rate_info["updated_at"],
+            "reverse_rate": 1 / rate_info["rate"],
+            "stale": rate_info["stale"],
+        }
+
+    if missing:
+        raise ApiRequestError(
+            f"Курс {', '.join(missing)} недоступен, запущено обновление"
+        )
+    return result
 
-    return {
-        "from_currency": from_currency,
-        "to_currency": to_currency,
-        "rate": rate,
-        "updated_at": datetime.now().isoformat(),
-        "reverse_rate": 1 / rate,
-    }
 
+def get_rates_snapshot() -> RatesSnapshot:
+    """Возвращает текущий неизменяемый снимок курсов"""
+    return rates_snapshots.current()
+
+
+def get_rates_cache_stats() -> dict:
+    """Возвращает счётчики кеша курсов процесса"""
+    return rates_cache.stats()
 
-def save_portfolio(portfolio: Portfolio):
-    data_path = settings.get("data_path", "data/")
-    portfolios_file = os.path.join(data_path, "portfolios.json")
 
+def _snapshot_portfolio(user_id: int):
+    """Сворачивает журнал сделок портфеля в снимок (фоновая задача)"""
+    db.snapshot_portfolio(user_id)
+
+
+portfolio_snapshots = BackgroundRefresh(
+    _snapshot_portfolio,
+    settings.get("portfolio_snapshot_cooldown_seconds", 1),
+    name="portfolio snapshot",
+)
+
+
+def _record_trades(portfolio: Portfolio, trades: List[dict]):
+    """Записывает сделки портфеля в журнал вместо перезаписи портфеля.
+
+    Когда хвост журнала после снимка дорастает до journal_snapshot_every
+    событий, снимок обновляется в фоне.
+    """
     try:
-        portfolios = (
-            _load_json_file(portfolios_file) if os.path.exists(portfolios_file) else []
+        portfolio.version = db.append_trades(
+            portfolio.user_id, trades, expected_version=portfolio.version
         )
+    except ConcurrentModificationError:
+        raise
+    except Exception as e:
+        raise ApiRequestError(f"Ошибка при сохранении портфеля: {str(e)}")
 
-        for i, p in enumerate(portfolios):
-            if p["user_id"] == portfolio.user_id:
-                portfolios[i] = portfolio.to_dict()
-                break
-        else:
-            portfolios.append(portfolio.to_dict())
+    if db.journal_tail(portfolio.user_id) >= settings.get(
+        "journal_snapshot_every", 100
+    ):
+        portfolio_snapshots.trigger(portfolio.user_id)
+
+
+def get_trade_history(
+    user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> Iterator[dict]:
+    """Сделки пользователя из журнала за интервал [start, end] по порядку"""
+    return iter_trades(db.iter_trades(user_id), start, end)
+
+
+def get_portfolio_at(user_id: int, moment: datetime) -> Optional[Portfolio]:
+    """Восстанавливает портфель на момент moment по журналу сделок.
 
-        _save_json_file(portfolios_file, portfolios)
+    None - на этот момент журнал портфеля ещё не начат.
+    """
+    # version=-1: журнал старого портфеля может начинаться с версии 0
+    portfolio_data = replay(
+        {"user_id": user_id, "wallets": {}, "version": -1},
+        db.iter_trades(user_id),
+        until=moment,
+    )
+    if portfolio_data["version"] < 0:
+        return None
+    return Portfolio.from_dict(portfolio_data)
+
+
+def save_portfolio(portfolio: Portfolio):
+    try:
+        # Сохранение удастся, только если портфель не менялся после загрузки
+        portfolio.version = db.save_portfolio(
+            portfolio.to_dict(), expected_version=portfolio.version
+        )
 
+    except ConcurrentModificationError:
+        raise
     except Exception as e:
         raise ApiRequestError(f"Ошибка при сохранении портфеля: {str(e)}")
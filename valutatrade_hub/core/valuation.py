@@ -0,0 +1,124 @@
+"""Оценка портфелей всех пользователей разом.
+
+Балансы сводятся в плотную матрицу пользователи × валюты, и стоимость
+портфелей в базовой валюте - её произведение на вектор курсов валют к
+базе из RateMatrix. С NumPy матрица - массив float64 и умножение идёт
+одной операцией; без него каждая валюта хранится столбцом array('d'), а
+столбцы складываются поэлементно.
+"""
+
+import heapq
+import operator
+from array import array
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from valutatrade_hub.core.models import conversion_rate
+from valutatrade_hub.core.money import from_units, to_units
+from valutatrade_hub.core.rate_matrix import RateMatrix
+
+
+class BalanceMatrix:
+    """Балансы всех пользователей: строка - пользователь, столбец - валюта.
+
+    balances - массив (пользователи × валюты) при наличии NumPy, иначе
+    список столбцов array('d') по одному на валюту.
+    """
+
+    def __init__(self, user_ids, currencies: List[str], balances):
+        self.user_ids = user_ids
+        self.currencies = list(currencies)
+        self.balances = balances
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @classmethod
+    def from_portfolios(cls, portfolios: Iterable[Dict]) -> "BalanceMatrix":
+        """Строит матрицу из портфелей в формате Portfolio.to_dict()"""
+        user_ids = array("q")
+        currency_index: Dict[str, int] = {}
+        rows, columns, values = array("q"), array("q"), array("d")
+        for row, data in enumerate(portfolios):
+            user_ids.append(data["user_id"])
+            for currency_code, wallet in data.get("wallets", {}).items():
+                # Баланс как у Wallet: из точных единиц или с точностью валюты
+                units = wallet.get("units")
+                if units is None:
+                    units = to_units(wallet["balance"], currency_code)
+                if not units:
+                    continue
+                column = currency_index.setdefault(currency_code, len(currency_index))
+                rows.append(row)
+                columns.append(column)
+                values.append(from_units(units, currency_code))
+
+        currencies = sorted(currency_index, key=currency_index.get)
+        if np is not None:
+            balances = np.zeros((len(user_ids), len(currencies)))
+            balances[np.asarray(rows), np.asarray(columns)] = np.asarray(values)
+            return cls(np.asarray(user_ids), currencies, balances)
+
+        balances = [array("d", bytes(8 * len(user_ids))) for _ in currencies]
+        for row, column, value in zip(rows, columns, values):
+            balances[column][row] = value
+        return cls(user_ids, currencies, balances)
+
+    def rate_vector(
+        self, base_currency: str, rates: Optional[RateMatrix] = None
+    ) -> List[float]:
+        """Курсы валют матрицы к base_currency; 0.0 - валюту не оценить"""
+        vector = []
+        for currency_code in self.currencies:
+            rate = conversion_rate(currency_code, base_currency, rates)
+            vector.append(rate if rate is not None else 0.0)
+        return vector
+
+    def value(self, base_currency: str = "USD", rates: Optional[RateMatrix] = None):
+        """Стоимость каждого портфеля в base_currency, в порядке user_ids.
+
+        Правила те же, что у Portfolio.get_total_value: курс из rates,
+        иначе справочный, иначе валюта не учитывается.
+        """
+        vector = self.rate_vector(base_currency.upper(), rates)
+        if np is not None:
+            return self.balances @ np.array(vector, dtype=float)
+
+        totals = array("d", bytes(8 * len(self)))
+        for column, rate in zip(self.balances, vector):
+            if rate:
+                totals = array(
+                    "d",
+                    map(operator.add, totals, map(operator.mul, column, repeat(rate))),
+                )
+        return totals
+
+    def totals(
+        self, base_currency: str = "USD", rates: Optional[RateMatrix] = None
+    ) -> Dict[int, float]:
+        """Возвращает {user_id: стоимость портфеля в base_currency}"""
+        values = self.value(base_currency, rates)
+        return dict(zip(map(int, self.user_ids), map(float, values)))
+
+    def top(
+        self,
+        count: int,
+        base_currency: str = "USD",
+        rates: Optional[RateMatrix] = None,
+    ) -> List[Tuple[int, float]]:
+        """Возвращает count самых дорогих портфелей [(user_id, стоимость)]"""
+        count = min(count, len(self))
+        if count <= 0:
+            return []
+        values = self.value(base_currency, rates)
+        if np is not None:
+            best = np.argpartition(-values, count - 1)[:count]
+            best = best[np.argsort(-values[best], kind="stable")]
+        else:
+            best = heapq.nlargest(count, range(len(values)), key=values.__getitem__)
+        return [(int(self.user_ids[i]), float(values[i])) for i in best]
@@ -1,3 +1,7 @@
+import random
+import time
+
+from valutatrade_hub.core.exceptions import ConcurrentModificationError
 from valutatrade_hub.logging_config import logger
 
 
@@ -37,3 +41,27 @@ def log_action(action="", verbose=False):
         return wrapper
 
     return decorator
+
+
+def retry_on_conflict(max_attempts=10, base_delay=0.005):
+    """Повторяет операцию при конфликте версий (оптимистичная блокировка).
+
+    Функция должна заново читать данные при каждом вызове. После
+    max_attempts неудачных попыток ConcurrentModificationError
+    пробрасывается вызывающему.
+    """
+
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except ConcurrentModificationError:
+                    if attempt == max_attempts:
+                        raise
+                    # Случайная пауза разводит конкурирующие процессы
+                    time.sleep(random.uniform(0, base_delay * 2**attempt))
+
+        return wrapper
+
+    return decorator
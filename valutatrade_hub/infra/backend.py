@@ -0,0 +1,104 @@
+from abc import ABC, abstractmethod
+from typing import (
+    ContextManager,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+
+class StorageBackend(ABC):
+    """Абстрактный движок хранения данных платформы"""
+
+    @abstractmethod
+    def group_commit(self) -> ContextManager:
+        """Контекст, фиксирующий все записи внутри себя одним сбросом на диск"""
+
+    # Пользователи
+
+    @abstractmethod
+    def get_user(self, username: str) -> Optional[Dict]:
+        """Возвращает запись пользователя по имени или None"""
+
+    @abstractmethod
+    def next_user_id(self) -> int:
+        """Возвращает идентификатор для следующего пользователя"""
+
+    @abstractmethod
+    def add_user(self, user_data: Dict):
+        """Добавляет пользователя (ValueError, если имя занято)"""
+
+    @abstractmethod
+    def iter_users(self) -> Iterator[Dict]:
+        """Перебирает всех пользователей"""
+
+    # Портфели
+
+    @abstractmethod
+    def load_portfolio(self, user_id: int) -> Optional[Dict]:
+        """Загружает портфель (Portfolio.to_dict и "version") или None"""
+
+    @abstractmethod
+    def save_portfolio(
+        self, portfolio_data: Dict, expected_version: Optional[int] = None
+    ) -> int:
+        """Сохраняет портфель в формате Portfolio.to_dict, возвращает версию.
+
+        Если expected_version задана и не совпадает с сохранённой версией,
+        выбрасывает ConcurrentModificationError.
+        """
+
+    @abstractmethod
+    def iter_portfolios(self) -> Iterator[Dict]:
+        """Перебирает портфели всех пользователей"""
+
+    # Журнал сделок
+
+    @abstractmethod
+    def append_trades(
+        self, user_id: int, trades: List[Dict], expected_version: Optional[int] = None
+    ) -> int:
+        """Записывает сделки (core.journal.build_trade) в журнал портфеля.
+
+        Проверка expected_version - как в save_portfolio. Возвращает
+        новую версию портфеля: по единице на сделку.
+        """
+
+    @abstractmethod
+    def iter_trades(self, user_id: int) -> Iterator[Dict]:
+        """Перебирает события журнала портфеля по возрастанию seq"""
+
+    @abstractmethod
+    def journal_tail(self, user_id: int) -> int:
+        """Число событий журнала, ещё не свёрнутых в снимок портфеля"""
+
+    @abstractmethod
+    def snapshot_portfolio(self, user_id: int) -> bool:
+        """Сворачивает хвост журнала в снимок; False - сворачивать нечего"""
+
+    # Текущие курсы
+
+    @abstractmethod
+    def load_rates(self) -> Dict:
+        """Загружает кеш курсов в формате rates.json"""
+
+    @abstractmethod
+    def save_rates(self, rates_data: Dict):
+        """Полностью заменяет кеш курсов"""
+
+    @abstractmethod
+    def rates_version(self) -> Hashable:
+        """Дешёвый признак версии курсов: меняется при каждой записи"""
+
+    # История курсов
+
+    @abstractmethod
+    def append_history(self, records: Iterable[Dict], durable: bool = False):
+        """Дописывает исторические записи"""
+
+    @abstractmethod
+    def iter_history(self, currency_pair: Optional[str] = None) -> Iterator[Dict]:
+        """Лениво перебирает историю курсов (всю или по одной паре)"""
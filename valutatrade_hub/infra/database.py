@@ -1,24 +1,141 @@
-import json
-import os
+from typing import (
+    ContextManager,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from .backend import StorageBackend
+from .durable import atomic_write_json, read_json
+from .json_backend import JsonBackend
+from .settings import SettingsLoader
+from .sqlite_backend import SqliteBackend
+
+
+def create_backend(name: str, settings: SettingsLoader) -> StorageBackend:
+    """Создаёт движок хранения по имени из настроек"""
+    if name == "json":
+        return JsonBackend(
+            settings.get("data_path", "data/"),
+            settings.get("history_segment_max_bytes", 4 * 1024 * 1024),
+        )
+    if name == "sqlite":
+        return SqliteBackend(settings.get("sqlite_path", "data/valutatrade.db"))
+    raise ValueError(f"Неизвестный движок хранения '{name}'")
 
 
 class DatabaseManager:
+    """Единая точка доступа к хранилищу.
+
+    Движок (JSON-файлы или SQLite) выбирается настройкой storage_backend
+    при первом обращении.
+    """
+
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
+            cls._instance._backend = None
         return cls._instance
 
+    @property
+    def backend(self) -> StorageBackend:
+        """Возвращает текущий движок хранения"""
+        if self._backend is None:
+            settings = SettingsLoader()
+            self._backend = create_backend(
+                settings.get("storage_backend", "json"), settings
+            )
+        return self._backend
+
+    def use_backend(self, backend: Optional[StorageBackend]):
+        """Подменяет движок (None - вернуться к движку из настроек)"""
+        self._backend = backend
+
     def load_json(self, file_path):
-        """Загружает данные из JSON файла"""
-        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-            return []
-        with open(file_path, "r") as f:
-            return json.load(f)
+        """Загружает данные из JSON файла (пустой файл - ошибка)"""
+        return read_json(file_path, [])
 
     def save_json(self, file_path, data):
-        """Сохраняет данные в JSON файл"""
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=2)
+        """Атомарно сохраняет данные в JSON файл"""
+        atomic_write_json(file_path, data)
+
+    def group_commit(self) -> ContextManager:
+        """Объединяет записи внутри блока в одну фиксацию"""
+        return self.backend.group_commit()
+
+    # Пользователи
+
+    def get_user(self, username: str) -> Optional[Dict]:
+        """Возвращает запись пользователя по имени или None"""
+        return self.backend.get_user(username)
+
+    def next_user_id(self) -> int:
+        """Возвращает идентификатор для следующего пользователя"""
+        return self.backend.next_user_id()
+
+    def add_user(self, user_data: Dict):
+        """Добавляет пользователя"""
+        self.backend.add_user(user_data)
+
+    # Портфели
+
+    def load_portfolio(self, user_id: int) -> Optional[Dict]:
+        """Загружает портфель пользователя или None"""
+        return self.backend.load_portfolio(user_id)
+
+    def save_portfolio(
+        self, portfolio_data: Dict, expected_version: Optional[int] = None
+    ) -> int:
+        """Сохраняет портфель пользователя, возвращает его новую версию"""
+        return self.backend.save_portfolio(portfolio_data, expected_version)
+
+    def iter_portfolios(self) -> Iterator[Dict]:
+        """Перебирает портфели всех пользователей"""
+        return self.backend.iter_portfolios()
+
+    # Журнал сделок
+
+    def append_trades(
+        self, user_id: int, trades: List[Dict], expected_version: Optional[int] = None
+    ) -> int:
+        """Записывает сделки в журнал портфеля, возвращает его новую версию"""
+        return self.backend.append_trades(user_id, trades, expected_version)
+
+    def iter_trades(self, user_id: int) -> Iterator[Dict]:
+        """Перебирает события журнала портфеля"""
+        return self.backend.iter_trades(user_id)
+
+    def journal_tail(self, user_id: int) -> int:
+        """Число событий журнала после последнего снимка портфеля"""
+        return self.backend.journal_tail(user_id)
+
+    def snapshot_portfolio(self, user_id: int) -> bool:
+        """Сворачивает хвост журнала портфеля в снимок"""
+        return self.backend.snapshot_portfolio(user_id)
+
+    # Курсы
+
+    def load_rates(self) -> Dict:
+        """Загружает кеш текущих курсов"""
+        return self.backend.load_rates()
+
+    def save_rates(self, rates_data: Dict):
+        """Сохраняет кеш текущих курсов"""
+        self.backend.save_rates(rates_data)
+
+    def rates_version(self) -> Hashable:
+        """Возвращает признак версии кеша курсов"""
+        return self.backend.rates_version()
+
+    def append_history(self, records: Iterable[Dict], durable: bool = False):
+        """Дописывает исторические записи курсов"""
+        self.backend.append_history(records, durable=durable)
+
+    def iter_history(self, currency_pair: Optional[str] = None) -> Iterator[Dict]:
+        """Лениво перебирает историю курсов"""
+        return self.backend.iter_history(currency_pair)
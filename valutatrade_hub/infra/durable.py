@@ -0,0 +1,207 @@
+"""Надёжная запись файлов.
+
+Файлы заменяются атомарно: данные пишутся во временный файл рядом с
+целевым, сбрасываются на диск (fsync) и переименовываются поверх него,
+поэтому читатель видит либо старую, либо новую версию, но не обрезанную.
+
+Внутри group_commit() записи не выполняются сразу, а копятся: повторные
+записи одного файла схлопываются, дозаписи в журнал склеиваются, и при
+выходе из блока каждый затронутый файл пишется и синхронизируется один
+раз.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from valutatrade_hub.core.exceptions import CorruptedDataError
+
+_local = threading.local()
+
+
+class _PendingGroup:
+    """Накопленные записи одного group_commit"""
+
+    def __init__(self):
+        self.replaces: Dict[str, bytes] = {}
+        self.appends: Dict[str, bytearray] = {}
+
+
+def _current_group() -> Optional[_PendingGroup]:
+    return getattr(_local, "group", None)
+
+
+def fsync_dir(directory: str):
+    """Сбрасывает на диск запись каталога (переименования внутри него)"""
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Не все платформы позволяют fsync каталога
+        pass
+    finally:
+        os.close(fd)
+
+
+def _replace_now(path: str, data: bytes, sync: bool = True):
+    """Атомарно заменяет файл: временный файл → fsync → rename"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        # mkstemp создаёт файл с правами 0600, сохраняем права исходного
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _append_now(path: str, data: bytes, sync: bool = True):
+    """Дописывает данные в конец файла одним вызовом write"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "ab") as f:
+        f.write(data)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def atomic_write_bytes(path: str, data: bytes, sync: bool = True):
+    """Атомарно заменяет содержимое файла"""
+    group = _current_group()
+    if group is not None:
+        group.replaces[path] = bytes(data)
+        return
+    _replace_now(path, data, sync)
+    if sync:
+        fsync_dir(os.path.dirname(path))
+
+
+def atomic_write_json(path: str, data: Any, indent: Optional[int] = 2):
+    """Атомарно сохраняет данные в JSON файл"""
+    atomic_write_bytes(
+        path, json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+    )
+
+
+def append_bytes(path: str, data: bytes, sync: bool = True):
+    """Дописывает данные в конец файла (журналы, индексы)"""
+    group = _current_group()
+    if group is not None:
+        group.appends.setdefault(path, bytearray()).extend(data)
+        return
+    _append_now(path, data, sync)
+
+
+def truncate_torn_line(path: str):
+    """Отрезает оборванную сбоем последнюю строку файла JSON Lines.
+
+    Вызывается перед дозаписью, чтобы новая строка не склеилась с
+    обрывком предыдущей.
+    """
+    try:
+        with open(path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            f.truncate(f.read().rfind(b"\n") + 1)
+    except FileNotFoundError:
+        return
+
+
+def file_size(path: str) -> int:
+    """Размер файла с учётом дозаписей, ожидающих фиксации в group_commit"""
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    group = _current_group()
+    if group is not None and path in group.appends:
+        size += len(group.appends[path])
+    return size
+
+
+def read_bytes(path: str) -> Optional[bytes]:
+    """Читает файл с учётом ещё не зафиксированных записей группы"""
+    group = _current_group()
+    data = None
+    if group is not None and path in group.replaces:
+        data = group.replaces[path]
+    elif os.path.exists(path):
+        with open(path, "rb") as f:
+            data = f.read()
+    if group is not None and path in group.appends:
+        data = (data or b"") + bytes(group.appends[path])
+    return data
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    """Загружает JSON файл; отсутствующий файл - default.
+
+    Пустой или повреждённый файл - это ошибка, а не пустые данные:
+    иначе следующее сохранение молча затёрло бы содержимое.
+    """
+    data = read_bytes(path)
+    if data is None:
+        return default
+    if not data.strip():
+        raise CorruptedDataError(path, "файл пуст")
+    try:
+        return json.loads(data)
+    except ValueError as e:
+        raise CorruptedDataError(path, str(e))
+
+
+@contextmanager
+def group_commit(join: bool = True):
+    """Копит записи внутри блока и фиксирует их одним fsync на файл.
+
+    Вложенный блок по умолчанию присоединяется к внешнему; с join=False
+    он фиксируется сам при выходе (нужно, когда запись должна попасть
+    на диск до снятия блокировки). При исключении внутри блока
+    накопленные записи отбрасываются.
+    """
+    outer = _current_group()
+    if outer is not None and join:
+        yield
+        return
+
+    group = _PendingGroup()
+    _local.group = group
+    try:
+        yield
+    finally:
+        _local.group = outer
+
+    directories = set()
+    for path, data in group.replaces.items():
+        _replace_now(path, data)
+        directories.add(os.path.dirname(path))
+    for path, data in group.appends.items():
+        _append_now(path, bytes(data))
+    for directory in directories:
+        fsync_dir(directory)
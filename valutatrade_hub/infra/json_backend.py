@@ -0,0 +1,95 @@
+import os
+from typing import (
+    ContextManager,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from valutatrade_hub.parser_service.history_log import HistoryLog
+
+from .backend import StorageBackend
+from .durable import atomic_write_json, group_commit, read_json
+from .portfolio_store import PortfolioStore
+from .user_store import UserStore
+
+
+class JsonBackend(StorageBackend):
+    """Файловый движок: JSON/JSON Lines в каталоге data_path"""
+
+    def __init__(self, data_path: str, history_segment_max_bytes: int):
+        self.data_path = data_path
+        self.rates_path = os.path.join(data_path, "rates.json")
+        self.users = UserStore(data_path)
+        self.portfolios = PortfolioStore(data_path)
+        self.history = HistoryLog(
+            os.path.join(data_path, "history"),
+            history_segment_max_bytes,
+            legacy_path=os.path.join(data_path, "exchange_rates.json"),
+        )
+
+    def group_commit(self) -> ContextManager:
+        return group_commit()
+
+    def get_user(self, username: str) -> Optional[Dict]:
+        return self.users.get_by_username(username)
+
+    def next_user_id(self) -> int:
+        return self.users.next_user_id()
+
+    def add_user(self, user_data: Dict):
+        self.users.add(user_data)
+
+    def iter_users(self) -> Iterator[Dict]:
+        return self.users.iter_users()
+
+    def load_portfolio(self, user_id: int) -> Optional[Dict]:
+        return self.portfolios.load(user_id)
+
+    def save_portfolio(
+        self, portfolio_data: Dict, expected_version: Optional[int] = None
+    ) -> int:
+        return self.portfolios.save(portfolio_data, expected_version)
+
+    def iter_portfolios(self) -> Iterator[Dict]:
+        return self.portfolios.iter_portfolios()
+
+    def append_trades(
+        self, user_id: int, trades: List[Dict], expected_version: Optional[int] = None
+    ) -> int:
+        return self.portfolios.append_trades(user_id, trades, expected_version)
+
+    def iter_trades(self, user_id: int) -> Iterator[Dict]:
+        return self.portfolios.iter_events(user_id)
+
+    def journal_tail(self, user_id: int) -> int:
+        return self.portfolios.journal_tail(user_id)
+
+    def snapshot_portfolio(self, user_id: int) -> bool:
+        return self.portfolios.snapshot(user_id)
+
+    def load_rates(self) -> Dict:
+        return read_json(self.rates_path, {})
+
+    def save_rates(self, rates_data: Dict):
+        atomic_write_json(self.rates_path, rates_data)
+
+    def rates_version(self) -> Hashable:
+        try:
+            stat = os.stat(self.rates_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def append_history(self, records: Iterable[Dict], durable: bool = False):
+        self.history.append_many(records, durable=durable)
+
+    def iter_history(self, currency_pair: Optional[str] = None) -> Iterator[Dict]:
+        for record in self.history.iter_records():
+            if currency_pair is None or (
+                f"{record['from_currency']}_{record['to_currency']}" == currency_pair
+            ):
+                yield record
@@ -0,0 +1,27 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: рекомендательные блокировки недоступны
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_path: str):
+    """Эксклюзивная рекомендательная блокировка на файле lock_path.
+
+    Блокирует только процессы, которые берут ту же блокировку, поэтому
+    разные пользователи с разными файлами блокировок не мешают друг другу.
+    """
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
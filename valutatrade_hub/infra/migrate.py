@@ -0,0 +1,84 @@
+"""Перенос данных из JSON-файлов в SQLite (повторный запуск безопасен).
+
+Запуск: python -m valutatrade_hub.infra.migrate [--data-path data/]
+        [--sqlite-path data/valutatrade.db]
+"""
+
+import argparse
+from itertools import islice
+
+from .json_backend import JsonBackend
+from .settings import SettingsLoader
+from .sqlite_backend import SqliteBackend
+
+HISTORY_BATCH_SIZE = 10_000
+
+
+def migrate(source: JsonBackend, target: SqliteBackend) -> dict:
+    """Переносит пользователей, портфели, журнал сделок, курсы и историю.
+
+    Повторный запуск безопасен: пользователи и портфели, которые уже
+    есть в базе, пропускаются, а история переносится только в пустую.
+    Возвращает счётчики перенесённого.
+    """
+    counts = {"users": 0, "portfolios": 0, "trades": 0, "rates": 0, "history": 0}
+
+    for user_data in source.iter_users():
+        if target.get_user(user_data["username"]) is None:
+            target.add_user(user_data)
+            counts["users"] += 1
+
+    for portfolio_data in source.iter_portfolios():
+        # Портфели, уже перенесённые прошлым запуском, пропускаются
+        user_id = portfolio_data["user_id"]
+        trades = target.import_portfolio(portfolio_data, source.iter_trades(user_id))
+        if trades is None:
+            continue
+        counts["trades"] += trades
+        counts["portfolios"] += 1
+
+    rates_data = source.load_rates()
+    if rates_data:
+        target.save_rates(rates_data)
+        counts["rates"] = sum(
+            1 for value in rates_data.values() if isinstance(value, dict)
+        )
+
+    # Историю переносим только в пустую базу, чтобы повторный запуск
+    # не задваивал записи
+    if next(target.iter_history(), None) is None:
+        history = source.iter_history()
+        while True:
+            batch = list(islice(history, HISTORY_BATCH_SIZE))
+            if not batch:
+                break
+            target.append_history(batch)
+            counts["history"] += len(batch)
+
+    return counts
+
+
+def main():
+    settings = SettingsLoader()
+    parser = argparse.ArgumentParser(description="Перенос data/*.json в SQLite")
+    parser.add_argument("--data-path", default=settings.get("data_path", "data/"))
+    parser.add_argument(
+        "--sqlite-path", default=settings.get("sqlite_path", "data/valutatrade.db")
+    )
+    args = parser.parse_args()
+
+    source = JsonBackend(
+        args.data_path,
+        settings.get("history_segment_max_bytes", 4 * 1024 * 1024),
+    )
+    counts = migrate(source, SqliteBackend(args.sqlite_path))
+    print(
+        f"Перенесено: пользователей {counts['users']}, портфелей "
+        f"{counts['portfolios']}, событий журнала сделок {counts['trades']}, "
+        f"курсов {counts['rates']}, "
+        f"исторических записей {counts['history']} → {args.sqlite_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from valutatrade_hub.core.exceptions import ConcurrentModificationError
+from valutatrade_hub.core.journal import build_state, replay
+
+from .durable import atomic_write_json, fsync_dir, group_commit, read_json
+from .locks import file_lock
+from .trade_journal import TradeJournal
+
+
+class PortfolioStore:
+    """Хранилище портфелей: по одному файлу на пользователя.
+
+    Портфель лежит в portfolios/<user_id>.json в формате Portfolio.to_dict,
+    поэтому чтение и сохранение затрагивают только файл нужного
+    пользователя. Старый portfolios.json раскладывается по файлам один раз
+    при первом обращении. Каждое сохранение увеличивает номер версии
+    портфеля, что позволяет обнаруживать параллельные изменения.
+
+    Сделки файл портфеля не перезаписывают: они дописываются в журнал
+    TradeJournal, а файл служит снимком - портфель с версией и смещением
+    journal_offset, до которого события журнала в него уже вошли.
+    Загрузка накатывает на снимок хвост журнала; snapshot() сворачивает
+    хвост в новый снимок.
+    """
+
+    SHARDS_DIR = "portfolios"
+    LEGACY_FILE = "portfolios.json"
+
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        self.shards_dir = os.path.join(data_path, self.SHARDS_DIR)
+        self.legacy_path = os.path.join(data_path, self.LEGACY_FILE)
+        self.journal = TradeJournal(data_path)
+        # user_id -> (размер журнала, версия портфеля) после последнего
+        # обращения под блокировкой: если размер журнала тот же, версию не
+        # нужно перечитывать
+        self._journal_state: Dict[int, Tuple[int, int]] = {}
+        # user_id -> (stat файла снимка, его journal_offset)
+        self._snapshot_offsets: Dict[int, Tuple[Tuple[int, int, int], int]] = {}
+
+    def _shard_path(self, user_id: int) -> str:
+        """Возвращает путь к файлу портфеля пользователя"""
+        return os.path.join(self.shards_dir, f"{int(user_id)}.json")
+
+    def _ensure_initialized(self):
+        """Создаёт каталог портфелей, при необходимости импортируя старый файл"""
+        if os.path.isdir(self.shards_dir):
+            return
+
+        legacy_portfolios = []
+        if os.path.exists(self.legacy_path) and os.path.getsize(self.legacy_path):
+            with open(self.legacy_path, "r") as f:
+                legacy_portfolios = json.load(f)
+
+        # Раскладываем во временный каталог, чтобы сбой не оставил половину
+        tmp_dir = self.shards_dir + ".tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for portfolio_data in legacy_portfolios:
+            with open(
+                os.path.join(tmp_dir, f"{int(portfolio_data['user_id'])}.json"), "w"
+            ) as f:
+                json.dump(portfolio_data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            os.replace(tmp_dir, self.shards_dir)
+            fsync_dir(self.data_path)
+        except OSError:
+            # Другой процесс успел выполнить импорт раньше
+            if not os.path.isdir(self.shards_dir):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _lock(self, user_id: int):
+        """Блокировка портфеля пользователя (снимок и журнал)"""
+        return file_lock(self._shard_path(user_id) + ".lock")
+
+    def _load(self, user_id: int) -> Optional[Dict]:
+        """Снимок плюс хвост журнала; portfolio["journal_offset"] - конец хвоста"""
+        snapshot = read_json(self._shard_path(user_id))
+        offset = snapshot.pop("journal_offset", 0) if snapshot else 0
+        events, end = self.journal.read(user_id, offset)
+        if snapshot is None:
+            if not events:
+                return None
+            snapshot = {"user_id": user_id, "wallets": {}}
+        snapshot.setdefault("version", 0)
+        portfolio = replay(snapshot, events)
+        portfolio["journal_offset"] = end
+        self._journal_state[user_id] = (end, portfolio["version"])
+        return portfolio
+
+    def load(self, user_id: int) -> Optional[Dict]:
+        """Загружает портфель пользователя или возвращает None"""
+        self._ensure_initialized()
+        portfolio = self._load(user_id)
+        if portfolio is not None:
+            del portfolio["journal_offset"]
+        return portfolio
+
+    def _current_version(self, user_id: int) -> int:
+        """Текущая версия портфеля (вызывается под блокировкой)"""
+        state = self._journal_state.get(user_id)
+        if state is not None and state[0] == self.journal.size(user_id):
+            return state[1]
+        portfolio = self._load(user_id)
+        return portfolio["version"] if portfolio else 0
+
+    @staticmethod
+    def _check_version(user_id: int, expected: Optional[int], current: int):
+        if expected is not None and expected != current:
+            raise ConcurrentModificationError(f"портфеля {user_id}", expected, current)
+
+    def save(self, portfolio_data: Dict, expected_version: Optional[int] = None) -> int:
+        """Сохраняет портфель, перезаписывая только файл этого пользователя.
+
+        Запись выполняется под блокировкой файла пользователя как
+        compare-and-swap: если expected_version задана и не совпадает с
+        сохранённой версией, выбрасывается ConcurrentModificationError.
+        Полное состояние фиксируется и в журнале событием "state".
+        Возвращает новую версию портфеля.
+        """
+        self._ensure_initialized()
+        user_id = portfolio_data["user_id"]
+
+        with self._lock(user_id):
+            current_version = self._current_version(user_id)
+            self._check_version(user_id, expected_version, current_version)
+            new_version = current_version + 1
+            end = self.journal.append(
+                user_id, [build_state(new_version, portfolio_data["wallets"])]
+            )
+            self._write_snapshot(
+                {**portfolio_data, "version": new_version, "journal_offset": end}
+            )
+            self._journal_state[user_id] = (end, new_version)
+        return new_version
+
+    def append_trades(
+        self, user_id: int, trades: List[Dict], expected_version: Optional[int] = None
+    ) -> int:
+        """Дописывает сделки в журнал одной записью, не трогая снимок.
+
+        Проверка версии - как в save(). Журналу портфеля, сохранённого до
+        появления журнала, предшествует событие "state" с его состоянием
+        на время записи снимка.
+        Возвращает новую версию портфеля.
+        """
+        self._ensure_initialized()
+        with self._lock(user_id):
+            current_version = self._current_version(user_id)
+            self._check_version(user_id, expected_version, current_version)
+            events = []
+            if trades and not self.journal.size(user_id):
+                portfolio = self._load(user_id) or {"wallets": {}}
+                events.append(
+                    build_state(
+                        current_version,
+                        portfolio["wallets"],
+                        self._snapshot_time(user_id, trades[0]["timestamp"]),
+                    )
+                )
+            for seq, trade in enumerate(trades, start=current_version + 1):
+                events.append({"seq": seq, **trade})
+            end = self.journal.append(user_id, events)
+            new_version = current_version + len(trades)
+            self._journal_state[user_id] = (end, new_version)
+        return new_version
+
+    def _snapshot_time(self, user_id: int, first_trade: str) -> str:
+        """Время, с которого известно состояние портфеля без журнала.
+
+        Это время записи снимка, но не позже первой сделки журнала;
+        без снимка портфель начинается с первой сделки.
+        """
+        try:
+            mtime = os.path.getmtime(self._shard_path(user_id))
+        except FileNotFoundError:
+            return first_trade
+        saved_at = datetime.fromtimestamp(mtime)
+        return min(saved_at, datetime.fromisoformat(first_trade)).isoformat()
+
+    def _snapshot_offset(self, user_id: int) -> int:
+        """Смещение journal_offset снимка; снимок читается, только если
+        файл заменили с прошлого раза"""
+        try:
+            stat = os.stat(self._shard_path(user_id))
+        except FileNotFoundError:
+            return 0
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._snapshot_offsets.get(user_id)
+        if cached is None or cached[0] != key:
+            snapshot = read_json(self._shard_path(user_id)) or {}
+            cached = (key, snapshot.get("journal_offset", 0))
+            self._snapshot_offsets[user_id] = cached
+        return cached[1]
+
+    def journal_tail(self, user_id: int) -> int:
+        """Число событий журнала после снимка.
+
+        Считается по файлам, а не по памяти процесса: строки журнала от
+        journal_offset снимка до конца файла, включая дописанные другим
+        процессом.
+        """
+        offset = self._snapshot_offset(user_id)
+        try:
+            with open(self.journal.path(user_id), "rb") as f:
+                if offset > os.fstat(f.fileno()).st_size:
+                    offset = 0
+                f.seek(offset)
+                return f.read().count(b"\n")
+        except FileNotFoundError:
+            return 0
+
+    def snapshot(self, user_id: int) -> bool:
+        """Сворачивает хвост журнала в снимок; False - хвоста нет"""
+        self._ensure_initialized()
+        with self._lock(user_id):
+            portfolio = self._load(user_id)
+            if portfolio is None or not self.journal_tail(user_id):
+                return False
+            self._write_snapshot(portfolio)
+            self._journal_state[user_id] = (
+                portfolio["journal_offset"],
+                portfolio["version"],
+            )
+        return True
+
+    def _write_snapshot(self, portfolio_data: Dict):
+        """Атомарно заменяет снимок (на диске до снятия блокировки)"""
+        with group_commit(join=False):
+            atomic_write_json(
+                self._shard_path(portfolio_data["user_id"]), portfolio_data
+            )
+
+    def iter_events(self, user_id: int) -> Iterator[Dict]:
+        """Перебирает события журнала пользователя"""
+        return self.journal.iter_events(user_id)
+
+    def iter_portfolios(self) -> Iterator[Dict]:
+        """Лениво перебирает портфели всех пользователей"""
+        self._ensure_initialized()
+        for name in sorted(os.listdir(self.shards_dir)):
+            if name.endswith(".json") and name[:-5].isdigit():
+                portfolio = self.load(int(name[:-5]))
+                if portfolio is not None:
+                    yield portfolio
@@ -1,3 +1,6 @@
+import os
+
+
 class SettingsLoader:
     _instance = None
 
@@ -11,6 +14,25 @@ class SettingsLoader:
         settings = {
             "data_path": "data/",
             "rates_ttl_seconds": 300,
+            # Срок годности курсов по источникам (иначе rates_ttl_seconds):
+            # крипта волатильна, фиатные курсы меняются редко
+            "source_ttl_seconds": {"CoinGecko": 150, "ExchangeRate-API": 3600},
+            # Сколько секунд после истечения срока курс ещё отдаётся
+            # (с фоновым обновлением), прежде чем считаться недоступным
+            "rates_grace_seconds": 900,
+            # Не чаще одного фонового обновления источника за столько секунд
+            "rates_refresh_cooldown_seconds": 10,
+            # Не чаще раза за столько секунд снимок курсов сверяется с
+            # хранилищем: курсы другого процесса видны с такой задержкой
+            "rates_version_check_seconds": 1,
             "default_base_currency": "USD",
+            # Хранилище: "json" (файлы в data_path) или "sqlite"
+            "storage_backend": os.getenv("VALUTATRADE_STORAGE_BACKEND", "json"),
+            "sqlite_path": os.getenv("VALUTATRADE_SQLITE_PATH", "data/valutatrade.db"),
+            "history_segment_max_bytes": 4 * 1024 * 1024,
+            # Снимок портфеля снимается в фоне, когда в журнале сделок
+            # накопилось столько событий после предыдущего снимка
+            "journal_snapshot_every": 100,
+            "portfolio_snapshot_cooldown_seconds": 1,
         }
         return settings.get(key, default)
@@ -0,0 +1,440 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import nullcontext
+from typing import (
+    ContextManager,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from valutatrade_hub.core.exceptions import ConcurrentModificationError
+from valutatrade_hub.core.journal import build_state
+from valutatrade_hub.parser_service.history_log import build_record
+
+from .backend import StorageBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    hashed_password TEXT NOT NULL,
+    salt TEXT NOT NULL,
+    registration_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS portfolios (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS wallets (
+    user_id INTEGER NOT NULL,
+    currency_code TEXT NOT NULL,
+    balance REAL NOT NULL,
+    -- точный баланс в минимальных единицах (TEXT: wei не влезают в INTEGER)
+    units TEXT,
+    PRIMARY KEY (user_id, currency_code)
+);
+CREATE TABLE IF NOT EXISTS rates (
+    pair TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    updated_at TEXT NOT NULL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS rates_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS rate_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pair TEXT NOT NULL,
+    rate REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    source TEXT,
+    repeats INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_rate_history_pair_ts
+    ON rate_history (pair, timestamp);
+-- журнал сделок: событие core.journal в JSON, seq - версия портфеля
+CREATE TABLE IF NOT EXISTS trades (
+    user_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    action TEXT NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (user_id, seq)
+);
+"""
+
+
+class SqliteBackend(StorageBackend):
+    """Движок на встроенном sqlite3 в режиме WAL.
+
+    Каждый поток получает своё соединение: фоновый планировщик курсов и
+    основной поток CLI пишут в базу независимо. Сделка - одна транзакция:
+    строка журнала trades и обновление одной строки wallets, так что
+    таблица wallets всегда актуальна и отдельные снимки не нужны.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._rates_writes = 0
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            columns = {
+                row["name"] for row in conn.execute("PRAGMA table_info(portfolios)")
+            }
+            if "version" not in columns:
+                conn.execute(
+                    "ALTER TABLE portfolios ADD COLUMN version INTEGER NOT NULL "
+                    "DEFAULT 0"
+                )
+            columns = {
+                row["name"] for row in conn.execute("PRAGMA table_info(rate_history)")
+            }
+            if "repeats" not in columns:
+                conn.execute(
+                    "ALTER TABLE rate_history ADD COLUMN repeats INTEGER NOT NULL "
+                    "DEFAULT 0"
+                )
+            columns = {
+                row["name"] for row in conn.execute("PRAGMA table_info(wallets)")
+            }
+            if "units" not in columns:
+                conn.execute("ALTER TABLE wallets ADD COLUMN units TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Возвращает соединение текущего потока"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def group_commit(self) -> ContextManager:
+        # Каждая операция и так фиксируется одной транзакцией WAL
+        return nullcontext()
+
+    def get_user(self, username: str) -> Optional[Dict]:
+        row = (
+            self._connection()
+            .execute("SELECT * FROM users WHERE username = ?", (username,))
+            .fetchone()
+        )
+        return dict(row) if row else None
+
+    def next_user_id(self) -> int:
+        row = (
+            self._connection()
+            .execute("SELECT COALESCE(MAX(user_id), 0) + 1 FROM users")
+            .fetchone()
+        )
+        return row[0]
+
+    def add_user(self, user_data: Dict):
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT INTO users (user_id, username, hashed_password, salt, "
+                    "registration_date) VALUES (:user_id, :username, "
+                    ":hashed_password, :salt, :registration_date)",
+                    user_data,
+                )
+        except sqlite3.IntegrityError as e:
+            if "users.username" in str(e):
+                raise ValueError(
+                    f"Имя пользователя '{user_data['username']}' уже занято"
+                )
+            # Идентификатор успел занять другой процесс
+            raise ConcurrentModificationError(
+                "users", user_data["user_id"], self.next_user_id()
+            )
+
+    def iter_users(self) -> Iterator[Dict]:
+        for row in self._connection().execute("SELECT * FROM users ORDER BY user_id"):
+            yield dict(row)
+
+    @staticmethod
+    def _wallets_dict(rows) -> Dict:
+        """Собирает кошельки в формате Portfolio.to_dict"""
+        wallets = {}
+        for row in rows:
+            wallet = {"currency_code": row["currency_code"], "balance": row["balance"]}
+            if row["units"] is not None:
+                wallet["units"] = int(row["units"])
+            wallets[row["currency_code"]] = wallet
+        return wallets
+
+    def load_portfolio(self, user_id: int) -> Optional[Dict]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT version FROM portfolios WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if not row:
+            return None
+        version = row["version"]
+        rows = conn.execute(
+            "SELECT currency_code, balance, units FROM wallets WHERE user_id = ? "
+            "ORDER BY rowid",
+            (user_id,),
+        )
+        return {
+            "user_id": user_id,
+            "wallets": self._wallets_dict(rows),
+            "version": version,
+        }
+
+    def save_portfolio(
+        self, portfolio_data: Dict, expected_version: Optional[int] = None
+    ) -> int:
+        user_id = portfolio_data["user_id"]
+        conn = self._connection()
+        with conn:
+            # BEGIN IMMEDIATE сразу берёт блокировку записи, чтобы проверка
+            # версии и обновление были одной атомарной операцией
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT version FROM portfolios WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            current_version = row["version"] if row else 0
+            if expected_version is not None and expected_version != current_version:
+                raise ConcurrentModificationError(
+                    f"портфеля {user_id}", expected_version, current_version
+                )
+
+            new_version = current_version + 1
+            self._write_portfolio(conn, portfolio_data, new_version)
+        return new_version
+
+    def _write_portfolio(
+        self, conn: sqlite3.Connection, portfolio_data: Dict, version: int
+    ):
+        """Записывает версию, событие "state" и кошельки портфеля"""
+        user_id = portfolio_data["user_id"]
+        conn.execute(
+            "INSERT INTO portfolios (user_id, version) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET version = excluded.version",
+            (user_id, version),
+        )
+        self._insert_events(
+            conn, user_id, [build_state(version, portfolio_data["wallets"])]
+        )
+        conn.execute("DELETE FROM wallets WHERE user_id = ?", (user_id,))
+        conn.executemany(
+            "INSERT INTO wallets (user_id, currency_code, balance, units) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (
+                    user_id,
+                    wallet["currency_code"],
+                    wallet["balance"],
+                    str(wallet["units"]) if "units" in wallet else None,
+                )
+                for wallet in portfolio_data["wallets"].values()
+            ],
+        )
+
+    def iter_portfolios(self) -> Iterator[Dict]:
+        conn = self._connection()
+        for row in conn.execute("SELECT user_id FROM portfolios ORDER BY user_id"):
+            yield self.load_portfolio(row["user_id"])
+
+    @staticmethod
+    def _insert_events(conn: sqlite3.Connection, user_id: int, events: List[Dict]):
+        conn.executemany(
+            "INSERT INTO trades (user_id, seq, timestamp, action, event) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    user_id,
+                    event["seq"],
+                    event["timestamp"],
+                    event["action"],
+                    json.dumps(event, ensure_ascii=False, separators=(",", ":")),
+                )
+                for event in events
+            ],
+        )
+
+    def append_trades(
+        self, user_id: int, trades: List[Dict], expected_version: Optional[int] = None
+    ) -> int:
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT version FROM portfolios WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            current_version = row["version"] if row else 0
+            if expected_version is not None and expected_version != current_version:
+                raise ConcurrentModificationError(
+                    f"портфеля {user_id}", expected_version, current_version
+                )
+
+            events = []
+            has_journal = conn.execute(
+                "SELECT 1 FROM trades WHERE user_id = ? LIMIT 1", (user_id,)
+            ).fetchone()
+            if trades and not has_journal:
+                # Портфель сохранён до появления журнала: журнал начинается
+                # с его состояния
+                rows = conn.execute(
+                    "SELECT currency_code, balance, units FROM wallets "
+                    "WHERE user_id = ? ORDER BY rowid",
+                    (user_id,),
+                )
+                events.append(
+                    build_state(
+                        current_version,
+                        self._wallets_dict(rows),
+                        trades[0]["timestamp"],
+                    )
+                )
+            for seq, trade in enumerate(trades, start=current_version + 1):
+                events.append({"seq": seq, **trade})
+            self._insert_events(conn, user_id, events)
+
+            new_version = current_version + len(trades)
+            conn.execute(
+                "INSERT INTO portfolios (user_id, version) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET version = excluded.version",
+                (user_id, new_version),
+            )
+            conn.executemany(
+                "INSERT INTO wallets (user_id, currency_code, balance, units) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (user_id, currency_code) "
+                "DO UPDATE SET balance = excluded.balance, units = excluded.units",
+                [
+                    (
+                        user_id,
+                        trade["currency_code"],
+                        trade["balance"],
+                        str(trade["units"]),
+                    )
+                    for trade in trades
+                ],
+            )
+        return new_version
+
+    def import_portfolio(
+        self, portfolio_data: Dict, events: Iterable[Dict]
+    ) -> Optional[int]:
+        """Переносит портфель вместе с готовыми событиями его журнала.
+
+        Всё пишется одной транзакцией и только если портфеля в базе ещё
+        нет, поэтому повторный перенос ничего не меняет. Версия портфеля
+        продолжает нумерацию событий. Возвращает число перенесённых
+        событий или None, если портфель уже есть.
+        """
+        user_id = portfolio_data["user_id"]
+        events = list(events)
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute(
+                "SELECT 1 FROM portfolios WHERE user_id = ?", (user_id,)
+            ).fetchone():
+                return None
+            self._insert_events(conn, user_id, events)
+            version = events[-1]["seq"] if events else 0
+            self._write_portfolio(conn, portfolio_data, version + 1)
+        return len(events)
+
+    def iter_trades(self, user_id: int) -> Iterator[Dict]:
+        rows = self._connection().execute(
+            "SELECT event FROM trades WHERE user_id = ? ORDER BY seq", (user_id,)
+        )
+        for row in rows:
+            yield json.loads(row["event"])
+
+    def journal_tail(self, user_id: int) -> int:
+        # Таблица wallets обновляется в транзакции каждой сделки
+        return 0
+
+    def snapshot_portfolio(self, user_id: int) -> bool:
+        return False
+
+    def load_rates(self) -> Dict:
+        conn = self._connection()
+        rates_data = {
+            row["key"]: row["value"]
+            for row in conn.execute("SELECT key, value FROM rates_meta")
+        }
+        for row in conn.execute("SELECT * FROM rates"):
+            rates_data[row["pair"]] = {
+                "rate": row["rate"],
+                "updated_at": row["updated_at"],
+                "source": row["source"],
+            }
+        return rates_data
+
+    def save_rates(self, rates_data: Dict):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM rates")
+            conn.execute("DELETE FROM rates_meta")
+            for key, value in rates_data.items():
+                if isinstance(value, dict):
+                    conn.execute(
+                        "INSERT INTO rates (pair, rate, updated_at, source) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, value["rate"], value["updated_at"], value.get("source")),
+                    )
+                else:
+                    conn.execute(
+                        "INSERT INTO rates_meta (key, value) VALUES (?, ?)",
+                        (key, value),
+                    )
+        self._rates_writes += 1
+
+    def rates_version(self) -> Hashable:
+        # data_version меняется при фиксации транзакций других соединений,
+        # собственные записи процесса учитывает счётчик
+        data_version = self._connection().execute("PRAGMA data_version").fetchone()
+        return (data_version[0], self._rates_writes)
+
+    def append_history(self, records: Iterable[Dict], durable: bool = False):
+        # WAL-транзакция фиксируется одной записью независимо от durable
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO rate_history (pair, rate, timestamp, source, repeats) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        f"{record['from_currency']}_{record['to_currency']}",
+                        record["rate"],
+                        record["timestamp"],
+                        record.get("source"),
+                        record.get("repeats", 0),
+                    )
+                    for record in records
+                ],
+            )
+
+    def iter_history(self, currency_pair: Optional[str] = None) -> Iterator[Dict]:
+        conn = self._connection()
+        if currency_pair is None:
+            rows = conn.execute("SELECT * FROM rate_history ORDER BY id")
+        else:
+            rows = conn.execute(
+                "SELECT * FROM rate_history WHERE pair = ? ORDER BY timestamp, id",
+                (currency_pair,),
+            )
+        for row in rows:
+            yield build_record(
+                row["pair"],
+                row["rate"],
+                row["source"],
+                row["timestamp"],
+                row["repeats"],
+            )
@@ -0,0 +1,70 @@
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .durable import append_bytes, file_size, group_commit, truncate_torn_line
+
+
+class TradeJournal:
+    """Append-only журнал сделок: файл JSON Lines на пользователя.
+
+    События пишутся в journal/<user_id>.jsonl только дозаписью, поэтому
+    сделка стоит одной короткой записи независимо от размера портфеля.
+    Снимок портфеля хранит смещение конца вошедших в него событий, и
+    хвост журнала читается с этого смещения.
+    """
+
+    DIRECTORY = "journal"
+
+    def __init__(self, data_path: str):
+        self.directory = os.path.join(data_path, self.DIRECTORY)
+
+    def path(self, user_id: int) -> str:
+        """Возвращает путь к журналу пользователя"""
+        return os.path.join(self.directory, f"{int(user_id)}.jsonl")
+
+    def size(self, user_id: int) -> int:
+        """Размер журнала в байтах (0 - журнала ещё нет)"""
+        return file_size(self.path(user_id))
+
+    def read(self, user_id: int, offset: int = 0) -> Tuple[List[Dict], int]:
+        """Читает события начиная со смещения offset.
+
+        Возвращает события и смещение конца последней целой строки:
+        оборванная сбоем последняя строка не читается.
+        """
+        path = self.path(user_id)
+        try:
+            with open(path, "rb") as f:
+                if offset > os.fstat(f.fileno()).st_size:
+                    # Смещение из снимка новее журнала: читаем его целиком,
+                    # лишние события отсеет номер seq
+                    offset = 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b"\n") + 1
+        events = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return events, offset + end
+
+    def iter_events(self, user_id: int) -> Iterator[Dict]:
+        """Перебирает все события журнала пользователя по порядку"""
+        yield from self.read(user_id)[0]
+
+    def append(self, user_id: int, events: Iterable[Dict]) -> int:
+        """Дописывает события одной записью с fsync, возвращает размер журнала.
+
+        Вызывающий держит блокировку портфеля пользователя. Запись
+        выполняется сразу, даже внутри group_commit: снимок, ссылающийся
+        на события, не должен оказаться на диске раньше них.
+        """
+        path = self.path(user_id)
+        payload = "".join(
+            json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for event in events
+        ).encode("utf-8")
+        truncate_torn_line(path)
+        with group_commit(join=False):
+            append_bytes(path, payload)
+        return file_size(path)
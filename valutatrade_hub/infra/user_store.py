@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, Optional
+
+from valutatrade_hub.core.exceptions import ConcurrentModificationError
+
+from .durable import (
+    append_bytes,
+    atomic_write_json,
+    file_size,
+    group_commit,
+    read_json,
+    truncate_torn_line,
+)
+from .locks import file_lock
+
+
+class UserStore:
+    """Хранилище пользователей с индексом username → запись.
+
+    Записи дописываются в users.jsonl, а смещение каждой записи попадает
+    в один из бакетов индекса users_index/<хеш>.idx. Поиск читает один
+    маленький бакет и одну строку данных, регистрация - три дозаписи,
+    поэтому обе операции не зависят от числа пользователей.
+    Старый users.json импортируется один раз при первом обращении.
+    """
+
+    RECORDS_FILE = "users.jsonl"
+    INDEX_DIR = "users_index"
+    META_FILE = "users.meta.json"
+    LOCK_FILE = "users.lock"
+    LEGACY_FILE = "users.json"
+
+    # Число бакетов индекса: 16 ** INDEX_PREFIX_LEN
+    INDEX_PREFIX_LEN = 3
+
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        self.records_path = os.path.join(data_path, self.RECORDS_FILE)
+        self.index_dir = os.path.join(data_path, self.INDEX_DIR)
+        self.meta_path = os.path.join(data_path, self.META_FILE)
+        self.lock_path = os.path.join(data_path, self.LOCK_FILE)
+        self.legacy_path = os.path.join(data_path, self.LEGACY_FILE)
+
+    def _bucket_path(self, username: str) -> str:
+        """Возвращает путь к бакету индекса для имени пользователя"""
+        digest = hashlib.sha1(username.encode("utf-8")).hexdigest()
+        return os.path.join(self.index_dir, f"{digest[: self.INDEX_PREFIX_LEN]}.idx")
+
+    def _ensure_initialized(self):
+        """Создаёт файлы хранилища, при необходимости импортируя users.json"""
+        if os.path.exists(self.records_path):
+            return
+
+        with file_lock(self.lock_path), group_commit(join=False):
+            if os.path.exists(self.records_path):
+                return
+            self._import_legacy()
+
+    def _import_legacy(self):
+        """Импортирует пользователей из старого users.json"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        legacy_users = []
+        if os.path.exists(self.legacy_path) and os.path.getsize(self.legacy_path):
+            with open(self.legacy_path, "r") as f:
+                legacy_users = json.load(f)
+
+        # Пустой файл записей создаётся даже без старых пользователей
+        append_bytes(self.records_path, b"")
+        next_id = 1
+        for user_data in legacy_users:
+            self._append_record(user_data)
+            next_id = max(next_id, user_data["user_id"] + 1)
+        self._write_meta({"next_id": next_id})
+
+    def _read_meta(self) -> Dict:
+        """Читает счётчик идентификаторов"""
+        return read_json(self.meta_path, {"next_id": 1})
+
+    def _write_meta(self, meta: Dict):
+        """Сохраняет счётчик идентификаторов"""
+        atomic_write_json(self.meta_path, meta, indent=None)
+
+    def _append_record(self, user_data: Dict):
+        """Дописывает запись пользователя и строку индекса для неё"""
+        bucket_path = self._bucket_path(user_data["username"])
+        truncate_torn_line(self.records_path)
+        truncate_torn_line(bucket_path)
+        offset = file_size(self.records_path)
+        append_bytes(
+            self.records_path,
+            (json.dumps(user_data, ensure_ascii=False) + "\n").encode("utf-8"),
+        )
+        append_bytes(
+            bucket_path, f"{user_data['username']}\t{offset}\n".encode("utf-8")
+        )
+
+    def _read_at(self, offset: int) -> Dict:
+        """Читает запись пользователя по смещению в users.jsonl"""
+        with open(self.records_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def get_by_username(self, username: str) -> Optional[Dict]:
+        """Возвращает запись пользователя по имени или None"""
+        self._ensure_initialized()
+
+        bucket_path = self._bucket_path(username)
+        if not os.path.exists(bucket_path):
+            return None
+
+        with open(bucket_path, "r") as index:
+            for line in index:
+                if not line.endswith("\n"):
+                    # Строка, оборванная сбоем: смещение в ней неполное
+                    break
+                name, _, offset = line[:-1].partition("\t")
+                if name == username and offset:
+                    return self._read_at(int(offset))
+        return None
+
+    def next_user_id(self) -> int:
+        """Возвращает идентификатор для следующего пользователя"""
+        self._ensure_initialized()
+        return self._read_meta()["next_id"]
+
+    def add(self, user_data: Dict):
+        """Добавляет нового пользователя (дозапись, без перезаписи файла).
+
+        Проверка имени и идентификатора и запись выполняются под
+        блокировкой, поэтому параллельная регистрация из нескольких
+        процессов не создаёт дублей. Если идентификатор успели занять,
+        выбрасывается ConcurrentModificationError.
+        """
+        self._ensure_initialized()
+        with file_lock(self.lock_path), group_commit(join=False):
+            if self.get_by_username(user_data["username"]) is not None:
+                raise ValueError(
+                    f"Имя пользователя '{user_data['username']}' уже занято"
+                )
+
+            meta = self._read_meta()
+            if user_data["user_id"] < meta["next_id"]:
+                raise ConcurrentModificationError(
+                    "users", user_data["user_id"], meta["next_id"]
+                )
+
+            self._append_record(user_data)
+            meta["next_id"] = user_data["user_id"] + 1
+            self._write_meta(meta)
+
+    def iter_users(self) -> Iterator[Dict]:
+        """Лениво перебирает всех пользователей"""
+        self._ensure_initialized()
+        with open(self.records_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n") and line.strip():
+                    yield json.loads(line)
@@ -1,78 +1,319 @@
+import logging
+import random
+import time
 from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from valutatrade_hub.core.exceptions import ApiRequestError
+from valutatrade_hub.core.exceptions import ApiRequestError, RateLimitExceededError
 
 from .config import config
+from .http_fixtures import install_fixtures
+from .rate_limit import RequestBudget, request_budget
+
+logger = logging.getLogger("valutatrade")
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class FetchResult(NamedTuple):
+    """Итог одного опроса источника"""
+
+    rates: dict
+    # Все ответы 304: курсы не изменились с прошлого опроса
+    not_modified: bool = False
+    # Бюджет запросов исчерпан: через сколько секунд он появится
+    retry_after: Optional[float] = None
 
 
 class BaseApiClient(ABC):
-    """Абстрактный базовый класс для API клиентов"""
+    """Абстрактный базовый класс для API клиентов.
+
+    Каждый клиент держит свою requests.Session с пулом keep-alive
+    соединений и повторяет неудачные запросы с экспоненциальной
+    задержкой, но не дольше срока цикла обновления. Ответы
+    перепроверяются по ETag/Last-Modified: если данные не изменились
+    (304), прошлые курсы возвращаются без разбора. Каждый запрос
+    расходует бюджет источника (config.RATE_LIMITS); если он исчерпан,
+    запрос не уходит. Итог опроса (курсы, 304, retry_after) fetch()
+    возвращает, а не пишет в атрибуты клиента: запрос, брошенный по
+    сроку цикла, не испортит состояние следующего цикла. last_rates и
+    retry_after - итог последнего принятого опроса (remember).
+    """
+
+    # Имя источника в логах и в поле source сохранённых курсов
+    name = "API"
+
+    def __init__(self, budget: Optional[RequestBudget] = None):
+        self.budget = budget or request_budget
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=config.HTTP_POOL_SIZE,
+            pool_maxsize=config.HTTP_POOL_SIZE,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if config.HTTP_FIXTURES_MODE:
+            install_fixtures(
+                self.session, config.HTTP_FIXTURES_MODE, config.HTTP_FIXTURES_PATH
+            )
+        # url -> (ETag, Last-Modified, курсы разобранного ответа); запись
+        # заменяется целиком, поэтому валидаторы не разойдутся с курсами
+        self._conditional: Dict[str, Tuple[Optional[str], Optional[str], dict]] = {}
+        self.last_rates: dict = {}
+        self.retry_after: Optional[float] = None
+        self.timings: Deque[dict] = deque(maxlen=config.HTTP_TIMINGS_KEPT)
 
     @abstractmethod
+    def fetch(self, deadline: Optional[float] = None) -> FetchResult:
+        """Опрашивает источник; deadline - срок по time.monotonic()"""
+        pass
+
     def fetch_rates(self) -> dict:
         """Возвращает курсы в формате {валютная_пара: курс}"""
-        pass
+        result = self.fetch()
+        self.remember(result)
+        return result.rates
+
+    def remember(self, result: FetchResult):
+        """Запоминает итог опроса, принятого в цикл обновления"""
+        if result.rates:
+            self.last_rates = result.rates
+        self.retry_after = result.retry_after
+
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером"""
+        ceiling = min(config.HTTP_BACKOFF_MAX, config.HTTP_BACKOFF_BASE * 2**attempt)
+        return random.uniform(0, ceiling)
+
+    def _record_timing(self, url: str, status: Optional[int], attempts: int, start):
+        """Запоминает длительность запроса и пишет её в лог"""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.timings.append(
+            {
+                "url": url,
+                "status": status,
+                "attempts": attempts,
+                "elapsed_ms": elapsed_ms,
+            }
+        )
+        logger.info(
+            f"HTTP {self.name} status={status} attempts={attempts} "
+            f"time={elapsed_ms:.1f}ms"
+        )
+
+    def _spend_budget(self, count: int = 1):
+        """Списывает count запросов из бюджета или бросает RateLimitExceededError"""
+        wait = self.budget.acquire(self.name, count)
+        if wait:
+            logger.warning(f"HTTP {self.name} budget exhausted, retry in {wait:.0f}s")
+            raise RateLimitExceededError(self.name, wait)
+
+    @staticmethod
+    def _timeout(deadline: Optional[float], delay: float = 0.0) -> float:
+        """Таймаут попытки, которая начнётся через delay секунд.
+
+        Не больше REQUEST_TIMEOUT и не дольше срока цикла; если срок
+        наступит раньше, бросает ApiRequestError.
+        """
+        if deadline is None:
+            return config.REQUEST_TIMEOUT
+        remaining = deadline - time.monotonic() - delay
+        if remaining <= 0:
+            raise ApiRequestError("истёк срок цикла обновления")
+        return min(config.REQUEST_TIMEOUT, remaining)
+
+    def _request(
+        self,
+        url: str,
+        headers: Optional[dict] = None,
+        reserved: bool = False,
+        deadline: Optional[float] = None,
+    ) -> Optional[requests.Response]:
+        """GET с повторами; None, если сервер ответил 304 Not Modified.
+
+        reserved - бюджет на первую попытку уже списан; каждый повтор
+        списывает свой запрос. После срока deadline повторов нет.
+        """
+        start = time.perf_counter()
+        status = None
+        attempt = 0
+        delay = 0.0
+        while True:
+            attempt += 1
+            try:
+                timeout = self._timeout(deadline, delay)
+            except ApiRequestError:
+                self._record_timing(url, status, attempt - 1, start)
+                raise
+            time.sleep(delay)
+            if attempt > 1 or not reserved:
+                self._spend_budget()
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout)
+                status = response.status_code
+                if status in RETRY_STATUSES and attempt <= config.HTTP_MAX_RETRIES:
+                    delay = self._backoff(attempt - 1)
+                    continue
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                retriable = isinstance(
+                    e,
+                    (requests.exceptions.ConnectionError, requests.exceptions.Timeout),
+                )
+                if retriable and attempt <= config.HTTP_MAX_RETRIES:
+                    delay = self._backoff(attempt - 1)
+                    continue
+                self._record_timing(url, status, attempt, start)
+                raise ApiRequestError(f"Ошибка запроса к {url}: {str(e)}")
+
+            self._record_timing(url, status, attempt, start)
+            return None if status == 304 else response
+
+    def _fetch(
+        self,
+        url: str,
+        parse: Callable[[dict], dict],
+        reserved: bool = False,
+        deadline: Optional[float] = None,
+    ) -> Tuple[dict, bool]:
+        """Условный запрос url; ответ разбирается parse(data) -> курсы.
+
+        Возвращает курсы и признак 304: при нём разбор пропускается и
+        возвращаются прошлые курсы url.
+        """
+        headers = {}
+        cached = self._conditional.get(url)
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self._request(url, headers, reserved, deadline)
+        if response is None:
+            if cached is None:
+                # Условных заголовков не было: прошлых курсов для 304 нет
+                raise ApiRequestError(f"Ответ 304 без сохранённых данных от {url}")
+            return cached[2], True
 
-    def _make_request(self, url: str) -> dict:
-        """Общий метод для HTTP запросов"""
         try:
-            response = requests.get(url, timeout=config.REQUEST_TIMEOUT)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            raise ApiRequestError(f"Ошибка запроса к {url}: {str(e)}")
+            data = response.json()
+        except ValueError as e:
+            raise ApiRequestError(f"Некорректный JSON от {url}: {str(e)}")
+        rates = parse(data)
+        self._conditional[url] = (
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            rates,
+        )
+        return rates, False
+
+    def _fetch_batch(
+        self,
+        urls: List[str],
+        parse: Callable[[dict], dict],
+        deadline: Optional[float] = None,
+    ) -> FetchResult:
+        """Запрашивает все вызовы одного обновления источника.
+
+        Бюджет на все вызовы списывается заранее: обновление либо
+        уходит целиком, либо откладывается, а не обрывается на середине.
+        Обновление больше самого малого ведра не уходит никогда, поэтому
+        о нём сообщается ошибкой, а не откладыванием.
+        """
+        capacity = self.budget.capacity(self.name)
+        if capacity is not None and len(urls) > capacity:
+            print(
+                f"ERROR: {self.name}: update needs {len(urls)} requests, "
+                f"but RATE_LIMITS allow only {capacity} at once; "
+                f"raise the limit or request more per call"
+            )
+            return FetchResult({})
+        rates = {}
+        not_modified = True
+        try:
+            self._spend_budget(len(urls))
+            for url in urls:
+                url_rates, url_not_modified = self._fetch(url, parse, True, deadline)
+                rates.update(url_rates)
+                not_modified = not_modified and url_not_modified
+        except RateLimitExceededError as e:
+            # Бюджета не хватило и на повтор: источник ждёт нового токена
+            return FetchResult({}, retry_after=e.retry_after)
+        return FetchResult(rates, not_modified)
 
 
 class CoinGeckoClient(BaseApiClient):
     """Клиент для CoinGecko API"""
 
-    def fetch_rates(self) -> dict:
+    name = "CoinGecko"
+
+    def fetch(self, deadline: Optional[float] = None) -> FetchResult:
+        # Все монеты - в наименьшее число вызовов по COINGECKO_BATCH_SIZE
         crypto_ids = list(config.CRYPTO_ID_MAP.values())
-        url = f"{config.COINGECKO_URL}?ids={','.join(crypto_ids)}&vs_currencies=usd"
+        size = config.COINGECKO_BATCH_SIZE
+        urls = [
+            f"{config.COINGECKO_URL}?ids={','.join(crypto_ids[i : i + size])}"
+            f"&vs_currencies=usd"
+            for i in range(0, len(crypto_ids), size)
+        ]
 
         try:
-            data = self._make_request(url)
-            rates = {}
+            return self._fetch_batch(urls, self._parse, deadline)
+        except ApiRequestError:
+            return FetchResult({})
 
-            for code, crypto_id in config.CRYPTO_ID_MAP.items():
-                if crypto_id in data and "usd" in data[crypto_id]:
-                    rate = data[crypto_id]["usd"]
-                    rates[f"{code}_USD"] = rate
-                    rates[f"USD_{code}"] = 1 / rate
+    def _parse(self, data: dict) -> dict:
+        rates = {}
 
-            return rates
-        except ApiRequestError:
-            return {}
+        for code, crypto_id in config.CRYPTO_ID_MAP.items():
+            if crypto_id in data and "usd" in data[crypto_id]:
+                rate = data[crypto_id]["usd"]
+                rates[f"{code}_USD"] = rate
+                rates[f"USD_{code}"] = 1 / rate
+
+        return rates
 
 
 class ExchangeRateApiClient(BaseApiClient):
     """Клиент для ExchangeRate-API"""
 
-    def fetch_rates(self) -> dict:
+    name = "ExchangeRate-API"
+
+    def fetch(self, deadline: Optional[float] = None) -> FetchResult:
+        if not config.EXCHANGERATE_API_KEY:
+            print(f"ERROR: {self.name}: EXCHANGERATE_API_KEY is not set")
+            return FetchResult({})
         url = (
             f"{config.EXCHANGERATE_API_URL}/{config.EXCHANGERATE_API_KEY}/"
             f"latest/{config.BASE_CURRENCY}"
         )
-        
+
         try:
-            data = self._make_request(url)
+            return self._fetch_batch([url], self._parse, deadline)
+        except ApiRequestError:
+            return FetchResult({})
 
-            if data.get("result") != "success":
-                raise ApiRequestError(
-                    f"API error: {data.get('error-type', 'Unknown error')}"
-                )
+    def _parse(self, data: dict) -> dict:
+        if data.get("result") != "success":
+            raise ApiRequestError(
+                f"API error: {data.get('error-type', 'Unknown error')}"
+            )
 
-            rates = {}
-            base_rates = data["conversion_rates"]
+        rates = {}
+        base_rates = data["conversion_rates"]
 
-            for currency in config.FIAT_CURRENCIES:
-                if currency in base_rates:
-                    rate = base_rates[currency]
-                    rates[f"{currency}_USD"] = rate
-                    rates[f"USD_{currency}"] = 1 / rate
+        for currency in config.FIAT_CURRENCIES:
+            if currency in base_rates:
+                # conversion_rates - сколько единиц валюты дают за 1 USD
+                rate = base_rates[currency]
+                rates[f"USD_{currency}"] = rate
+                rates[f"{currency}_USD"] = 1 / rate
 
-            return rates
-        except ApiRequestError:
-            return {}
\ No newline at end of file
+        return rates
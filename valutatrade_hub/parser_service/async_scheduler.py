@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .async_updater import AsyncRatesUpdater, async_rates_updater
+
+
+class _Job:
+    """Периодическая задача планировщика"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.running: Optional[asyncio.Task] = None
+
+
+class AsyncScheduler:
+    """Планировщик периодических задач на цикле событий asyncio.
+
+    Задачи хранятся в куче по времени следующего запуска, и цикл спит
+    ровно до ближайшего срока: без опроса раз в секунду. Добавление
+    задачи или остановка будят его досрочно. Медленная задача не
+    задерживает остальные, а её следующий запуск планируется после
+    завершения текущего, так что запуски одной задачи не перекрываются.
+    Если задача вернула число, следующий запуск будет через столько
+    секунд вместо interval.
+
+    Внутри работающего цикла: await serve() / stop_async().
+    Из синхронного кода: start() поднимает цикл в фоновом потоке,
+    stop() останавливает его и дожидается завершения.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, _Job] = {}
+        # (время запуска по time.monotonic, порядковый номер, задача)
+        self._heap: List[Tuple[float, int, _Job]] = []
+        self._counter = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        interval: float,
+        delay: float = 0.0,
+    ):
+        """Регистрирует корутинную функцию func с периодом interval секунд.
+
+        Первый запуск - через delay секунд. Можно вызывать из любого
+        потока, в том числе когда планировщик уже работает.
+        """
+        if interval <= 0:
+            raise ValueError("Интервал должен быть положительным")
+        self._call_in_loop(self._add_job, name, func, interval, delay)
+
+    def remove_job(self, name: str):
+        """Снимает задачу с расписания (текущий запуск доработает)"""
+        self._call_in_loop(self._jobs.pop, name, None)
+
+    def _call_in_loop(self, func, *args):
+        loop = self._loop
+        if loop is not None and loop.is_running() and not self._in_loop_thread():
+            loop.call_soon_threadsafe(func, *args)
+        else:
+            func(*args)
+
+    def _in_loop_thread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _add_job(self, name: str, func, interval: float, delay: float):
+        job = _Job(name, func, interval)
+        self._jobs[name] = job
+        self._push(time.monotonic() + delay, job)
+
+    def _push(self, due: float, job: _Job):
+        self._counter += 1
+        heapq.heappush(self._heap, (due, self._counter, job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_job(self, job: _Job, due: float):
+        delay = job.interval
+        try:
+            result = await job.func()
+            if isinstance(result, (int, float)) and result > 0:
+                delay = result
+        except Exception as e:
+            print(f"WARNING: Scheduled job '{job.name}' failed: {e}")
+        if self._jobs.get(job.name) is job:
+            # Следующий срок от планового, но без догоняющих запусков
+            self._push(max(due + delay, time.monotonic()), job)
+
+    async def serve(self):
+        """Выполняет задачи по расписанию до вызова stop"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._started.set()
+        try:
+            while not self._stopping:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, job = heapq.heappop(self._heap)
+                    if self._jobs.get(job.name) is job:
+                        job.running = asyncio.create_task(self._run_job(job, due))
+
+                self._wakeup.clear()
+                timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            interrupted = [
+                job
+                for job in self._jobs.values()
+                if job.running is not None and not job.running.done()
+            ]
+            for job in interrupted:
+                job.running.cancel()
+            await asyncio.gather(
+                *(job.running for job in interrupted), return_exceptions=True
+            )
+            # Прерванные задачи выполнятся сразу при следующем запуске
+            for job in interrupted:
+                self._push(time.monotonic(), job)
+            self._loop = None
+            self._wakeup = None
+            self._started.clear()
+
+    def _request_stop(self):
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop_async(self):
+        """Останавливает serve() из того же цикла событий"""
+        self._request_stop()
+
+    def start(self):
+        """Запускает планировщик с собственным циклом в фоновом потоке"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=asyncio.run, args=(self.serve(),), name="rates-scheduler"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Останавливает фоновый планировщик и ждёт завершения потока"""
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._request_stop)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def schedule_rates_updates(
+    scheduler: AsyncScheduler,
+    interval: float = 300,
+    updater: Optional[AsyncRatesUpdater] = None,
+    delay: float = 0.0,
+):
+    """Добавляет в планировщик периодическое обновление курсов"""
+    updater = updater or async_rates_updater
+
+    async def update_rates():
+        print("INFO: Scheduled rates update started...")
+        if await updater.run_update():
+            print("INFO: Scheduled update completed successfully")
+        else:
+            print("WARNING: Scheduled update completed with errors")
+
+    scheduler.add_job("rates_update", update_rates, interval, delay)
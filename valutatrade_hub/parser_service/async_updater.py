@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .api_clients import BaseApiClient, FetchResult
+from .updater import RateEntry, RatesUpdater, rates_updater
+
+
+class AsyncApiClient:
+    """Асинхронная обёртка над синхронным клиентом.
+
+    Запрос выполняется в пуле потоков цикла событий, поэтому клиент
+    сохраняет свою сессию с keep-alive, повторы и условные запросы,
+    а цикл событий не блокируется. Это сделано намеренно: сам HTTP-запрос
+    не асинхронный и занимает поток, зато логика запросов у синхронного
+    и асинхронного обновления одна.
+    """
+
+    def __init__(self, client: BaseApiClient):
+        self.client = client
+        self.name = client.name
+
+    async def fetch(self, deadline: Optional[float] = None) -> FetchResult:
+        """Опрашивает источник; deadline - срок по time.monotonic()"""
+        return await asyncio.to_thread(self.client.fetch, deadline)
+
+
+class AsyncRatesUpdater:
+    """Асинхронное обновление курсов поверх RatesUpdater.
+
+    Источники и хранилище берутся из синхронного обновителя, поэтому
+    rates_updater.run_update() и await run_update() пишут одни и те же
+    данные одинаковым образом.
+    """
+
+    def __init__(self, updater: Optional[RatesUpdater] = None):
+        self.updater = updater or rates_updater
+
+    async def fetch_all(
+        self, deadline: float, clients: List[BaseApiClient]
+    ) -> Tuple[Dict[str, RateEntry], int]:
+        """Опрашивает источники конкурентно до общего срока цикла.
+
+        Ответы сливаются теми же шагами RatesUpdater.collect() и
+        report_missed(), что и в синхронном цикле.
+        """
+        all_rates: Dict[str, RateEntry] = {}
+        success_sources = 0
+        pending = {
+            asyncio.ensure_future(AsyncApiClient(client).fetch(deadline)): client
+            for client in clients
+        }
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    client = pending.pop(task)
+                    if self.updater.collect(client, task.result, all_rates):
+                        success_sources += 1
+            self.updater.report_missed(pending.values())
+        finally:
+            # Поток с зависшим запросом не прервать, но ждать его не нужно
+            for task in pending:
+                task.cancel()
+
+        return all_rates, success_sources
+
+    async def run_update(
+        self,
+        clients: Optional[Iterable[BaseApiClient]] = None,
+        merge_recent: bool = False,
+    ) -> bool:
+        """Обновляет курсы всех источников или только clients, не блокируя цикл"""
+        clients = self.updater.select_clients(clients, merge_recent)
+        if merge_recent and not clients:
+            return True
+        all_rates, success_sources = await self.fetch_all(
+            self.updater.cycle_deadline(), clients
+        )
+        return await asyncio.to_thread(
+            self.updater.persist, all_rates, success_sources == len(clients)
+        )
+
+
+# Глобальный экземпляр
+async_rates_updater = AsyncRatesUpdater()
@@ -0,0 +1,390 @@
+"""Колоночное бинарное хранилище истории курсов.
+
+Для каждой валютной пары хранятся два файла фиксированной ширины:
+<PAIR>.ts - метки времени (int64, микросекунды Unix time) и
+<PAIR>.rate - курсы (float64), оба в порядке little-endian. Новые тики
+дописываются в конец, а чтение отображает файлы в память (mmap) и
+возвращает представления без копирования: memoryview или массивы NumPy,
+если он установлен. Отметки серий неизменного курса (см.
+history_delta.py) лежат отдельно в <PAIR>.rep парами int64
+(номер тика, число повторов) и есть только у пар с такими сериями.
+
+Конвертация существующей истории:
+    python -m valutatrade_hub.parser_service.columnar
+    python -m valutatrade_hub.parser_service.columnar --backfill
+(второй вариант дописывает тики журнала, которые старше колоночной
+истории, в уже созданные файлы)
+"""
+
+import argparse
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.durable import append_bytes, file_size
+from valutatrade_hub.infra.settings import SettingsLoader
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TS_SUFFIX = ".ts"
+RATE_SUFFIX = ".rate"
+REPEATS_SUFFIX = ".rep"
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def to_micros(timestamp: str) -> int:
+    """Переводит ISO-метку времени в микросекунды Unix time"""
+    return int(round(datetime.fromisoformat(timestamp).timestamp() * 1_000_000))
+
+
+def from_micros(micros: int) -> datetime:
+    """Переводит микросекунды Unix time обратно в datetime"""
+    return datetime.fromtimestamp(micros / 1_000_000)
+
+
+class PairSeries:
+    """Ряд тиков одной пары, отображённый в память.
+
+    timestamps и rates - последовательности одинаковой длины без копии
+    данных; их можно индексировать, резать и передавать в bisect.
+    Файлы остаются открытыми, пока ряд не закрыт (close или with).
+    repeats - отметки серий: номера тиков по возрастанию и число
+    повторов каждого, две последовательности одинаковой длины.
+    """
+
+    def __init__(
+        self,
+        pair: str,
+        timestamps,
+        rates,
+        maps: Sequence[mmap.mmap] = (),
+        repeats: Optional[Tuple[Sequence[int], Sequence[int]]] = None,
+    ):
+        self.pair = pair
+        self.timestamps = timestamps
+        self.rates = rates
+        self.repeats: Tuple[Sequence[int], Sequence[int]] = repeats or ((), ())
+        self._maps = list(maps)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def marks(self, lo: int, hi: int) -> Dict[int, int]:
+        """Отметки серий среди тиков lo..hi-1 (бинарным поиском)"""
+        rows, counts = self.repeats
+        first, last = bisect_left(rows, lo), bisect_left(rows, hi)
+        return {int(rows[i]): int(counts[i]) for i in range(first, last)}
+
+    def close(self):
+        """Освобождает представления и закрывает отображения файлов"""
+        for view in (self.timestamps, self.rates, *self.repeats):
+            if isinstance(view, memoryview):
+                view.release()
+        self.timestamps = self.rates = ()
+        self.repeats = ((), ())
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # Снаружи ещё держат срез NumPy - закроется сборщиком мусора
+                pass
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnarHistory:
+    """Каталог колоночных файлов истории, по паре файлов на валютную пару"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, pair: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{pair}{suffix}")
+
+    def pairs(self) -> List[str]:
+        """Возвращает список пар, для которых есть история"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[: -len(TS_SUFFIX)]
+            for name in os.listdir(self.directory)
+            if name.endswith(TS_SUFFIX)
+        )
+
+    def append(
+        self,
+        pair: str,
+        timestamps: Sequence[int],
+        rates: Sequence[float],
+        repeats: Optional[Sequence[int]] = None,
+    ):
+        """Дописывает тики пары (метки в микросекундах, по возрастанию).
+
+        repeats - число повторов для каждого тика (0 - обычный тик).
+        """
+        if len(timestamps) != len(rates):
+            raise ValueError("Число меток времени и курсов должно совпадать")
+        if not timestamps:
+            return
+
+        ts_column = array("q", timestamps)
+        rate_column = array("d", rates)
+        if not _LITTLE_ENDIAN:
+            ts_column.byteswap()
+            rate_column.byteswap()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._repair(pair)
+        # Курсы и отметки пишутся раньше меток: читатель берёт min(длин) и
+        # игнорирует отметки за концом ряда, поэтому оборванная запись не
+        # даст метку без курса
+        append_bytes(self._path(pair, RATE_SUFFIX), rate_column.tobytes())
+        if repeats and any(repeats):
+            first_row = file_size(self._path(pair, TS_SUFFIX)) // 8
+            marks = array("q")
+            for offset, count in enumerate(repeats):
+                if count:
+                    marks.extend((first_row + offset, count))
+            if not _LITTLE_ENDIAN:
+                marks.byteswap()
+            append_bytes(self._path(pair, REPEATS_SUFFIX), marks.tobytes())
+        append_bytes(self._path(pair, TS_SUFFIX), ts_column.tobytes())
+
+    def _repair(self, pair: str):
+        """Обрезает хвосты оборванной сбоем дозаписи перед новой.
+
+        Иначе курсы и метки следующей дозаписи легли бы с разными
+        смещениями, и все дальнейшие тики пары получили бы чужой курс.
+        """
+        ts_path = self._path(pair, TS_SUFFIX)
+        rate_path = self._path(pair, RATE_SUFFIX)
+        ts_size = os.path.getsize(ts_path) if os.path.exists(ts_path) else 0
+        rate_size = os.path.getsize(rate_path) if os.path.exists(rate_path) else 0
+        rows = min(ts_size, rate_size) // 8
+        for path, size in ((ts_path, ts_size), (rate_path, rate_size)):
+            if size > rows * 8:
+                os.truncate(path, rows * 8)
+
+        rep_path = self._path(pair, REPEATS_SUFFIX)
+        if not os.path.exists(rep_path):
+            return
+        with open(rep_path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            # Отметки упорядочены по номеру тика: лишние - только в конце
+            kept = size // 16
+            while kept:
+                f.seek((kept - 1) * 16)
+                if int.from_bytes(f.read(8), "little", signed=True) < rows:
+                    break
+                kept -= 1
+            if kept * 16 < size:
+                f.truncate(kept * 16)
+
+    def is_empty(self, pair: str) -> bool:
+        """Проверяет, что у пары ещё нет ни одного тика"""
+        return file_size(self._path(pair, TS_SUFFIX)) == 0
+
+    def append_ticks(self, pair: str, ticks: Sequence[Tuple[int, float, int]]):
+        """Дописывает тики пары вида (метка, курс, повторы)"""
+        self.append(
+            pair,
+            [tick[0] for tick in ticks],
+            [tick[1] for tick in ticks],
+            [tick[2] for tick in ticks],
+        )
+
+    def append_records(self, records: Iterable[Tuple]):
+        """Дописывает тики вида (пара, ISO-метка, курс[, повторы]) по парам"""
+        grouped: Dict[str, Tuple[List[int], List[float], List[int]]] = defaultdict(
+            lambda: ([], [], [])
+        )
+        for pair, timestamp, rate, *rest in records:
+            timestamps, rates, repeats = grouped[pair]
+            timestamps.append(to_micros(timestamp))
+            rates.append(float(rate))
+            repeats.append(rest[0] if rest else 0)
+        for pair, (timestamps, rates, repeats) in grouped.items():
+            self.append(pair, timestamps, rates, repeats)
+
+    def _load_repeats(self, pair: str, count: int):
+        """Отображает отметки серий пары: (номера тиков, повторы) и mmap.
+
+        Отметки за концом ряда (от оборванной записи) не возвращаются.
+        """
+        rep_map = self._map(self._path(pair, REPEATS_SUFFIX))
+        if rep_map is None:
+            return ((), ()), None
+        size = len(rep_map) // 16 * 2
+        if np is not None:
+            marks = np.frombuffer(rep_map, dtype="<i8", count=size)
+        elif _LITTLE_ENDIAN:
+            marks = memoryview(rep_map)[: size * 8].cast("q")
+        else:
+            marks = array("q", rep_map[: size * 8])
+            marks.byteswap()
+        rows, counts = marks[0::2], marks[1::2]
+        kept = bisect_left(rows, count)
+        return (rows[:kept], counts[:kept]), rep_map
+
+    @staticmethod
+    def _map(path: str) -> Optional[mmap.mmap]:
+        """Отображает файл в память только для чтения"""
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def load(self, pair: str) -> PairSeries:
+        """Открывает ряд пары без разбора и без копирования данных"""
+        ts_map = self._map(self._path(pair, TS_SUFFIX))
+        rate_map = self._map(self._path(pair, RATE_SUFFIX))
+        if ts_map is None or rate_map is None:
+            for mapped in (ts_map, rate_map):
+                if mapped is not None:
+                    mapped.close()
+            empty_ts = np.empty(0, dtype="<i8") if np is not None else array("q")
+            empty_rates = np.empty(0, dtype="<f8") if np is not None else array("d")
+            return PairSeries(pair, empty_ts, empty_rates)
+
+        count = min(len(ts_map) // 8, len(rate_map) // 8)
+        if np is not None:
+            timestamps = np.frombuffer(ts_map, dtype="<i8", count=count)
+            rates = np.frombuffer(rate_map, dtype="<f8", count=count)
+        elif _LITTLE_ENDIAN:
+            timestamps = memoryview(ts_map)[: count * 8].cast("q")
+            rates = memoryview(rate_map)[: count * 8].cast("d")
+        else:
+            # Без NumPy на big-endian придётся переставить байты (копия)
+            timestamps = array("q", ts_map[: count * 8])
+            rates = array("d", rate_map[: count * 8])
+            timestamps.byteswap()
+            rates.byteswap()
+        repeats, rep_map = self._load_repeats(pair, count)
+        maps = (ts_map, rate_map) if rep_map is None else (ts_map, rate_map, rep_map)
+        return PairSeries(pair, timestamps, rates, maps, repeats)
+
+
+def group_ticks(
+    records: Iterable[Dict],
+    pairs: Optional[Iterable[str]] = None,
+    before: Optional[Dict[str, int]] = None,
+) -> Dict[str, List[Tuple[int, float, int]]]:
+    """Группирует записи формата exchange_rates.json в тики по парам.
+
+    pairs - только эти пары; before - только тики пары раньше указанной
+    метки (микросекунды). Тики каждой пары отсортированы по времени.
+    """
+    wanted = set(pairs) if pairs is not None else None
+    before = before or {}
+    grouped: Dict[str, List[Tuple[int, float, int]]] = defaultdict(list)
+    for record in records:
+        pair = f"{record['from_currency']}_{record['to_currency']}"
+        if wanted is not None and pair not in wanted:
+            continue
+        micros = to_micros(record["timestamp"])
+        if pair in before and micros >= before[pair]:
+            continue
+        grouped[pair].append((micros, float(record["rate"]), record.get("repeats", 0)))
+    for ticks in grouped.values():
+        ticks.sort()
+    return grouped
+
+
+def convert_history(records: Iterable[Dict], store: ColumnarHistory) -> int:
+    """Переносит историю из формата exchange_rates.json в колоночные файлы.
+
+    Тики каждой пары сортируются по времени. Возвращает число тиков.
+    """
+    total = 0
+    for pair, ticks in group_ticks(records).items():
+        store.append_ticks(pair, ticks)
+        total += len(ticks)
+    return total
+
+
+def backfill_history(records: Iterable[Dict], store: ColumnarHistory) -> int:
+    """Дополняет колоночные файлы тиками журнала старше первого тика пары.
+
+    Каталог пересобирается рядом (<каталог>.new) и подменяет старый
+    переименованием; обновление курсов на это время нужно остановить.
+    Возвращает число добавленных тиков.
+    """
+    first: Dict[str, int] = {}
+    for pair in store.pairs():
+        with store.load(pair) as series:
+            if len(series):
+                first[pair] = int(series.timestamps[0])
+    older = group_ticks(records, before=first)
+    if not any(older.values()):
+        return 0
+
+    rebuilt = ColumnarHistory(store.directory.rstrip(os.sep) + ".new")
+    shutil.rmtree(rebuilt.directory, ignore_errors=True)
+    os.makedirs(rebuilt.directory)
+    for pair in sorted(set(first) | set(older)):
+        ticks = older.get(pair, [])
+        rebuilt.append_ticks(pair, ticks)
+        with store.load(pair) as series:
+            if not len(series):
+                continue
+            # Номера тиков отметок сдвигаются на число добавленных тиков
+            repeats = [0] * len(series)
+            for row, count in zip(*series.repeats):
+                repeats[int(row)] = int(count)
+            rebuilt.append(pair, list(series.timestamps), list(series.rates), repeats)
+
+    retired = store.directory.rstrip(os.sep) + ".old"
+    shutil.rmtree(retired, ignore_errors=True)
+    os.rename(store.directory, retired)
+    os.rename(rebuilt.directory, store.directory)
+    shutil.rmtree(retired, ignore_errors=True)
+    return sum(len(ticks) for ticks in older.values())
+
+
+def main():
+    settings = SettingsLoader()
+    parser = argparse.ArgumentParser(
+        description="Конвертация истории курсов в колоночный формат"
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join(settings.get("data_path", "data/"), "history_columns"),
+    )
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="дополнить существующие файлы тиками старше первого тика пары",
+    )
+    args = parser.parse_args()
+
+    store = ColumnarHistory(args.output)
+    if args.backfill:
+        total = backfill_history(DatabaseManager().iter_history(), store)
+        print(f"Добавлено {total} тиков старше колоночной истории → {args.output}")
+        return
+    if store.pairs():
+        parser.error(
+            f"Каталог {args.output} уже содержит историю, "
+            "для дополнения старыми тиками запустите с --backfill"
+        )
+    total = convert_history(DatabaseManager().iter_history(), store)
+    print(f"Сконвертировано {total} тиков ({len(store.pairs())} пар) → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
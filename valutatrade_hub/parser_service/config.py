@@ -5,14 +5,18 @@ from typing import Dict, Tuple
 
 @dataclass
 class ParserConfig:
-    # Ключ загружается из переменной окружения или используем твой
-    EXCHANGERATE_API_KEY: str = os.getenv(
-        "EXCHANGERATE_API_KEY", "735f02fa23769608a9917bbd"
-    )
+    # Ключ только из переменной окружения: без него ExchangeRate-API
+    # не опрашивается
+    EXCHANGERATE_API_KEY: str = os.getenv("EXCHANGERATE_API_KEY", "")
 
-    # Эндпоинты
-    COINGECKO_URL: str = "https://api.coingecko.com/api/v3/simple/price"
-    EXCHANGERATE_API_URL: str = "https://v6.exchangerate-api.com/v6"
+    # Эндпоинты (переопределяются окружением, например на локальный
+    # стенд valutatrade_hub.parser_service.standin_server)
+    COINGECKO_URL: str = os.getenv(
+        "COINGECKO_URL", "https://api.coingecko.com/api/v3/simple/price"
+    )
+    EXCHANGERATE_API_URL: str = os.getenv(
+        "EXCHANGERATE_API_URL", "https://v6.exchangerate-api.com/v6"
+    )
 
     # Списки валют
     BASE_CURRENCY: str = "USD"
@@ -26,12 +30,52 @@ class ParserConfig:
         }
     )
 
-    # Пути
-    RATES_FILE_PATH: str = "data/rates.json"
-    HISTORY_FILE_PATH: str = "data/exchange_rates.json"
+    # Дублировать историю в колоночные файлы data/history_columns
+    HISTORY_COLUMNAR_ENABLED: bool = True
+    # Писать в историю только изменения: одно направление пары, а
+    # неизменный курс - отметкой серии раз в HISTORY_RUN_MAX повторов
+    HISTORY_DELTA_ENABLED: bool = True
+    HISTORY_RUN_MAX: int = 288
 
     # Сетевые параметры
     REQUEST_TIMEOUT: int = 10
+    # Пул keep-alive соединений на клиента и повторы с backoff + джиттер
+    HTTP_POOL_SIZE: int = 4
+    HTTP_MAX_RETRIES: int = 3
+    HTTP_BACKOFF_BASE: float = 0.5
+    HTTP_BACKOFF_MAX: float = 8.0
+    # Адаптивное расписание: источник обновляется с интервалом от
+    # MIN_REFRESH_FRACTION до REFRESH_FRACTION его срока годности
+    # (source_ttl_seconds); интервал сжимается, если курсы сдвинулись
+    # больше VOLATILITY_THRESHOLD, и растёт, если нет
+    REFRESH_FRACTION: float = 0.8
+    MIN_REFRESH_FRACTION: float = 0.2
+    VOLATILITY_THRESHOLD: float = 0.001
+    REFRESH_JITTER: float = 0.1
+    # Повтор после ошибки: 15 с, 30 с, 60 с ... но не реже обычного
+    FAILURE_BACKOFF_BASE: float = 15.0
+
+    # Запись и воспроизведение HTTP-ответов источников: "record" пишет
+    # ответы в HTTP_FIXTURES_PATH, "replay" отвечает из него без сети
+    HTTP_FIXTURES_MODE: str = os.getenv("HTTP_FIXTURES_MODE", "")
+    HTTP_FIXTURES_PATH: str = os.getenv("HTTP_FIXTURES_PATH", "data/fixtures/http.json")
+
+    # Квоты источников: [(запросов, за секунд), ...] на каждый источник;
+    # источник без квоты не ограничивается
+    RATE_LIMITS: Dict = field(
+        default_factory=lambda: {
+            "CoinGecko": [(30, 60.0), (10000, 30 * 86400.0)],
+            "ExchangeRate-API": [(1500, 30 * 86400.0)],
+        }
+    )
+    # Сколько монет запрашивается у CoinGecko одним вызовом
+    COINGECKO_BATCH_SIZE: int = 250
+
+    # Сколько последних замеров времени запросов хранит клиент
+    HTTP_TIMINGS_KEPT: int = 100
+    # Общий срок цикла обновления: источники опрашиваются параллельно,
+    # не успевшие к сроку пропускаются до следующего цикла
+    UPDATE_DEADLINE: float = 12.0
 
 
 # Глобальный экземпляр конфига
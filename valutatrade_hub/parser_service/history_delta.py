@@ -0,0 +1,137 @@
+"""Запись истории только по изменениям.
+
+Обратная пара (USD_EUR к EUR_USD) в историю не пишется: хранится одно
+направление - каноническое, с меньшим кодом валюты слева, - а обратное
+выводится при запросе. Повторы неизменившегося курса не пишутся по
+одному: серия закрывается записью-отметкой с числом повторов, которая
+появляется, когда курс сдвинулся, или после HISTORY_RUN_MAX повторов.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# (пара, курс, источник, метка времени, число повторов)
+HistoryRow = Tuple[str, float, Optional[str], str, int]
+
+
+def canonical_pair(currency_pair: str) -> Tuple[str, bool]:
+    """Возвращает каноническое направление пары и признак, что оно обратное"""
+    from_code, _, to_code = currency_pair.partition("_")
+    if from_code <= to_code:
+        return currency_pair, False
+    return f"{to_code}_{from_code}", True
+
+
+class _Run:
+    """Текущая серия неизменного курса пары"""
+
+    __slots__ = ("rate", "source", "last_seen", "repeats")
+
+    def __init__(
+        self, rate: float, source: Optional[str], last_seen: str, repeats: int = 0
+    ):
+        self.rate = rate
+        self.source = source
+        self.last_seen = last_seen
+        self.repeats = repeats
+
+    def to_dict(self) -> Dict:
+        return {
+            "rate": self.rate,
+            "source": self.source,
+            "last_seen": self.last_seen,
+            "repeats": self.repeats,
+        }
+
+
+class HistoryDelta:
+    """Сводит наблюдения курсов к записям истории с RLE неизменных серий.
+
+    observe() и flush() не меняют состояние серий: они возвращают записи
+    и новое состояние, которое фиксирует commit() после успешной записи
+    истории, поэтому неудачная запись не съедает серию.
+    """
+
+    def __init__(self, max_repeats: int):
+        self.max_repeats = max_repeats
+        self._runs: Dict[str, _Run] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def select_pairs(rates: Dict[str, Tuple[float, Optional[str]]]) -> Dict:
+        """Оставляет одно направление пары, если в цикле есть оба"""
+        selected = {}
+        for currency_pair, value in rates.items():
+            canonical, inverted = canonical_pair(currency_pair)
+            if inverted and canonical in rates:
+                continue
+            selected[currency_pair] = value
+        return selected
+
+    def observe(
+        self,
+        currency_pair: str,
+        rate: float,
+        source: Optional[str],
+        timestamp: str,
+    ) -> Tuple[List[HistoryRow], _Run]:
+        """Учитывает наблюдение курса.
+
+        Возвращает записи, которые нужно дописать, и новое состояние
+        серии пары для commit().
+        """
+        with self._lock:
+            run = self._runs.get(currency_pair)
+        if run is not None and run.rate == rate:
+            repeats = run.repeats + 1
+            if repeats < self.max_repeats:
+                return [], _Run(rate, source, timestamp, repeats)
+            # Длинная серия закрывается отметкой и продолжается от неё
+            rows = [(currency_pair, rate, source, timestamp, repeats)]
+            return rows, _Run(rate, source, timestamp)
+
+        rows = []
+        if run is not None and run.repeats:
+            rows.append(
+                (currency_pair, run.rate, run.source, run.last_seen, run.repeats)
+            )
+        rows.append((currency_pair, rate, source, timestamp, 0))
+        return rows, _Run(rate, source, timestamp)
+
+    def flush(self) -> Tuple[List[HistoryRow], Dict[str, _Run]]:
+        """Закрывает открытые серии (перед остановкой обновления)"""
+        with self._lock:
+            rows, runs = [], {}
+            for currency_pair, run in self._runs.items():
+                if run.repeats:
+                    rows.append(
+                        (
+                            currency_pair,
+                            run.rate,
+                            run.source,
+                            run.last_seen,
+                            run.repeats,
+                        )
+                    )
+                    runs[currency_pair] = _Run(run.rate, run.source, run.last_seen)
+            return rows, runs
+
+    def commit(self, runs: Dict[str, _Run]):
+        """Фиксирует состояние серий после успешной записи истории"""
+        with self._lock:
+            self._runs.update(runs)
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """Состояние открытых серий для сохранения между запусками"""
+        with self._lock:
+            return {pair: run.to_dict() for pair, run in self._runs.items()}
+
+    def load(self, data: Dict[str, Dict]):
+        """Восстанавливает состояние серий, сохранённое to_dict()"""
+        with self._lock:
+            self._runs = {
+                pair: _Run(
+                    run["rate"], run.get("source"), run["last_seen"], run["repeats"]
+                )
+                for pair, run in data.items()
+            }
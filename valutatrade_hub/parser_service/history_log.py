@@ -0,0 +1,161 @@
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from valutatrade_hub.infra.durable import append_bytes, file_size, truncate_torn_line
+
+
+def build_record(
+    currency_pair: str,
+    rate: float,
+    source: str,
+    timestamp: str,
+    repeats: int = 0,
+) -> Dict:
+    """Формирует историческую запись в формате exchange_rates.json.
+
+    repeats > 0 - запись-отметка серии: курс не менялся и был получен
+    ещё repeats раз после предыдущей записи пары, последний - в timestamp.
+    """
+    record_id = f"{currency_pair}_{timestamp.replace(':', '-').replace('.', '-')}"
+
+    record = {
+        "id": record_id,
+        "from_currency": currency_pair.split("_")[0],
+        "to_currency": currency_pair.split("_")[1],
+        "rate": rate,
+        "timestamp": timestamp,
+        "source": source,
+        "meta": {
+            "raw_id": currency_pair,
+            "status_code": 200,
+            "updated_at": timestamp,
+        },
+    }
+    if repeats:
+        record["repeats"] = repeats
+    return record
+
+
+class HistoryLog:
+    """Append-only журнал исторических курсов в формате JSON Lines.
+
+    Журнал разбит на сегменты фиксированного размера: запись всегда
+    дописывается в конец последнего сегмента, поэтому её стоимость не
+    зависит от объёма накопленной истории.
+    """
+
+    SEGMENT_PREFIX = "segment-"
+    SEGMENT_SUFFIX = ".jsonl"
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int,
+        legacy_path: Optional[str] = None,
+    ):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.legacy_path = legacy_path
+        self._segment_index = None
+
+    def _segment_path(self, index: int) -> str:
+        """Возвращает путь к сегменту по его номеру"""
+        return os.path.join(
+            self.directory, f"{self.SEGMENT_PREFIX}{index:06d}{self.SEGMENT_SUFFIX}"
+        )
+
+    def _segment_indexes(self) -> List[int]:
+        """Возвращает номера существующих сегментов по возрастанию"""
+        if not os.path.isdir(self.directory):
+            return []
+
+        indexes = []
+        for name in os.listdir(self.directory):
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(
+                self.SEGMENT_SUFFIX
+            ):
+                try:
+                    indexes.append(
+                        int(name[len(self.SEGMENT_PREFIX) : -len(self.SEGMENT_SUFFIX)])
+                    )
+                except ValueError:
+                    continue
+        return sorted(indexes)
+
+    def list_segments(self) -> List[str]:
+        """Возвращает пути ко всем сегментам в порядке записи"""
+        return [self._segment_path(index) for index in self._segment_indexes()]
+
+    def _current_segment(self) -> int:
+        """Определяет номер последнего сегмента.
+
+        Каталог читается один раз на процесс, но перед каждой записью
+        проверяется, не начал ли другой процесс следующий сегмент.
+        """
+        if self._segment_index is None:
+            os.makedirs(self.directory, exist_ok=True)
+            indexes = self._segment_indexes()
+            self._segment_index = indexes[-1] if indexes else 1
+        while os.path.exists(self._segment_path(self._segment_index + 1)):
+            self._segment_index += 1
+        return self._segment_index
+
+    @staticmethod
+    def _encode(records: Iterable[Dict]) -> bytes:
+        """Сериализует записи в строки JSON Lines"""
+        return "".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for record in records
+        ).encode("utf-8")
+
+    def append(self, record: Dict, durable: bool = False) -> int:
+        """Дописывает одну запись, возвращает число записанных байт"""
+        return self.append_many([record], durable=durable)
+
+    def append_many(self, records: Iterable[Dict], durable: bool = False) -> int:
+        """Дописывает пачку записей одним вызовом write.
+
+        При durable=True после записи выполняется один fsync на всю пачку.
+        """
+        payload = self._encode(records)
+        if not payload:
+            return 0
+
+        index = self._current_segment()
+        path = self._segment_path(index)
+        truncate_torn_line(path)
+        size = file_size(path)
+        if size and size + len(payload) > self.segment_max_bytes:
+            index += 1
+            self._segment_index = index
+            path = self._segment_path(index)
+        append_bytes(path, payload, sync=durable)
+        return len(payload)
+
+    def _iter_legacy(self) -> Iterator[Dict]:
+        """Читает историю из старого формата (JSON-массив)"""
+        if (
+            not self.legacy_path
+            or not os.path.exists(self.legacy_path)
+            or os.path.getsize(self.legacy_path) == 0
+        ):
+            return
+        with open(self.legacy_path, "r") as f:
+            yield from json.load(f)
+
+    def iter_records(self) -> Iterator[Dict]:
+        """Лениво возвращает все записи: сначала старый файл, затем сегменты"""
+        yield from self._iter_legacy()
+
+        for path in self.list_segments():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # Оборванная последняя строка после сбоя
+                        continue
@@ -0,0 +1,422 @@
+"""Запросы к истории курсов: курс на момент времени, диапазон, OHLC.
+
+Источник данных - колоночные файлы (см. columnar.py): метки времени
+каждой пары отсортированы, поэтому поиск границ - это бинарный поиск
+(bisect или numpy.searchsorted), а запрос стоит O(log n + размер ответа).
+Для пар без колоночных файлов история читается из журнала целиком.
+
+История хранится по изменениям (см. history_delta.py), а запросы видят
+её полной. Обратная пара выводится из канонической (1 / курс) при
+чтении, без копии ряда. Отметка серии разворачивается в повторы только
+внутри запрошенного окна. Точна лишь метка самой отметки (последнего
+повтора): метки остальных повторов приблизительные - они распределены
+равномерно между предыдущим тиком пары и отметкой, хотя интервал
+обновления на деле менялся. Открытая серия, ещё не записанная
+отметкой, читается из history_runs.json и видна как такая же отметка
+после последнего тика пары.
+"""
+
+import heapq
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .columnar import PairSeries, from_micros, np, to_micros
+from .storage import RatesStorage
+
+_INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# Ряд и признак, что курсы нужно обращать (ряд обратной пары)
+Stream = Tuple[PairSeries, bool]
+
+
+def parse_interval(text: str) -> timedelta:
+    """Разбирает интервал вида 30s, 5m, 1h, 1d, 1w"""
+    text = text.strip().lower()
+    if len(text) < 2 or text[-1] not in _INTERVAL_UNITS or not text[:-1].isdigit():
+        raise ValueError(f"Некорректный интервал '{text}', пример: 5m, 1h, 1d")
+    seconds = int(text[:-1]) * _INTERVAL_UNITS[text[-1]]
+    if seconds <= 0:
+        raise ValueError("Интервал должен быть положительным")
+    return timedelta(seconds=seconds)
+
+
+def _micros(moment: datetime) -> int:
+    return int(round(moment.timestamp() * 1_000_000))
+
+
+class HistoryQuery:
+    """Запросы к истории курсов по отсортированному индексу меток времени"""
+
+    def __init__(self, storage: Optional[RatesStorage] = None):
+        self.storage = storage or RatesStorage()
+        self._lock = threading.Lock()
+        # пара -> (размер файла меток, ряд, число тиков, проверенных на
+        # порядок); ряд перечитывается после дозаписи
+        self._series: Dict[str, Tuple[int, PairSeries, int]] = {}
+
+    def _ts_size(self, pair: str) -> int:
+        path = os.path.join(self.storage.columns.directory, f"{pair}.ts")
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _from_log(self, pair: str) -> PairSeries:
+        """Строит ряд из журнала истории (медленный путь без колонок)"""
+        ticks = sorted(
+            (
+                _micros(datetime.fromisoformat(r["timestamp"])),
+                float(r["rate"]),
+                r.get("repeats", 0),
+            )
+            for r in self.storage.iter_history(pair)
+        )
+        timestamps = [tick[0] for tick in ticks]
+        rates = [tick[1] for tick in ticks]
+        marks = [(row, tick[2]) for row, tick in enumerate(ticks) if tick[2]]
+        repeats = ([row for row, _ in marks], [count for _, count in marks])
+        if np is not None:
+            return PairSeries(
+                pair,
+                np.array(timestamps, dtype="i8"),
+                np.array(rates),
+                repeats=repeats,
+            )
+        return PairSeries(pair, timestamps, rates, repeats=repeats)
+
+    def _load(self, pair: str, size: int) -> PairSeries:
+        """Возвращает колоночный ряд пары, перечитывая его после дозаписи.
+
+        На порядок меток проверяются только тики, дописанные с прошлого
+        чтения; неупорядоченный ряд сортируется в памяти.
+        """
+        with self._lock:
+            cached = self._series.get(pair)
+            if cached is not None and cached[0] == size:
+                return cached[1]
+
+            # Старый ряд не закрываем: его ещё могут читать генераторы
+            # range(), отображение освободится вместе с последней ссылкой
+            series = self.storage.load_series(pair)
+            checked = cached[2] if cached is not None else 0
+            timestamps = series.timestamps
+            first = max(checked - 1, 0)
+            if np is not None and not isinstance(timestamps, list):
+                ordered = bool(np.all(np.diff(timestamps[first:]) >= 0))
+            else:
+                ordered = all(
+                    timestamps[i] <= timestamps[i + 1]
+                    for i in range(first, len(timestamps) - 1)
+                )
+            if ordered:
+                checked = len(series)
+            else:
+                series = self._sorted(series)
+            self._series[pair] = (size, series, checked)
+            return series
+
+    def _index(self, pair: str) -> List[Stream]:
+        """Возвращает ряды пары и обратной пары (её курсы обращаются)"""
+        pair = pair.upper()
+        from_code, _, to_code = pair.partition("_")
+        inverse = f"{to_code}_{from_code}"
+        sizes = (self._ts_size(pair), self._ts_size(inverse))
+        if sizes == (0, 0):
+            parts = [(self._from_log(pair), False), (self._from_log(inverse), True)]
+        else:
+            parts = [
+                (self._load(name, size), inverted)
+                for name, size, inverted in zip((pair, inverse), sizes, (False, True))
+                if size
+            ]
+        runs = self.storage.pending_runs()
+        streams = []
+        for series, inverted in parts:
+            if not len(series):
+                continue
+            streams.append((series, inverted))
+            pending = self._pending(series, runs.get(series.pair))
+            if pending is not None:
+                streams.append((pending, inverted))
+        return streams
+
+    @staticmethod
+    def _pending(series: PairSeries, run: Optional[Dict]) -> Optional[PairSeries]:
+        """Открытая серия пары как ряд из последнего тика и отметки.
+
+        Последний тик ряда - начало серии; его копия в этом ряду нужна
+        только как предыдущий тик отметки и при слиянии схлопывается.
+        """
+        if not run or not run.get("repeats"):
+            return None
+        last = len(series) - 1
+        anchor, rate = int(series.timestamps[last]), float(series.rates[last])
+        moment = to_micros(run["last_seen"])
+        # Серия уже закрыта отметкой или начата не с последнего тика
+        if moment <= anchor or float(run["rate"]) != rate:
+            return None
+        timestamps, rates = [anchor, moment], [rate, rate]
+        repeats = ([1], [int(run["repeats"])])
+        if np is not None and not isinstance(series.timestamps, list):
+            timestamps, rates = np.array(timestamps, dtype="i8"), np.array(rates)
+        return PairSeries(series.pair, timestamps, rates, repeats=repeats)
+
+    @staticmethod
+    def _sorted(series: PairSeries) -> PairSeries:
+        """Копия ряда, отсортированная по времени, с перенумерованными отметками"""
+        timestamps, rates = series.timestamps, series.rates
+        if np is not None and not isinstance(timestamps, list):
+            order = np.argsort(timestamps, kind="stable")
+            position = np.empty_like(order)
+            position[order] = np.arange(len(order))
+            timestamps, rates = timestamps[order], rates[order]
+        else:
+            order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+            position = [0] * len(order)
+            for new, old in enumerate(order):
+                position[old] = new
+            timestamps = [timestamps[old] for old in order]
+            rates = [rates[old] for old in order]
+        marks = sorted(
+            (int(position[row]), int(count)) for row, count in zip(*series.repeats)
+        )
+        repeats = ([row for row, _ in marks], [count for _, count in marks])
+        return PairSeries(series.pair, timestamps, rates, repeats=repeats)
+
+    @staticmethod
+    def _rows(
+        series: PairSeries, start: Optional[int], end: Optional[int]
+    ) -> Tuple[int, int]:
+        """Номера тиков ряда, чьи повторы могут попасть в [start, end].
+
+        Бинарный поиск по меткам; в окно входит и первая отметка после
+        end - её повторы лежат между предыдущим тиком и ею.
+        """
+        timestamps = series.timestamps
+        lo, hi = 0, len(timestamps)
+        if np is not None and not isinstance(timestamps, list):
+            if start is not None:
+                lo = int(np.searchsorted(timestamps, start, side="left"))
+            if end is not None:
+                hi = int(np.searchsorted(timestamps, end, side="right"))
+        else:
+            if start is not None:
+                lo = bisect_left(timestamps, start)
+            if end is not None:
+                hi = bisect_right(timestamps, end)
+        hi = max(lo, hi)
+        if hi < len(timestamps) and series.marks(hi, hi + 1):
+            hi += 1
+        return lo, hi
+
+    @staticmethod
+    def _ticks(
+        stream: Stream,
+        lo: int,
+        hi: int,
+        start: Optional[int],
+        end: Optional[int],
+    ) -> Iterator[Tuple[int, float]]:
+        """Лениво разворачивает тики lo..hi-1 ряда в пределах [start, end]"""
+        series, inverted = stream
+        timestamps, rates = series.timestamps, series.rates
+        marks = series.marks(lo, hi)
+        for row in range(lo, hi):
+            ts = int(timestamps[row])
+            rate = float(rates[row])
+            if inverted:
+                rate = 1.0 / rate
+            count = marks.get(row)
+            if count:
+                previous = int(timestamps[row - 1]) if row else ts
+                moments = (
+                    previous + (ts - previous) * step // count
+                    for step in range(1, count + 1)
+                )
+            else:
+                moments = (ts,)
+            for moment in moments:
+                if start is not None and moment < start:
+                    continue
+                if end is not None and moment > end:
+                    break
+                yield moment, rate
+
+    def _window(
+        self, pair: str, start: Optional[datetime], end: Optional[datetime]
+    ) -> Iterator[Tuple[int, float]]:
+        """Лениво сливает тики пары и обратной пары в [start, end].
+
+        Тик пары важнее тика обратной с той же меткой времени.
+        """
+        start_us = _micros(start) if start is not None else None
+        end_us = _micros(end) if end is not None else None
+        streams = []
+        for priority, stream in enumerate(self._index(pair)):
+            lo, hi = self._rows(stream[0], start_us, end_us)
+            streams.append(
+                (
+                    (ts, priority, rate)
+                    for ts, rate in self._ticks(stream, lo, hi, start_us, end_us)
+                )
+            )
+        previous = None
+        for ts, _, rate in heapq.merge(*streams):
+            if ts != previous:
+                yield ts, rate
+                previous = ts
+
+    def rate_at(self, pair: str, moment: datetime) -> Optional[Tuple[datetime, float]]:
+        """Последний известный курс на момент moment: (время тика, курс) или None"""
+        moment_us = _micros(moment)
+        best = None
+        for stream in self._index(pair):
+            _, hi = self._rows(stream[0], None, moment_us)
+            # Последний тик не позже moment - в последнем ряду окна или
+            # среди повторов отметки сразу после moment
+            for ts, rate in self._ticks(stream, max(hi - 2, 0), hi, None, moment_us):
+                if best is None or ts > best[0]:
+                    best = (ts, rate)
+        if best is None:
+            return None
+        return from_micros(best[0]), best[1]
+
+    def range(
+        self,
+        pair: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[Tuple[datetime, float]]:
+        """Лениво выдаёт тики пары с start по end включительно"""
+        for ts, rate in self._window(pair, start, end):
+            yield from_micros(ts), rate
+
+    def resample(
+        self,
+        pair: str,
+        interval: timedelta,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[Dict]:
+        """Сводит тики в бары OHLC со средним и числом тиков.
+
+        Границы баров кратны interval от начала эпохи; пустые интервалы
+        в результат не попадают.
+        """
+        step = int(interval.total_seconds() * 1_000_000)
+        if step <= 0:
+            raise ValueError("Интервал должен быть положительным")
+        streams = self._index(pair)
+        if np is not None and all(
+            not isinstance(series.timestamps, list) for series, _ in streams
+        ):
+            timestamps, rates = self._window_numpy(streams, start, end)
+            if len(timestamps) == 0:
+                return []
+            return self._resample_numpy(timestamps, rates, step)
+
+        bars = []
+        ticks = self._window(pair, start, end)
+        for bucket, group in groupby(ticks, key=lambda tick: tick[0] // step):
+            rates = [rate for _, rate in group]
+            bars.append(
+                {
+                    "start": from_micros(bucket * step),
+                    "open": rates[0],
+                    "high": max(rates),
+                    "low": min(rates),
+                    "close": rates[-1],
+                    "mean": sum(rates) / len(rates),
+                    "count": len(rates),
+                }
+            )
+        return bars
+
+    def _window_numpy(
+        self,
+        streams: List[Stream],
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ):
+        """Тики окна [start, end] массивами NumPy: серии разворачиваются
+        и ряды сливаются только в пределах окна"""
+        start_us = _micros(start) if start is not None else None
+        end_us = _micros(end) if end is not None else None
+        parts = []
+        for priority, (series, inverted) in enumerate(streams):
+            lo, hi = self._rows(series, start_us, end_us)
+            if lo == hi:
+                continue
+            timestamps = np.asarray(series.timestamps[lo:hi], dtype="i8")
+            rates = np.asarray(series.rates[lo:hi], dtype="f8")
+            if inverted:
+                rates = 1.0 / rates
+            counts = np.ones(hi - lo, dtype="i8")
+            marks = series.marks(lo, hi)
+            if marks:
+                counts[np.array(list(marks), dtype="i8") - lo] = list(marks.values())
+                # Отметка с k повторами -> k тиков на равных долях
+                # интервала от предыдущего тика ряда до отметки
+                before = series.timestamps[lo - 1] if lo else timestamps[0]
+                previous = np.concatenate(([before], timestamps[:-1]))
+                starts = np.where(counts > 1, previous, timestamps)
+                offsets = np.repeat(np.cumsum(counts) - counts, counts)
+                steps = np.arange(int(counts.sum())) - offsets
+                timestamps = np.repeat(starts, counts) + (
+                    np.repeat(timestamps - starts, counts) * (steps + 1)
+                ) // np.repeat(counts, counts)
+                rates = np.repeat(rates, counts)
+            keep = np.ones(len(timestamps), dtype=bool)
+            if start_us is not None:
+                keep &= timestamps >= start_us
+            if end_us is not None:
+                keep &= timestamps <= end_us
+            parts.append(
+                (
+                    timestamps[keep],
+                    rates[keep],
+                    np.full(int(keep.sum()), priority, dtype="i1"),
+                )
+            )
+        if not parts:
+            return np.empty(0, dtype="i8"), np.empty(0, dtype="f8")
+        if len(parts) == 1:
+            return parts[0][0], parts[0][1]
+
+        timestamps = np.concatenate([part[0] for part in parts])
+        order = np.lexsort((np.concatenate([part[2] for part in parts]), timestamps))
+        timestamps = timestamps[order]
+        rates = np.concatenate([part[1] for part in parts])[order]
+        keep = np.ones(len(timestamps), dtype=bool)
+        keep[1:] = timestamps[1:] != timestamps[:-1]
+        return timestamps[keep], rates[keep]
+
+    @staticmethod
+    def _resample_numpy(timestamps, rates, step: int) -> List[Dict]:
+        """Векторная свёртка в бары через reduceat"""
+        buckets = timestamps // step
+        firsts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        lasts = np.append(firsts[1:] - 1, len(rates) - 1)
+        counts = lasts - firsts + 1
+        highs = np.maximum.reduceat(rates, firsts)
+        lows = np.minimum.reduceat(rates, firsts)
+        means = np.add.reduceat(rates, firsts) / counts
+        return [
+            {
+                "start": from_micros(int(buckets[first]) * step),
+                "open": float(rates[first]),
+                "high": float(high),
+                "low": float(low),
+                "close": float(rates[last]),
+                "mean": float(mean),
+                "count": int(count),
+            }
+            for first, last, high, low, mean, count in zip(
+                firsts, lasts, highs, lows, means, counts
+            )
+        ]
+
+
+# Глобальный экземпляр
+history_query = HistoryQuery()
@@ -0,0 +1,164 @@
+"""Запись и воспроизведение HTTP-ответов источников курсов.
+
+В режиме "record" ответы источников дописываются в JSON-файл фикстур,
+в режиме "replay" клиенты получают их из файла без обращения к сети.
+Режим включается через config.HTTP_FIXTURES_MODE (переменная окружения
+HTTP_FIXTURES_MODE) или явно: install_fixtures(client.session, ...).
+
+Ключ ExchangeRate-API в URL заменяется на {API_KEY}, поэтому в
+фикстуры не попадает и при воспроизведении не нужен. На повторный
+запрос с If-None-Match, совпадающим с ETag записанного ответа,
+воспроизведение отвечает 304, как настоящий сервер.
+"""
+
+import os
+import threading
+from http.client import responses as reasons
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from valutatrade_hub.infra.durable import atomic_write_json, read_json
+
+from .config import config
+
+MODES = ("record", "replay")
+# Заголовки, которые нужны клиентам при воспроизведении
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class FixtureNotFoundError(requests.exceptions.RequestException):
+    """Для запроса нет записанного ответа"""
+
+
+def _fixture_key(request: requests.PreparedRequest) -> str:
+    url = request.url
+    if config.EXCHANGERATE_API_KEY:
+        url = url.replace(config.EXCHANGERATE_API_KEY, "{API_KEY}")
+    return f"{request.method} {url}"
+
+
+class HttpFixtures:
+    """Файл записанных ответов {"METHOD url": [ответ, ...]}.
+
+    Ответы одного запроса воспроизводятся по порядку записи, последний
+    повторяется, когда записи закончились.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.interactions: Dict[str, List[dict]] = read_json(path, {}) or {}
+        self._cursors: Dict[str, int] = {}
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response):
+        """Дописывает ответ в фикстуры (304 не пишется: его даёт ETag)"""
+        if response.status_code == 304:
+            return
+        interaction = {
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in KEPT_HEADERS
+                if name in response.headers
+            },
+            "body": response.text,
+        }
+        with self._lock:
+            self.interactions.setdefault(_fixture_key(request), []).append(interaction)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write_json(self.path, self.interactions)
+
+    def replay(self, request: requests.PreparedRequest) -> Optional[dict]:
+        """Возвращает следующий записанный ответ на запрос или None"""
+        key = _fixture_key(request)
+        with self._lock:
+            recorded = self.interactions.get(key)
+            if not recorded:
+                return None
+            position = self._cursors.get(key, 0)
+            self._cursors[key] = position + 1
+            return recorded[min(position, len(recorded) - 1)]
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Транспорт requests, записывающий ответы сети в фикстуры"""
+
+    def __init__(self, fixtures: HttpFixtures, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures = fixtures
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.fixtures.record(request, response)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Транспорт requests, отвечающий из фикстур без сети"""
+
+    def __init__(self, fixtures: HttpFixtures):
+        super().__init__()
+        self.fixtures = fixtures
+
+    def send(self, request, **kwargs):
+        interaction = self.fixtures.replay(request)
+        if interaction is None:
+            raise FixtureNotFoundError(
+                f"Нет записанного ответа для {_fixture_key(request)}",
+                request=request,
+            )
+
+        status = interaction["status"]
+        headers = CaseInsensitiveDict(interaction.get("headers", {}))
+        body = interaction.get("body", "")
+        etag = headers.get("ETag")
+        if status == 200 and etag and request.headers.get("If-None-Match") == etag:
+            status, headers, body = 304, CaseInsensitiveDict({"ETag": etag}), ""
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reasons.get(status, "")
+        response.headers = headers
+        response._content = body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+# Один объект на файл: клиенты в режиме записи дописывают общий файл
+_opened: Dict[str, HttpFixtures] = {}
+_opened_lock = threading.Lock()
+
+
+def open_fixtures(path: str) -> HttpFixtures:
+    """Возвращает фикстуры файла path (общие для всех клиентов процесса)"""
+    path = os.path.abspath(path)
+    with _opened_lock:
+        if path not in _opened:
+            _opened[path] = HttpFixtures(path)
+        return _opened[path]
+
+
+def install_fixtures(session: requests.Session, mode: str, path: str):
+    """Подключает к сессии запись или воспроизведение фикстур path"""
+    if mode not in MODES:
+        raise ValueError(f"Неизвестный режим фикстур: {mode} (ожидается {MODES})")
+    fixtures = open_fixtures(path)
+    if mode == "record":
+        adapter = RecordingAdapter(
+            fixtures,
+            pool_connections=config.HTTP_POOL_SIZE,
+            pool_maxsize=config.HTTP_POOL_SIZE,
+        )
+    else:
+        adapter = ReplayAdapter(fixtures)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
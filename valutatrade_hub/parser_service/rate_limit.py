@@ -0,0 +1,165 @@
+"""Клиентские лимиты запросов к источникам курсов.
+
+У каждого источника одно или несколько вёдер токенов из
+config.RATE_LIMITS: (запросов, за секунд), например 30 в минуту и
+10 000 в месяц. Каждый HTTP-запрос, включая повторы, забирает токен из
+всех вёдер источника; если хотя бы в одном пусто, запрос не уходит.
+
+Состояние вёдер хранится в data/request_budget.json под файловой
+блокировкой, поэтому планировщик и ручные update-rates из другого
+процесса расходуют один общий бюджет, а перезапуск его не обнуляет.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from valutatrade_hub.infra.durable import atomic_write_bytes, read_json
+from valutatrade_hub.infra.locks import file_lock
+from valutatrade_hub.infra.settings import SettingsLoader
+
+from .config import config
+
+
+class TokenBucket:
+    """Ведро на capacity токенов, полностью пополняется за period секунд"""
+
+    def __init__(
+        self,
+        capacity: int,
+        period: float,
+        tokens: Optional[float] = None,
+        updated: Optional[float] = None,
+    ):
+        self.capacity = capacity
+        self.period = period
+        self.tokens = float(capacity) if tokens is None else tokens
+        self.updated = time.time() if updated is None else updated
+
+    @property
+    def key(self) -> str:
+        return f"{self.capacity}/{self.period:g}"
+
+    def refill(self, now: float):
+        """Добавляет токены, накопившиеся с прошлого обращения"""
+        if now > self.updated:
+            earned = (now - self.updated) * self.capacity / self.period
+            self.tokens = min(float(self.capacity), self.tokens + earned)
+            self.updated = now
+
+    def wait_time(self, count: int = 1) -> float:
+        """Через сколько секунд в ведре будет count токенов"""
+        if self.tokens >= count:
+            return 0.0
+        return (count - self.tokens) * self.period / self.capacity
+
+
+class RequestBudget:
+    """Общий для процессов бюджет запросов по источникам"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _path(self) -> str:
+        return os.path.join(
+            SettingsLoader().get("data_path", "data/"), "request_budget.json"
+        )
+
+    @staticmethod
+    def _limits(source: str) -> List[Tuple[int, float]]:
+        return list(config.RATE_LIMITS.get(source, ()))
+
+    def _load(self, source: str, state: Dict) -> List[TokenBucket]:
+        saved = state.get(source, {})
+        buckets = []
+        for capacity, period in self._limits(source):
+            bucket = TokenBucket(capacity, period)
+            if bucket.key in saved:
+                bucket.tokens = saved[bucket.key]["tokens"]
+                bucket.updated = saved[bucket.key]["updated"]
+            buckets.append(bucket)
+        return buckets
+
+    def _save(self, state: Dict, source: str, buckets: List[TokenBucket]):
+        state[source] = {
+            bucket.key: {"tokens": bucket.tokens, "updated": bucket.updated}
+            for bucket in buckets
+        }
+        # Без fsync: после сбоя бюджет в худшем случае чуть завышен
+        atomic_write_bytes(
+            self._path(), json.dumps(state, indent=2).encode("utf-8"), sync=False
+        )
+
+    def acquire(self, source: str, count: int = 1) -> float:
+        """Забирает count токенов источника.
+
+        Возвращает 0.0, если запрос можно отправлять, иначе - через
+        сколько секунд бюджета хватит (токены тогда не списываются).
+        """
+        if not self._limits(source):
+            return 0.0
+        path = self._path()
+        with self._lock, file_lock(path + ".lock"):
+            state = read_json(path, {}) or {}
+            buckets = self._load(source, state)
+            now = time.time()
+            for bucket in buckets:
+                bucket.refill(now)
+            wait = max(bucket.wait_time(count) for bucket in buckets)
+            if wait > 0:
+                return wait
+            for bucket in buckets:
+                bucket.tokens -= count
+            self._save(state, source, buckets)
+            return 0.0
+
+    def capacity(self, source: str) -> Optional[int]:
+        """Сколько запросов источник может сделать разом (None - без лимита)"""
+        limits = self._limits(source)
+        if not limits:
+            return None
+        return min(capacity for capacity, _ in limits)
+
+    def remaining(self, source: str) -> Optional[int]:
+        """Сколько запросов источнику доступно сейчас (None - без лимита)"""
+        report = self.report().get(source)
+        if report is None:
+            return None
+        return min(limit["remaining"] for limit in report)
+
+    def report(self) -> Dict[str, List[Dict]]:
+        """Остаток бюджета: {источник: [{limit, period, remaining, next_in}]}"""
+        path = self._path()
+        with self._lock:
+            state = read_json(path, {}) or {}
+        now = time.time()
+        result = {}
+        for source in config.RATE_LIMITS:
+            result[source] = []
+            for bucket in self._load(source, state):
+                bucket.refill(now)
+                result[source].append(
+                    {
+                        "limit": bucket.capacity,
+                        "period": bucket.period,
+                        "remaining": int(bucket.tokens),
+                        "next_in": bucket.wait_time(int(bucket.tokens) + 1)
+                        if bucket.tokens < bucket.capacity
+                        else 0.0,
+                    }
+                )
+        return result
+
+
+def format_period(seconds: float) -> str:
+    """Короткая запись периода: 60s -> 1m, 2592000s -> 30d"""
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{seconds / size:g}{unit}"
+    return f"{seconds:g}s"
+
+
+# Глобальный экземпляр
+request_budget = RequestBudget()
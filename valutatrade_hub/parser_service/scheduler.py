@@ -1,46 +1,132 @@
-import threading
+"""Планировщик обновления курсов.
+
+Импорт модуля ничего не запускает: планировщик стартует явно через
+rates_scheduler.start_background_scheduler() или командой
+    python -m valutatrade_hub.parser_service.scheduler
+
+Каждый источник обновляется своей задачей. Интервал привязан к сроку
+годности курсов источника (source_ttl_seconds), сжимается, пока курсы
+быстро меняются, и растёт, пока они стоят на месте. После ошибок
+повторы идут с экспоненциальной задержкой, ко всем срокам добавляется
+случайный разброс, чтобы запросы не шли строго синхронно.
+"""
+
+import random
 import time
+from typing import Dict, Optional
 
-import schedule
+from valutatrade_hub.infra.settings import SettingsLoader
 
-from .updater import rates_updater
+from .api_clients import BaseApiClient
+from .async_scheduler import AsyncScheduler
+from .async_updater import AsyncRatesUpdater, async_rates_updater
+from .config import config
 
 
 class RatesScheduler:
     """Планировщик периодического обновления курсов"""
-    
-    def __init__(self):
-        self.updater = rates_updater
-        self._stop_event = threading.Event()
-    
+
+    def __init__(self, updater: Optional[AsyncRatesUpdater] = None):
+        self.updater = updater or async_rates_updater
+        self.scheduler = AsyncScheduler()
+        self.settings = SettingsLoader()
+        # имя источника -> текущий интервал и число ошибок подряд
+        self.intervals: Dict[str, float] = {}
+        self.failures: Dict[str, int] = {}
+        self._registered = False
+
+    def source_ttl(self, client: BaseApiClient) -> float:
+        """Срок годности курсов источника в секундах"""
+        source_ttl = self.settings.get("source_ttl_seconds", {})
+        return source_ttl.get(client.name, self.settings.get("rates_ttl_seconds", 300))
+
+    def _bounds(self, client: BaseApiClient):
+        ttl = self.source_ttl(client)
+        return ttl * config.MIN_REFRESH_FRACTION, ttl * config.REFRESH_FRACTION
+
+    @staticmethod
+    def _max_change(old: dict, new: dict) -> float:
+        """Наибольшее относительное изменение курсов между опросами"""
+        changes = [
+            abs(rate - old[pair]) / abs(old[pair])
+            for pair, rate in new.items()
+            if old.get(pair)
+        ]
+        return max(changes, default=0.0)
+
+    def next_delay(self, client: BaseApiClient, success: bool, change: float) -> float:
+        """Вычисляет задержку до следующего опроса источника"""
+        low, high = self._bounds(client)
+        interval = self.intervals.get(client.name, high)
+        if not success:
+            failures = self.failures.get(client.name, 0) + 1
+            self.failures[client.name] = failures
+            delay = min(config.FAILURE_BACKOFF_BASE * 2 ** (failures - 1), interval)
+        else:
+            self.failures[client.name] = 0
+            if change >= config.VOLATILITY_THRESHOLD:
+                interval = max(low, interval / 2)
+            else:
+                interval = min(high, interval * 1.5)
+            self.intervals[client.name] = interval
+            delay = interval
+        jitter = config.REFRESH_JITTER
+        return delay * random.uniform(1 - jitter, 1 + jitter)
+
+    def _job(self, client: BaseApiClient):
+        async def refresh_source():
+            previous = dict(client.last_rates)
+            success = await self.updater.run_update([client])
+            change = self._max_change(previous, client.last_rates)
+            delay = self.next_delay(client, success, change)
+            if client.retry_after:
+                # Бюджет запросов исчерпан: раньше нового токена опрашивать незачем
+                delay = max(delay, client.retry_after)
+            print(
+                f"INFO: Next {client.name} refresh in {delay:.0f}s "
+                f"(change {change:.2%})"
+            )
+            return delay
+
+        return refresh_source
+
+    def _register_jobs(self):
+        if self._registered:
+            return
+        for client in self.updater.updater.clients:
+            _, high = self._bounds(client)
+            self.intervals.setdefault(client.name, high)
+            self.scheduler.add_job(f"refresh:{client.name}", self._job(client), high)
+        self._registered = True
+
     def start_background_scheduler(self):
         """Запускает планировщик в фоновом потоке"""
-        def run_scheduler():
-            # Обновление каждые 5 минут
-            schedule.every(5).minutes.do(self._run_update)
-            
-            while not self._stop_event.is_set():
-                schedule.run_pending()
-                time.sleep(1)
-        
-        thread = threading.Thread(target=run_scheduler, daemon=True)
-        thread.start()
-        print("INFO: Rates scheduler started in background (updates every 5 minutes)")
-    
-    def _run_update(self):
-        """Запускает обновление курсов"""
-        print("INFO: Scheduled rates update started...")
-        success = self.updater.run_update()
-        if success:
-            print("INFO: Scheduled update completed successfully")
-        else:
-            print("WARNING: Scheduled update completed with errors")
-    
+        self._register_jobs()
+        self.scheduler.start()
+        schedule = ", ".join(
+            f"{name} every ~{interval:.0f}s"
+            for name, interval in self.intervals.items()
+        )
+        print(f"INFO: Rates scheduler started in background ({schedule})")
+
     def stop(self):
-        """Останавливает планировщик"""
-        self._stop_event.set()
+        """Останавливает планировщик и дописывает незакрытые серии курсов"""
+        self.scheduler.stop()
+        self.updater.updater.storage.flush_history_runs()
 
 
-# Автоматический запуск при импорте
+# Глобальный экземпляр, запускается явно
 rates_scheduler = RatesScheduler()
-rates_scheduler.start_background_scheduler()
\ No newline at end of file
+
+
+def main():
+    rates_scheduler.start_background_scheduler()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        rates_scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
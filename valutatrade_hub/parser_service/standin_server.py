@@ -0,0 +1,260 @@
+"""Локальный стенд источников курсов для офлайн-прогонов.
+
+Имитирует ответы CoinGecko (/api/v3/simple/price) и ExchangeRate-API
+(/v6/<ключ>/latest/USD) с настраиваемой задержкой, долей ошибок 503 и
+набором валют. Ответы несут ETag, так что условные запросы получают 304,
+пока курсы не сдвинулись (volatility > 0 сдвигает их на каждом запросе).
+
+Запуск: python -m valutatrade_hub.parser_service.standin_server --port 8800
+и затем переменные окружения, которые он напечатает.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .config import ParserConfig, config
+
+KNOWN_FIAT = {"EUR": 0.92, "GBP": 0.79, "RUB": 92.5, "JPY": 151.3, "CNY": 7.2}
+KNOWN_CRYPTO = {
+    "BTC": ("bitcoin", 60000.0),
+    "ETH": ("ethereum", 3000.0),
+    "SOL": ("solana", 150.0),
+}
+
+
+def synthetic_universe(
+    fiat_count: int, crypto_count: int
+) -> Tuple[Tuple[str, ...], Dict[str, str]]:
+    """Набор валют заданного размера: сначала настоящие коды, затем F001.../C001..."""
+    fiat = list(KNOWN_FIAT)[:fiat_count]
+    fiat += [f"F{i:03d}" for i in range(1, fiat_count - len(fiat) + 1)]
+    crypto = {code: crypto_id for code, (crypto_id, _) in KNOWN_CRYPTO.items()}
+    crypto = dict(list(crypto.items())[:crypto_count])
+    for i in range(1, crypto_count - len(crypto) + 1):
+        crypto[f"C{i:03d}"] = f"coin-{i:03d}"
+    return tuple(fiat), crypto
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Заголовки и тело уходят разными write: без NODELAY keep-alive
+        # упирается в задержку ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        self.server.standin.handle(self)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInRatesServer:
+    """HTTP-стенд CoinGecko и ExchangeRate-API в фоновом потоке"""
+
+    api_key = "standin"
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        fiat: Sequence[str] = ("EUR", "GBP", "RUB"),
+        crypto: Optional[Dict[str, str]] = None,
+        volatility: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.volatility = volatility
+        self.fiat = tuple(fiat)
+        self.crypto = dict(crypto or {c: i for c, (i, _) in KNOWN_CRYPTO.items()})
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Цены в USD: фиат - единиц за 1 USD, крипто - USD за монету
+        known_crypto = {crypto_id: price for crypto_id, price in KNOWN_CRYPTO.values()}
+        self.prices: Dict[str, float] = {}
+        for code in self.fiat:
+            self.prices[code] = KNOWN_FIAT.get(code) or self._random.uniform(0.5, 150)
+        for crypto_id in self.crypto.values():
+            self.prices[crypto_id] = known_crypto.get(
+                crypto_id
+            ) or self._random.uniform(0.01, 500)
+        self.updated_at = self._now()
+        self.requests = 0
+        self.errors = 0
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def coingecko_url(self) -> str:
+        return f"{self.url}/api/v3/simple/price"
+
+    @property
+    def exchangerate_url(self) -> str:
+        return f"{self.url}/v6"
+
+    def configure(self, parser_config: ParserConfig = config):
+        """Направляет клиенты парсера на стенд и задаёт его набор валют"""
+        parser_config.COINGECKO_URL = self.coingecko_url
+        parser_config.EXCHANGERATE_API_URL = self.exchangerate_url
+        parser_config.EXCHANGERATE_API_KEY = self.api_key
+        parser_config.FIAT_CURRENCIES = self.fiat
+        parser_config.CRYPTO_CURRENCIES = tuple(self.crypto)
+        parser_config.CRYPTO_ID_MAP = dict(self.crypto)
+
+    def start(self) -> "StandInRatesServer":
+        """Запускает сервер в фоновом потоке"""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="standin-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S +0000")
+
+    def _drift(self, keys):
+        """Сдвигает цены случайным блужданием (под self._lock)"""
+        if not self.volatility:
+            return
+        for key in keys:
+            self.prices[key] *= 1 + self._random.gauss(0, self.volatility)
+        self.updated_at = self._now()
+
+    def _coingecko(self, query: dict) -> dict:
+        ids = [i for i in ",".join(query.get("ids", [])).split(",") if i]
+        currencies = ",".join(query.get("vs_currencies", ["usd"])).split(",")
+        known = [crypto_id for crypto_id in ids if crypto_id in self.prices]
+        self._drift(known)
+        return {
+            crypto_id: {c: self.prices[crypto_id] for c in currencies if c == "usd"}
+            for crypto_id in known
+        }
+
+    def _exchangerate(self, path: str) -> dict:
+        # /v6/<ключ>/latest/<база>
+        parts = path.strip("/").split("/")
+        if len(parts) != 4 or parts[2] != "latest" or not parts[1]:
+            return {"result": "error", "error-type": "invalid-key"}
+        if parts[3] != "USD":
+            return {"result": "error", "error-type": "unsupported-code"}
+        self._drift(self.fiat)
+        conversion_rates = {"USD": 1.0}
+        conversion_rates.update({code: self.prices[code] for code in self.fiat})
+        return {
+            "result": "success",
+            "base_code": "USD",
+            "time_last_update_utc": self.updated_at,
+            "conversion_rates": conversion_rates,
+        }
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        """Отвечает на запрос клиента парсера"""
+        if self.latency:
+            time.sleep(self.latency)
+        parsed = urlsplit(handler.path)
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            elif parsed.path.endswith("/simple/price"):
+                payload = self._coingecko(parse_qs(parsed.query))
+            elif parsed.path.startswith("/v6/"):
+                payload = self._exchangerate(parsed.path)
+            else:
+                payload = None
+
+        if failed or payload is None:
+            handler.send_response(503 if failed else 404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        body = json.dumps(payload).encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        if handler.headers.get("If-None-Match") == etag:
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("ETag", etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд источников курсов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--volatility", type=float, default=0.0)
+    parser.add_argument("--fiat", type=int, default=3, help="число фиатных валют")
+    parser.add_argument("--crypto", type=int, default=3, help="число криптовалют")
+    args = parser.parse_args()
+
+    fiat, crypto = synthetic_universe(args.fiat, args.crypto)
+    server = StandInRatesServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        fiat=fiat,
+        crypto=crypto,
+        volatility=args.volatility,
+    )
+    print(f"Стенд источников курсов: {server.url}")
+    print(f"export COINGECKO_URL={server.coingecko_url}")
+    print(f"export EXCHANGERATE_API_URL={server.exchangerate_url}")
+    print(f"export EXCHANGERATE_API_KEY={server.api_key}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
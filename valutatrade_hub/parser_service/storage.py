@@ -1,80 +1,227 @@
-import json
 import os
+import threading
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+from valutatrade_hub.core.exceptions import CorruptedDataError
+from valutatrade_hub.core.rates_snapshot import (
+    RateQuote,
+    RatesSnapshot,
+    RatesSnapshotStore,
+)
+from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.durable import atomic_write_json, read_json
+from valutatrade_hub.infra.settings import SettingsLoader
+
+from .columnar import ColumnarHistory, group_ticks, to_micros
 from .config import config
+from .history_delta import HistoryDelta, HistoryRow
+from .history_log import build_record
 
 
 class RatesStorage:
     """Управление хранением курсов валют"""
 
+    def __init__(self):
+        self.db = DatabaseManager()
+        self.snapshots = RatesSnapshotStore()
+        data_path = SettingsLoader().get("data_path", "data/")
+        self.delta = HistoryDelta(config.HISTORY_RUN_MAX)
+        self._runs_path = os.path.join(data_path, "history_runs.json")
+        try:
+            self.delta.load(read_json(self._runs_path) or {})
+        except CorruptedDataError as e:
+            print(f"WARNING: серии истории начаты заново: {e}")
+        self._history_lock = threading.Lock()
+        self._columns_lock = threading.Lock()
+        # (mtime_ns, размер) history_runs.json и прочитанные из него серии
+        self._pending: Tuple[Optional[Tuple[int, int]], Dict] = (None, {})
+        self.columns = ColumnarHistory(os.path.join(data_path, "history_columns"))
+
     def save_current_rates(self, rates_data: Dict) -> bool:
-        """Сохраняет текущие курсы в rates.json"""
+        """Публикует текущие курсы {пара: {"rate", "updated_at", "source"}}"""
         try:
-            data = {
-                "source": "ParserService",
-                "last_refresh": datetime.now().isoformat(),
-                **rates_data,
-            }
-
-            with open(config.RATES_FILE_PATH, "w") as f:
-                json.dump(data, f, indent=2)
+            self.snapshots.publish(RatesSnapshot.from_dict(rates_data).rates)
             return True
         except Exception as e:
             print(f"Ошибка сохранения текущих курсов: {e}")
             return False
 
+    def publish_rates(
+        self, rates: Dict[str, RateQuote], refreshed_at: Optional[str] = None
+    ) -> Optional[RatesSnapshot]:
+        """Публикует курсы цикла поверх текущего снимка; None при ошибке"""
+        try:
+            return self.snapshots.publish(rates, refreshed_at, merge=True)
+        except Exception as e:
+            print(f"Ошибка сохранения текущих курсов: {e}")
+            return None
+
     def save_historical_record(
         self, currency_pair: str, rate: float, source: str
     ) -> bool:
-        """Сохраняет историческую запись в exchange_rates.json"""
+        """Дописывает историческую запись в историю курсов"""
         try:
-            timestamp = datetime.now().isoformat()
-            record_id = (
-                f"{currency_pair}_{timestamp.replace(':', '-').replace('.', '-')}"
+            record = build_record(
+                currency_pair, rate, source, datetime.now().isoformat()
             )
+            if config.HISTORY_COLUMNAR_ENABLED:
+                self._backfill_columns([record])
+            self.db.append_history([record])
+            if config.HISTORY_COLUMNAR_ENABLED:
+                self.columns.append_records(
+                    [(currency_pair, record["timestamp"], rate)]
+                )
+            return True
+        except Exception as e:
+            print(f"Ошибка сохранения исторической записи: {e}")
+            return False
 
-            record = {
-                "id": record_id,
-                "from_currency": currency_pair.split("_")[0],
-                "to_currency": currency_pair.split("_")[1],
-                "rate": rate,
-                "timestamp": timestamp,
-                "source": source,
-                "meta": {
-                    "raw_id": currency_pair,
-                    "status_code": 200,
-                    "updated_at": timestamp,
-                },
-            }
-
-            # Загружаем существующие данные
-            if os.path.exists(config.HISTORY_FILE_PATH):
-                with open(config.HISTORY_FILE_PATH, "r") as f:
-                    history = json.load(f)
-            else:
-                history = []
-
-            # Добавляем новую запись
-            history.append(record)
-
-            # Сохраняем обратно
-            with open(config.HISTORY_FILE_PATH, "w") as f:
-                json.dump(history, f, indent=2)
+    def save_historical_records(
+        self,
+        records: Iterable[Tuple[str, float, str]],
+        timestamp: Optional[str] = None,
+    ) -> bool:
+        """Сохраняет все записи одного цикла обновления одной записью с fsync.
 
+        records - последовательность (валютная_пара, курс, источник);
+        все записи получают общую метку времени цикла.
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        return self.save_history_rows(
+            (currency_pair, rate, source, timestamp, 0)
+            for currency_pair, rate, source in records
+        )
+
+    def save_history_rows(self, rows: Iterable[HistoryRow]) -> bool:
+        """Дописывает строки (пара, курс, источник, метка, повторы) с fsync"""
+        try:
+            batch = [build_record(*row) for row in rows]
+            if not batch:
+                return True
+            if config.HISTORY_COLUMNAR_ENABLED:
+                self._backfill_columns(batch)
+            self.db.append_history(batch, durable=True)
+            if config.HISTORY_COLUMNAR_ENABLED:
+                self.columns.append_records(
+                    (
+                        record["meta"]["raw_id"],
+                        record["timestamp"],
+                        record["rate"],
+                        record.get("repeats", 0),
+                    )
+                    for record in batch
+                )
             return True
         except Exception as e:
-            print(f"Ошибка сохранения исторической записи: {e}")
+            print(f"Ошибка сохранения исторических записей: {e}")
             return False
 
-    def load_current_rates(self) -> Dict:
-        """Загружает текущие курсы из rates.json"""
+    def _backfill_columns(self, batch: List[Dict]):
+        """Переносит старую историю пар, у которых ещё нет колоночных файлов.
+
+        Запросы читают журнал только для пар без колонок, поэтому перед
+        первой дозаписью тики пары (и обратной, если у неё тоже нет
+        файлов) из журнала копируются в колонки - иначе история до
+        включения колоночного формата пропала бы из запросов.
+        """
+        with self._columns_lock:
+            before: Dict[str, int] = {}
+            for record in batch:
+                pair = record["meta"]["raw_id"]
+                micros = to_micros(record["timestamp"])
+                before[pair] = min(before.get(pair, micros), micros)
+            missing = [pair for pair in before if self.columns.is_empty(pair)]
+            if not missing:
+                return
+            for pair in list(missing):
+                from_code, _, to_code = pair.partition("_")
+                inverse = f"{to_code}_{from_code}"
+                if inverse not in before and self.columns.is_empty(inverse):
+                    before[inverse] = before[pair]
+                    missing.append(inverse)
+            older = group_ticks(
+                self.db.iter_history(),
+                pairs=missing,
+                before={pair: before[pair] for pair in missing},
+            )
+            for pair, ticks in older.items():
+                self.columns.append_ticks(pair, ticks)
+
+    def save_cycle_history(
+        self, rates: Dict[str, Tuple[float, Optional[str]]], timestamp: str
+    ) -> bool:
+        """Дописывает в историю только изменения цикла.
+
+        rates - все курсы цикла {пара: (курс, источник)}, в том числе
+        неизменившиеся: они продлевают серию и пишутся только отметкой.
+        """
+        with self._history_lock:
+            rows, runs = [], {}
+            for currency_pair, (rate, source) in HistoryDelta.select_pairs(
+                rates
+            ).items():
+                pair_rows, runs[currency_pair] = self.delta.observe(
+                    currency_pair, rate, source, timestamp
+                )
+                rows.extend(pair_rows)
+            return self._commit_runs(rows, runs)
+
+    def flush_history_runs(self) -> bool:
+        """Записывает отметки незакрытых серий (при остановке обновления)"""
+        with self._history_lock:
+            return self._commit_runs(*self.delta.flush())
+
+    def _commit_runs(self, rows: List[HistoryRow], runs: Dict) -> bool:
+        """Дописывает записи серий и только после этого фиксирует серии.
+
+        Открытые серии сохраняются в history_runs.json каждый цикл, и
+        после сбоя или перезапуска накопленные повторы не теряются.
+        """
+        if not self.save_history_rows(rows):
+            return False
+        self.delta.commit(runs)
         try:
-            if os.path.exists(config.RATES_FILE_PATH):
-                with open(config.RATES_FILE_PATH, "r") as f:
-                    return json.load(f)
+            atomic_write_json(self._runs_path, self.delta.to_dict())
+        except Exception as e:
+            print(f"Ошибка сохранения серий истории: {e}")
+        return True
+
+    def pending_runs(self) -> Dict[str, Dict]:
+        """Открытые серии из history_runs.json: {пара: {rate, last_seen, repeats}}.
+
+        Их повторы ещё не записаны отметкой; файл пишет процесс,
+        обновляющий курсы, и перечитывается только после изменения.
+        """
+        try:
+            stat = os.stat(self._runs_path)
+        except FileNotFoundError:
             return {}
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._pending[0] != key:
+            try:
+                runs = read_json(self._runs_path) or {}
+            except CorruptedDataError:
+                runs = {}
+            self._pending = (key, runs)
+        return self._pending[1]
+
+    def iter_history(self, currency_pair: Optional[str] = None) -> Iterator[Dict]:
+        """Лениво читает историю курсов"""
+        return self.db.iter_history(currency_pair)
+
+    def load_series(self, currency_pair: str):
+        """Открывает колоночный ряд пары (memoryview/NumPy без разбора JSON)"""
+        return self.columns.load(currency_pair)
+
+    def current_snapshot(self) -> RatesSnapshot:
+        """Возвращает текущий снимок курсов"""
+        return self.snapshots.current()
+
+    def load_current_rates(self) -> Dict:
+        """Возвращает текущие курсы в формате rates.json"""
+        try:
+            return self.snapshots.current().to_dict()
         except Exception as e:
             print(f"Ошибка загрузки текущих курсов: {e}")
             return {}
@@ -1,80 +1,230 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from .api_clients import CoinGeckoClient, ExchangeRateApiClient
+from valutatrade_hub.core.rates_snapshot import RateQuote
+from valutatrade_hub.infra.settings import SettingsLoader
+
+from .api_clients import (
+    BaseApiClient,
+    CoinGeckoClient,
+    ExchangeRateApiClient,
+    FetchResult,
+)
+from .config import config
 from .storage import RatesStorage
 
+# (курс, источник, изменился ли с прошлого цикла)
+RateEntry = Tuple[float, str, bool]
+
 
 class RatesUpdater:
     """Основной класс для обновления курсов"""
 
-    def __init__(self):
-        self.coingecko_client = CoinGeckoClient()
-        self.exchangerate_client = ExchangeRateApiClient()
+    def __init__(self, clients: Optional[Iterable[BaseApiClient]] = None):
+        if clients is None:
+            clients = [CoinGeckoClient(), ExchangeRateApiClient()]
+        self.clients: List[BaseApiClient] = list(clients)
         self.storage = RatesStorage()
 
-    def run_update(self) -> bool:
-        """Запускает полное обновление курсов"""
-        all_rates = {}
+    def register_client(self, client: BaseApiClient):
+        """Добавляет источник курсов в опрос"""
+        self.clients.append(client)
+
+    def cycle_deadline(self) -> float:
+        """Срок цикла обновления по time.monotonic()"""
+        return time.monotonic() + config.UPDATE_DEADLINE
+
+    def fetch_all(
+        self, deadline: float, clients: List[BaseApiClient]
+    ) -> Tuple[Dict[str, RateEntry], int]:
+        """Опрашивает источники параллельно до общего срока.
+
+        Результаты сливаются по мере поступления. Возвращает
+        {валютная_пара: (курс, источник, изменился)} и число успешных
+        источников.
+        """
+        all_rates: Dict[str, RateEntry] = {}
         success_sources = 0
+        if not clients:
+            return all_rates, success_sources
 
-        # Получаем курсы от обоих API
+        executor = ThreadPoolExecutor(
+            max_workers=len(clients), thread_name_prefix="rates-fetch"
+        )
+        pending = {
+            executor.submit(client.fetch, deadline): client for client in clients
+        }
         try:
-            crypto_rates = self.coingecko_client.fetch_rates()
-            if crypto_rates:
-                all_rates.update(crypto_rates)
-                print(
-                    f"INFO: Fetching from CoinGecko... OK ({len(crypto_rates)} rates)"
-                )
-                success_sources += 1
-            else:
-                print("ERROR: Failed to fetch from CoinGecko: No data received")
-        except Exception as e:
-            print(f"ERROR: Failed to fetch from CoinGecko: {e}")
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    client = pending.pop(future)
+                    if self.collect(client, future.result, all_rates):
+                        success_sources += 1
+            self.report_missed(pending.values())
+        finally:
+            # Не ждём опоздавшие запросы: повторы и таймауты в них не
+            # выходят за срок цикла, а их итог уже никуда не попадёт
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return all_rates, success_sources
 
+    def collect(
+        self,
+        client: BaseApiClient,
+        outcome: Callable[[], FetchResult],
+        all_rates: Dict[str, RateEntry],
+    ) -> bool:
+        """Забирает итог опроса источника (outcome() или его исключение)
+        и добавляет его к курсам цикла; False - данных нет"""
         try:
-            fiat_rates = self.exchangerate_client.fetch_rates()
-            if fiat_rates:
-                all_rates.update(fiat_rates)
-                print(
-                    f"INFO: Fetching from ExchangeRate-API... OK "
-                    f"({len(fiat_rates)} rates)"
-                )
-                success_sources += 1
-            else:
-                print("ERROR: Failed to fetch from ExchangeRate-API: No data received")
+            result = outcome()
         except Exception as e:
-            print(f"ERROR: Failed to fetch from ExchangeRate-API: {e}")
+            print(f"ERROR: Failed to fetch from {client.name}: {e}")
+            return False
+        return self.merge(client, result, all_rates)
+
+    @staticmethod
+    def merge(
+        client: BaseApiClient, result: FetchResult, all_rates: Dict[str, RateEntry]
+    ) -> bool:
+        """Добавляет ответ источника к курсам цикла; False - данных нет"""
+        client.remember(result)
+        rates = result.rates
+        if not rates and result.retry_after:
+            print(
+                f"INFO: {client.name} deferred: request budget exhausted, "
+                f"next request in {result.retry_after:.0f}s"
+            )
+            return False
+        if not rates:
+            print(f"ERROR: Failed to fetch from {client.name}: No data received")
+            return False
+        changed = not result.not_modified
+        for currency_pair, rate in rates.items():
+            all_rates[currency_pair] = (rate, client.name, changed)
+        status = f"{len(rates)} rates" if changed else "not modified"
+        print(f"INFO: Fetching from {client.name}... OK ({status})")
+        return True
+
+    @staticmethod
+    def report_missed(clients: Iterable[BaseApiClient]):
+        """Сообщает об источниках, не ответивших к сроку цикла"""
+        for client in clients:
+            print(f"ERROR: Failed to fetch from {client.name}: Deadline exceeded")
 
+    def refreshed_ago(self, client: BaseApiClient) -> Optional[float]:
+        """Сколько секунд назад опубликованы курсы источника (None - не было)"""
+        stamps = [
+            quote.updated_at
+            for _, quote in self.storage.current_snapshot()
+            if quote.source == client.name
+        ]
+        if not stamps:
+            return None
+        return max(0.0, time.time() - datetime.fromisoformat(max(stamps)).timestamp())
+
+    def _recently_refreshed(self, client: BaseApiClient) -> bool:
+        """Курсы источника моложе MIN_REFRESH_FRACTION его срока годности"""
+        age = self.refreshed_ago(client)
+        if age is None:
+            return False
+        settings = SettingsLoader()
+        ttl = settings.get("source_ttl_seconds", {}).get(
+            client.name, settings.get("rates_ttl_seconds", 300)
+        )
+        if age >= ttl * config.MIN_REFRESH_FRACTION:
+            return False
+        print(f"INFO: {client.name} refreshed {age:.0f}s ago, merged with it")
+        return True
+
+    def run_update(
+        self,
+        clients: Optional[Iterable[BaseApiClient]] = None,
+        merge_recent: bool = False,
+    ) -> bool:
+        """Запускает обновление курсов всех источников или только clients.
+
+        merge_recent - источники, обновлённые чаще, чем разрешает
+        расписание, не опрашиваются: запрос сливается с прошлым
+        обновлением и не тратит бюджет запросов.
+        """
+        clients = self.select_clients(clients, merge_recent)
+        if merge_recent and not clients:
+            return True
+        all_rates, success_sources = self.fetch_all(self.cycle_deadline(), clients)
+        return self.persist(all_rates, success_sources == len(clients))
+
+    def select_clients(
+        self,
+        clients: Optional[Iterable[BaseApiClient]] = None,
+        merge_recent: bool = False,
+    ) -> List[BaseApiClient]:
+        """Источники цикла: все или clients, при merge_recent - без недавно
+        обновлённых"""
+        clients = self.clients if clients is None else list(clients)
+        if merge_recent:
+            clients = [c for c in clients if not self._recently_refreshed(c)]
+        return clients
+
+    def persist(self, all_rates: Dict[str, RateEntry], complete: bool) -> bool:
+        """Сохраняет курсы цикла; True, если ответили все опрошенные источники.
+
+        Курсы других источников остаются в хранилище со своими
+        отметками времени, так что источники можно обновлять порознь.
+        """
         if not all_rates:
             return False
 
-        # Сохраняем текущие курсы
-        current_rates_data = {}
-        for currency_pair, rate in all_rates.items():
-            current_rates_data[currency_pair] = {
-                "rate": rate,
-                "updated_at": datetime.now().isoformat(),
-                "source": (
-                    "CoinGecko"
-                    if any(crypto in currency_pair for crypto in ["BTC", "ETH", "SOL"])
-                    else "ExchangeRate-API"
-                ),
-            }
-
-            # Сохраняем историческую запись
-            source = (
-                "CoinGecko"
-                if any(crypto in currency_pair for crypto in ["BTC", "ETH", "SOL"])
-                else "ExchangeRate-API"
-            )
-            self.storage.save_historical_record(currency_pair, rate, source)
+        # Все записи цикла получают общую метку времени
+        timestamp = datetime.now().isoformat()
+        cycle_rates = {}
+        history_records = []
+        for currency_pair, (rate, source, changed) in all_rates.items():
+            # Неизменившиеся (304) курсы только получают новую отметку
+            # проверки, в историю попадают лишь новые значения
+            cycle_rates[currency_pair] = RateQuote(rate, timestamp, source)
+            if changed:
+                history_records.append((currency_pair, rate, source))
+
+        # Сначала фиксируется история, затем публикуется снимок курсов:
+        # читатель не увидит курс, которого ещё нет в истории
+        try:
+            with self.storage.db.group_commit():
+                if config.HISTORY_DELTA_ENABLED:
+                    saved = self.storage.save_cycle_history(
+                        {
+                            currency_pair: (rate, source)
+                            for currency_pair, (rate, source, _) in all_rates.items()
+                        },
+                        timestamp,
+                    )
+                else:
+                    saved = self.storage.save_historical_records(
+                        history_records, timestamp
+                    )
+            if not saved:
+                # Без истории снимок не публикуется: курсы цикла
+                # повторятся в следующем обновлении
+                print("ERROR: Failed to write rate history, rates not published")
+                return False
+            snapshot = self.storage.publish_rates(cycle_rates, timestamp)
+        except Exception as e:
+            print(f"ERROR: Failed to write rates: {e}")
+            return False
 
-        # Сохраняем текущие курсы
-        if self.storage.save_current_rates(current_rates_data):
-            print(f"INFO: Writing {len(all_rates)} rates to data/rates.json...")
-            return success_sources == 2
-        else:
+        if snapshot is None:
             return False
+        print(
+            f"INFO: Published {len(all_rates)} rates "
+            f"(snapshot v{snapshot.version}, {len(snapshot)} pairs)"
+        )
+        return complete
 
 
 # Глобальный экземпляр